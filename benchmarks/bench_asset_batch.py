@@ -0,0 +1,234 @@
+"""
+bench_asset_batch.py
+
+Micro-benchmark da conversão do payload de ativos: caminho original por dicionários
+(`float(...)` campo a campo, `datetime.utcnow()` por linha e um INSERT multi-linha
+compilado pelo SQLAlchemy a cada lote) contra o lote colunar `AssetBatch` (conversão
+vetorizada, um timestamp por lote e tuplas posicionais para um comando compilado uma vez).
+
+As duas etapas rodam em tarefas separadas do Airflow e são medidas separadamente:
+- staging: payload da API -> parâmetros enviados ao driver na carga de `crypto_raw`;
+- transform: linhas de `crypto_raw` -> dimensão, fatos, agregações OHLCV (1h/1d) e
+  ranking do resumo do Power BI.
+
+Mede tempo de CPU e pico de memória alocada (tracemalloc) com 10k e 100k ativos sintéticos,
+sem banco de dados (os comandos são apenas compilados para o dialeto MySQL/PyMySQL).
+
+Execução:
+    PYTHONPATH=. python benchmarks/bench_asset_batch.py [--sizes 10000 100000] [--repeat 3]
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import MetaData
+from sqlalchemy.dialects.mysql import insert as mysql_insert, pymysql
+
+from include.database.create_tables import define_staging_tables
+from include.etl.batch import AssetBatch, DIMENSION_COLUMNS, FACT_COLUMNS, STAGING_COLUMNS
+from include.etl.load_staging import _upsert_statement
+from include.etl.rollups import GRANULARITIES, _aggregate_rows
+from include.etl.transform_load_final import build_powerbi_summary
+from include.etl.utils import chunked, positional_statement
+
+CHUNK_SIZE = 1000
+DIALECT = pymysql.dialect()
+METADATA = MetaData()
+define_staging_tables(METADATA)
+RAW_TABLE = METADATA.tables["crypto_raw"]
+
+
+def synthetic_assets(count, seed=42):
+    rng = random.Random(seed)
+    assets = []
+    for i in range(count):
+        price = rng.uniform(0.0001, 60000)
+        assets.append({
+            "id": f"asset-{i}",
+            "rank": str(i + 1),
+            "symbol": f"A{i}",
+            "name": f"Asset {i}",
+            "supply": f"{rng.uniform(1e3, 1e10):.10f}",
+            "maxSupply": f"{rng.uniform(1e6, 1e11):.10f}" if rng.random() < 0.6 else None,
+            "marketCapUsd": f"{price * rng.uniform(1e3, 1e9):.10f}",
+            "volumeUsd24Hr": f"{rng.uniform(1e2, 1e9):.10f}",
+            "priceUsd": f"{price:.10f}",
+            "changePercent24Hr": f"{rng.uniform(-30, 30):.10f}",
+            "vwap24Hr": f"{price * rng.uniform(0.95, 1.05):.10f}" if rng.random() < 0.8 else None,
+            "explorer": f"https://explorer-{i}.example/a,https://mirror-{i}.example" if rng.random() < 0.9 else None,
+        })
+    return assets
+
+
+def dict_staging(raw_data):
+    timestamp = datetime.utcnow()
+    rows = [
+        {
+            "id": asset["id"],
+            "symbol": asset["symbol"],
+            "name": asset["name"],
+            "max_supply": float(asset["maxSupply"]) if asset["maxSupply"] else None,
+            "explorer": asset.get("explorer"),
+            "price_usd": float(asset["priceUsd"]),
+            "market_cap_usd": float(asset["marketCapUsd"]),
+            "volume_usd_24hr": float(asset["volumeUsd24Hr"]),
+            "change_percent_24hr": float(asset["changePercent24Hr"]),
+            "vwap_24hr": float(asset["vwap24Hr"]) if asset.get("vwap24Hr") else None,
+            "supply": float(asset["supply"]),
+            "timestamp": timestamp
+        }
+        for asset in raw_data
+    ]
+    # Carga anterior: um INSERT ... VALUES multi-linha montado e compilado a cada lote
+    for chunk in chunked(rows, CHUNK_SIZE):
+        stmt = mysql_insert(RAW_TABLE).values(chunk)
+        stmt = stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in STAGING_COLUMNS[1:]})
+        compiled = stmt.compile(dialect=DIALECT)
+        compiled.construct_params()
+    return rows
+
+
+def columnar_staging(raw_data):
+    sql, _ = positional_statement(DIALECT, _upsert_statement(RAW_TABLE, DIALECT), STAGING_COLUMNS)
+    return sql, AssetBatch.from_records(raw_data).rows(STAGING_COLUMNS)
+
+
+def as_staging_rows(rows):
+    # O MySQL devolve as colunas DECIMAL(30, 10) de `crypto_raw` como `Decimal`
+    return [
+        {key: Decimal(f"{value:.10f}") if isinstance(value, float) else value for key, value in row.items()}
+        for row in rows
+    ]
+
+
+def dict_ohlcv(facts, bucket_of):
+    # aggregate_ohlcv anterior: laço por fato sobre dicionários
+    buckets = {}
+    for fact in sorted(facts, key=lambda f: (f["id"], f["timestamp"])):
+        price = fact["price_usd"]
+        if price is None:
+            continue
+        key = (fact["id"], bucket_of(fact["timestamp"]))
+        volume = fact.get("volume_usd_24hr")
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = {
+                "id": key[0], "bucket_start": key[1], "open_price": price, "high_price": price,
+                "low_price": price, "close_price": price, "volume_sum": volume or 0.0,
+                "volume_count": 1 if volume is not None else 0,
+                "last_market_cap_usd": fact.get("market_cap_usd"), "sample_count": 1,
+                "first_timestamp": fact["timestamp"], "last_timestamp": fact["timestamp"],
+            }
+            continue
+        bucket["high_price"] = max(bucket["high_price"], price)
+        bucket["low_price"] = min(bucket["low_price"], price)
+        bucket["close_price"] = price
+        if volume is not None:
+            bucket["volume_sum"] += volume
+            bucket["volume_count"] += 1
+        bucket["last_market_cap_usd"] = fact.get("market_cap_usd")
+        bucket["sample_count"] += 1
+        bucket["last_timestamp"] = fact["timestamp"]
+    rows = []
+    for bucket in buckets.values():
+        volume_sum = bucket.pop("volume_sum")
+        volume_count = bucket.pop("volume_count")
+        bucket["avg_volume_usd_24hr"] = volume_sum / volume_count if volume_count else None
+        rows.append(bucket)
+    return rows
+
+
+def dict_summary(crypto_dim, market_facts):
+    # build_powerbi_summary anterior: ordenação e rank em Python
+    symbols = {row["id"]: row["symbol"] for row in crypto_dim}
+    summary = []
+    rank = 0
+    previous_price = None
+    for position, fact in enumerate(sorted(market_facts, key=lambda f: f["price_usd"], reverse=True), start=1):
+        if fact["price_usd"] != previous_price:
+            rank = position
+            previous_price = fact["price_usd"]
+        summary.append({"id": fact["id"], "rank": rank, "symbol": symbols.get(fact["id"]),
+                        "supply": fact["supply"], "price_usd": fact["price_usd"], "updated_at": fact["timestamp"]})
+    return summary
+
+
+def dict_transform(staging_rows):
+    crypto_dim = []
+    market_facts = []
+    for row in staging_rows:
+        crypto_dim.append({
+            "id": row["id"],
+            "symbol": row["symbol"],
+            "name": row["name"],
+            "max_supply": float(row["max_supply"]) if row["max_supply"] else None,
+            "explorer": row["explorer"].split(",")[0] if row["explorer"] else None
+        })
+        market_facts.append({
+            "id": row["id"],
+            "price_usd": float(row["price_usd"]),
+            "market_cap_usd": float(row["market_cap_usd"]),
+            "volume_usd_24hr": float(row["volume_usd_24hr"]),
+            "change_percent_24hr": float(row["change_percent_24hr"]),
+            "vwap_24hr": float(row["vwap_24hr"]) if row["vwap_24hr"] else 0.0,
+            "supply": float(row["supply"]),
+            "timestamp": datetime.utcnow()
+        })
+    rollups = [dict_ohlcv(market_facts, bucket_of) for bucket_of in (
+        lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+        lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0),
+    )]
+    return crypto_dim, market_facts, rollups, dict_summary(crypto_dim, market_facts)
+
+
+def columnar_transform(staging_rows):
+    # Dimensão como dicionários (hash de mudança); fatos como tuplas para o executemany;
+    # agregações OHLCV (tuplas, como em update_rollups) e ranking calculados sobre as colunas
+    batch = AssetBatch.from_staging_rows(staging_rows, row_timestamps=False)
+    crypto_dim = batch.records(DIMENSION_COLUMNS)
+    rollups = [_aggregate_rows(batch, granularity) for granularity in GRANULARITIES]
+    return crypto_dim, batch.rows(FACT_COLUMNS), rollups, build_powerbi_summary(crypto_dim, batch)
+
+
+def measure(fn, payload, repeat):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.process_time()
+        fn(payload)
+        timings.append(time.process_time() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    fn(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'ativos':>8} | {'etapa':<9} | {'caminho':<8} | {'CPU (s)':>8} | {'pico (MiB)':>10}")
+    for size in args.sizes:
+        payload = synthetic_assets(size)
+        staging_rows = as_staging_rows(dict_staging(payload))
+        stages = (
+            ("staging", payload, (("dict", dict_staging), ("colunar", columnar_staging))),
+            ("transform", staging_rows, (("dict", dict_transform), ("colunar", columnar_transform))),
+        )
+        for stage, data, paths in stages:
+            for name, fn in paths:
+                cpu, peak = measure(fn, data, args.repeat)
+                print(f"{size:>8} | {stage:<9} | {name:<8} | {cpu:>8.3f} | {peak / 2 ** 20:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+bench_bulk_load.py
+
+Benchmark da carga em massa (`bulk_load.bulk_write`) por banco e por método: INSERT de
+fatos em `crypto_market_data` e UPSERT (mesclagem) de baldes em `crypto_ohlcv_1h`, com
+lotes sintéticos (um balde por fato, para que o UPSERT toque uma linha por registro).
+
+Bancos (`--url`, repetível):
+- padrão: SQLite em arquivo temporário;
+- qualquer URL SQLAlchemy: MySQL (`mysql+pymysql://...`) e PostgreSQL
+  (`postgresql+psycopg2://...`), ex.: bancos locais em container. As tabelas do DW são
+  apagadas e recriadas a cada medição: use apenas bancos descartáveis.
+
+Métodos: `executemany` em todos os bancos e `copy` no PostgreSQL. Por combinação são
+medidos registros/s e comandos enviados ao banco. O UPSERT é medido na segunda carga do
+mesmo lote, quando todas as linhas entram em conflito.
+
+Execução:
+    PYTHONPATH=. python benchmarks/bench_bulk_load.py [--sizes 10000 100000] [--repeat 3]
+        [--url postgresql+psycopg2://... --url mysql+pymysql://...] [--output relatorio.json]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy import MetaData, create_engine
+
+from benchmarks.bench_asset_batch import synthetic_assets
+from include.database.create_tables import create_all, define_dw_tables
+from include.database.db_connection import DW
+from include.database.schema_cache import get_table
+from include.etl.batch import AssetBatch, FACT_COLUMNS
+from include.etl.bulk_load import bulk_write
+from include.etl.rollups import ROLLUP_COLUMNS, _aggregate_rows, _merge_assignments
+
+ASSETS = 100
+CHUNK_SIZE = 1000
+START = datetime(2025, 1, 1)
+
+
+def synthetic_facts(size: int) -> AssetBatch:
+    # Um ponto por hora para cada ativo: cada fato cai em um balde 1h próprio
+    records = synthetic_assets(ASSETS) * (size // ASSETS + 1)
+    timestamps = [START + timedelta(hours=i // ASSETS) for i in range(len(records))]
+    return AssetBatch.from_records(records[:size], timestamps=timestamps[:size])
+
+
+def methods_for(engine) -> List[str]:
+    return ["executemany", "copy"] if engine.dialect.name == "postgresql" else ["executemany"]
+
+
+def _reset(engine):
+    metadata = define_dw_tables(MetaData())
+    metadata.drop_all(engine)
+    create_all(metadata, engine)
+
+
+def _timed(engine, table_name: str, columns, rows, method: str, assignments=None) -> Dict:
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        commands = bulk_write(conn, get_table(DW, table_name), columns, rows, CHUNK_SIZE,
+                              assignments=assignments, method=method)
+    elapsed = time.perf_counter() - started
+    return {"seconds": elapsed, "rows_per_s": len(rows) / elapsed, "db_round_trips": commands}
+
+
+def measure(engine, size: int, method: str) -> List[Dict]:
+    batch = synthetic_facts(size)
+    facts = batch.rows(FACT_COLUMNS)
+    buckets = _aggregate_rows(batch, "1h")
+    rollup_table = get_table(DW, "crypto_ohlcv_1h")
+    merge = lambda new: _merge_assignments(rollup_table.c, new)  # noqa: E731
+
+    _reset(engine)
+    insert = _timed(engine, "crypto_market_data", FACT_COLUMNS, facts, method)
+    _timed(engine, "crypto_ohlcv_1h", ROLLUP_COLUMNS, buckets, method, merge)
+    upsert = _timed(engine, "crypto_ohlcv_1h", ROLLUP_COLUMNS, buckets, method, merge)
+    return [dict(insert, operation="insert"), dict(upsert, operation="upsert")]
+
+
+def run_benchmark(sizes: List[int], urls: List[str] = None, repeat: int = 1) -> Dict:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for url in urls or [f"sqlite:///{workdir}/dw.db"]:
+            engine = create_engine(url)
+            try:
+                for method in methods_for(engine):
+                    for size in sizes:
+                        runs = [measure(engine, size, method) for _ in range(max(repeat, 1))]
+                        for operation_runs in zip(*runs):
+                            result = dict(operation_runs[0], backend=engine.dialect.name, method=method, rows=size)
+                            for key in ("seconds", "rows_per_s"):
+                                result[key] = statistics.median(run[key] for run in operation_runs)
+                            results.append(result)
+            finally:
+                engine.dispose()
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--url", action="append", help="URL SQLAlchemy do banco (padrão: SQLite temporário)")
+    parser.add_argument("--output", type=Path, help="grava o relatório JSON neste arquivo")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.sizes, args.url, args.repeat)
+    print(f"{'banco':<10} | {'método':<11} | {'operação':<8} | {'registros':>9} | {'registros/s':>11} | "
+          f"{'tempo (s)':>9} | {'comandos':>8}")
+    for r in report["results"]:
+        print(f"{r['backend']:<10} | {r['method']:<11} | {r['operation']:<8} | {r['rows']:>9} | "
+              f"{r['rows_per_s']:>11.0f} | {r['seconds']:>9.3f} | {r['db_round_trips']:>8}")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+bench_pipeline.py
+
+Benchmark ponta a ponta do pipeline: `extract_data` -> `load_data_to_staging` ->
+`transform_and_load_data`, com payloads sintéticos de `/v3/assets` (com nulos em
+`maxSupply`/`vwap24Hr`) servidos por um servidor HTTP local e bancos locais.
+
+Bancos:
+- padrão: SQLite em arquivos temporários (um para a staging e outro para o DW), usados
+  como substitutos embutidos do MySQL;
+- `--staging-url`/`--dw-url`: qualquer URL SQLAlchemy (ex.: MySQL local em container).
+  As tabelas são recriadas a cada execução: use apenas bancos descartáveis.
+
+Cada tamanho (e cada repetição) roda em um processo novo, com bancos vazios, para que
+o pico de memória de uma execução não contamine a seguinte. Por etapa são medidos:
+registros/s, tempo de parede e de CPU, pico de RSS (amostrado durante a etapa),
+comandos enviados ao banco (round trips; um `executemany` conta como um) e requisições HTTP.
+
+O relatório é gravado em JSON (`--output`). Com `--baseline`, cada etapa é comparada
+com o relatório de referência e o processo termina com código 1 se houver regressão:
+vazão abaixo de `(1 - tolerância)` da referência, pico de RSS acima de `(1 + tolerância)`
+ou mais round trips/requisições que a referência.
+
+Execução:
+    PYTHONPATH=. python benchmarks/bench_pipeline.py [--sizes 100 1000 10000 100000] [--repeat 3]
+        [--output relatorio.json] [--baseline referencia.json --tolerance 0.2]
+        [--staging-url mysql+pymysql://... --dw-url mysql+pymysql://...]
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.bench_asset_batch import synthetic_assets
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGE_LIMIT = 2000
+WORKERS = 4
+RSS_INTERVAL = 0.005  # segundos entre amostras de RSS
+
+
+class StubCoinCap:
+    """
+    Servidor local de `/v3/assets` (paginação por `limit`/`offset`). As páginas são
+    serializadas uma única vez, para que o custo medido seja o do cliente.
+    """
+
+    def __init__(self, assets: List[Dict]):
+        self.assets = assets
+        self.requests = 0
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def page(self, offset: int, limit: int) -> bytes:
+        with self._lock:
+            self.requests += 1
+            body = self._pages.get((offset, limit))
+            if body is None:
+                body = json.dumps({"data": self.assets[offset:offset + limit]}).encode()
+                self._pages[(offset, limit)] = body
+            return body
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                body = stub.page(int(query.get("offset", ["0"])[0]), int(query.get("limit", ["100"])[0]))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v3/assets"
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Sem /proc (ex.: macOS): pico do processo inteiro, não só da etapa
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+class PeakRss:
+    """
+    Amostra o RSS do processo em uma thread enquanto a etapa executa.
+    """
+
+    def __enter__(self):
+        self.peak = _current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_INTERVAL):
+            self.peak = max(self.peak, _current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+
+def _child(size: int, url: str, page_limit: int, workers: int) -> List[Dict]:
+    """
+    Executa as três etapas no processo atual. Os módulos do pipeline são importados aqui:
+    as URLs dos bancos (`STAGING_DATABASE_URL`/`DW_DATABASE_URL`) são lidas do ambiente
+    na importação da configuração.
+    """
+    from sqlalchemy import MetaData, event, func, select
+    from include.database.create_tables import create_all, define_staging_tables, define_dw_tables
+    from include.database.db_connection import get_staging_area_engine, get_dw_engine, DW
+    from include.database.schema_cache import get_table
+    from include.etl.extract import extract_data
+    from include.etl.load_staging import load_data_to_staging
+    from include.etl.transform_load_final import transform_and_load_data
+
+    staging_engine, dw_engine = get_staging_area_engine(verify=False), get_dw_engine(verify=False)
+    for engine, define in ((staging_engine, define_staging_tables), (dw_engine, define_dw_tables)):
+        metadata = define(MetaData())
+        metadata.drop_all(engine)
+        create_all(metadata, engine)
+    # Esquema conferido (schema_cache.verify_schema) antes das medições, fora das etapas
+    get_staging_area_engine(), get_dw_engine()
+
+    round_trips = [0]
+
+    def count(*args):
+        round_trips[0] += 1
+
+    for engine in (staging_engine, dw_engine):
+        event.listen(engine, "before_cursor_execute", count)
+
+    assets = []
+
+    def extract():
+        assets.extend(extract_data(url=url, page_limit=page_limit, max_pages=math.ceil(size / page_limit) + 1,
+                                   workers=workers, rate_limit=0))
+
+    stages = (
+        ("extract", extract),
+        ("load_staging", lambda: load_data_to_staging(assets)),
+        ("transform", lambda: transform_and_load_data(incremental=True)),
+    )
+    results = []
+    for name, run in stages:
+        gc.collect()
+        round_trips[0] = 0
+        with PeakRss() as rss:
+            wall, cpu = time.perf_counter(), time.process_time()
+            run()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        results.append({"stage": name, "wall_s": wall, "cpu_s": cpu, "peak_rss_mib": rss.peak / 2 ** 20,
+                        "db_round_trips": round_trips[0]})
+
+    with dw_engine.connect() as conn:
+        facts = conn.execute(select(func.count()).select_from(get_table(DW, "crypto_market_data"))).scalar()
+    for result in results:
+        result["rows"] = len(assets) if result["stage"] != "transform" else facts
+        result["rows_per_s"] = result["rows"] / result["wall_s"] if result["wall_s"] > 0 else float("inf")
+    return results
+
+
+def run_size(size: int, staging_url: str = None, dw_url: str = None, page_limit: int = PAGE_LIMIT,
+             workers: int = WORKERS) -> List[Dict]:
+    """
+    Executa as etapas para `size` ativos em um processo novo e retorna as métricas por etapa.
+    """
+    with StubCoinCap(synthetic_assets(size)) as stub, tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+            STAGING_DATABASE_URL=staging_url or f"sqlite:///{workdir}/staging.db",
+            DW_DATABASE_URL=dw_url or f"sqlite:///{workdir}/dw.db",
+            LANDING_ENABLED="false",
+        )
+        command = [sys.executable, str(Path(__file__).resolve()), "--child", str(size), "--url", stub.url,
+                   "--page-limit", str(page_limit), "--workers", str(workers)]
+        completed = subprocess.run(command, env=env, cwd=ROOT, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Benchmark com {size} ativos falhou:\n{completed.stderr}")
+        results = json.loads(completed.stdout.strip().splitlines()[-1])
+        requests = stub.requests
+
+    for result in results:
+        result["assets"] = size
+        result["http_requests"] = requests if result["stage"] == "extract" else 0
+    return results
+
+
+def _median(runs: List[List[Dict]]) -> List[Dict]:
+    merged = []
+    for stage_runs in zip(*runs):
+        result = dict(stage_runs[0])
+        for key in ("wall_s", "cpu_s", "rows_per_s", "peak_rss_mib"):
+            result[key] = statistics.median(run[key] for run in stage_runs)
+        merged.append(result)
+    return merged
+
+
+def run_benchmark(sizes: List[int], repeat: int = 1, **options) -> Dict:
+    results = []
+    for size in sizes:
+        results.extend(_median([run_size(size, **options) for _ in range(max(repeat, 1))]))
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": "sqlite" if not options.get("dw_url") else "url",
+        "repeat": repeat,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {"meta": meta, "results": results}
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Regressões de `report` em relação a `baseline`, por (ativos, etapa).
+    """
+    reference = {(result["assets"], result["stage"]): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        base = reference.get((result["assets"], result["stage"]))
+        if base is None:
+            continue
+        label = f"{result['stage']} ({result['assets']} ativos)"
+        if result["rows_per_s"] < base["rows_per_s"] * (1 - tolerance):
+            regressions.append(f"{label}: vazão {result['rows_per_s']:.0f}/s < {base['rows_per_s']:.0f}/s")
+        if result["peak_rss_mib"] > base["peak_rss_mib"] * (1 + tolerance):
+            regressions.append(f"{label}: pico de RSS {result['peak_rss_mib']:.1f} MiB > "
+                               f"{base['peak_rss_mib']:.1f} MiB")
+        for key in ("db_round_trips", "http_requests"):
+            if result[key] > base[key]:
+                regressions.append(f"{label}: {key} {result[key]} > {base[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", type=Path, help="grava o relatório JSON neste arquivo")
+    parser.add_argument("--baseline", type=Path, help="relatório de referência para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--staging-url", help="URL SQLAlchemy da staging (padrão: SQLite temporário)")
+    parser.add_argument("--dw-url", help="URL SQLAlchemy do DW (padrão: SQLite temporário)")
+    parser.add_argument("--page-limit", type=int, default=PAGE_LIMIT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(_child(args.child, args.url, args.page_limit, args.workers)))
+        return
+
+    report = run_benchmark(args.sizes, args.repeat, staging_url=args.staging_url, dw_url=args.dw_url,
+                           page_limit=args.page_limit, workers=args.workers)
+    print(f"{'ativos':>8} | {'etapa':<12} | {'registros/s':>11} | {'parede (s)':>10} | {'CPU (s)':>8} | "
+          f"{'RSS (MiB)':>9} | {'comandos':>8} | {'HTTP':>4}")
+    for r in report["results"]:
+        print(f"{r['assets']:>8} | {r['stage']:<12} | {r['rows_per_s']:>11.0f} | {r['wall_s']:>10.3f} | "
+              f"{r['cpu_s']:>8.3f} | {r['peak_rss_mib']:>9.1f} | {r['db_round_trips']:>8} | {r['http_requests']:>4}")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regressão: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Nenhuma regressão em relação à referência")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,57 @@
 from airflow import DAG
-from airflow.operators.python import PythonOperator
-from datetime import datetime
+from airflow.operators.python import BranchPythonOperator, PythonOperator
+from datetime import datetime, timedelta
 
-from include.etl.extract import extract_data
-from include.etl.load_staging import load_data_to_staging
-from include.etl.transform_load_final import transform_and_load_data
+# Os módulos do pipeline (requests, SQLAlchemy, Cloud SQL Connector, dotenv, arquivos de log)
+# são importados apenas dentro das tasks: o scheduler reprocessa este arquivo a cada poucos
+# segundos e só precisa da estrutura da DAG.
+def choose_load_path():
+    # ETL_SHARDS vem do config (ambiente ou .env), lido na execução e não no parse
+    from include.config.config import ETL_SHARDS
+    return 'plan_shards' if ETL_SHARDS > 1 else 'extract_and_load_staging'
+
+
+def extract_and_load_staging():
+    from include.config.config import DIRECT_LOAD_ENABLED
+    if DIRECT_LOAD_ENABLED:
+        # Caminho direto API -> DW; a task de transformação apenas confirma o lote
+        from include.etl.direct_load import extract_and_load_direct
+        return extract_and_load_direct()
+    from include.etl.extract_load_stream import extract_and_load_staging
+    return extract_and_load_staging()
+
+
+def transform_and_load_data(ti=None):
+    from include.etl.transform_load_final import transform_and_load_data
+    # Um lote sem ativos alterados (referência no XCom da task anterior) encerra a task sem ler a staging
+    batch_ref = ti.xcom_pull(task_ids="extract_and_load_staging") if ti is not None else None
+    return transform_and_load_data(batch_ref=batch_ref)
+
+
+def plan_shards():
+    from include.etl.shards import plan_shards
+    # Uma entrada de op_kwargs por task mapeada
+    return [{"shard": shard} for shard in plan_shards()]
+
+
+def extract_and_load_shard(shard):
+    from include.etl.shards import extract_and_load_shard
+    return extract_and_load_shard(shard)
+
+
+def finalize_shards(ti=None):
+    from include.etl.shards import finalize_shards
+    # Referências de todas as tasks mapeadas (uma por faixa)
+    shard_refs = ti.xcom_pull(task_ids="extract_and_load_shard") if ti is not None else None
+    return finalize_shards(list(shard_refs or []))
+
+
+def update_analytics():
+    from include.config.config import ANALYTICS_ENABLED
+    if not ANALYTICS_ENABLED:
+        return 0
+    from include.etl.analytics import update_analytics
+    return update_analytics()
 
 
 with DAG(
@@ -18,17 +65,39 @@ with DAG(
 
     Esta DAG extrai dados da API CoinCap, carrega-os em uma tabela de staging MySQL,
     transforma os dados e os carrega em tabelas dimensionais e de fatos no PostgreSQL.
+
+    A extração e a carga na staging rodam em streaming na mesma task; apenas a
+    referência do lote (id, registros recebidos e alterados, hash) trafega via XCom.
+    Páginas inalteradas (HTTP 304) e ativos com o mesmo hash de conteúdo não são
+    regravados; um lote sem alterações pula a transformação.
+
+    Com `DIRECT_LOAD_ENABLED`, a primeira task já carrega o lote no DW (a staging é
+    gravada em paralelo, para auditoria) e a transformação é ignorada.
+
+    Com `ETL_SHARDS` > 1, a task `choose_load_path` segue o ramo particionado: o ranking
+    da API é dividido em faixas, cada faixa é extraída e carregada (DW + staging de
+    auditoria) por uma task mapeada, que pode ser repetida sozinha, e a task
+    `finalize_shards` publica o resumo do Power BI. O outro ramo é ignorado (skipped).
+
+    Por fim, os indicadores por ativo (médias móveis, volatilidade, máxima/mínima 24h)
+    são atualizados de forma incremental a partir dos fatos novos (`crypto_analytics`).
     """,
 ) as dag:
-    extract_task = PythonOperator(
-        task_id='extract_from_api',
-        python_callable=extract_data,
+    choose_load_path_task = BranchPythonOperator(
+        task_id='choose_load_path',
+        python_callable=choose_load_path,
+    )
+
+    update_analytics_task = PythonOperator(
+        task_id='update_analytics',
+        python_callable=update_analytics,
+        trigger_rule='none_failed_min_one_success',  # Roda após o ramo escolhido; o outro fica skipped
     )
 
-    load_staging_task = PythonOperator(
-        task_id='load_to_staging',
-        python_callable=load_data_to_staging,
-        op_args=[extract_task.output],  # Passa o resultado da extração para a carga
+    # Ramo linear (ETL_SHARDS = 1)
+    extract_load_staging_task = PythonOperator(
+        task_id='extract_and_load_staging',
+        python_callable=extract_and_load_staging,  # Retorna só {"batch_id", "rows", "changed", "content_hash"}
     )
 
     transform_load_final_task = PythonOperator(
@@ -36,4 +105,24 @@ with DAG(
         python_callable=transform_and_load_data,
     )
 
-    extract_task >> load_staging_task >> transform_load_final_task
\ No newline at end of file
+    # Ramo particionado (ETL_SHARDS > 1)
+    plan_shards_task = PythonOperator(
+        task_id='plan_shards',
+        python_callable=plan_shards,
+    )
+
+    # Uma task por faixa, criada em tempo de execução a partir do XCom do planejamento
+    extract_load_shard_tasks = PythonOperator.partial(
+        task_id='extract_and_load_shard',
+        python_callable=extract_and_load_shard,
+        retries=2,
+        retry_delay=timedelta(seconds=30),
+    ).expand(op_kwargs=plan_shards_task.output)
+
+    finalize_shards_task = PythonOperator(
+        task_id='finalize_shards',
+        python_callable=finalize_shards,
+    )
+
+    choose_load_path_task >> extract_load_staging_task >> transform_load_final_task >> update_analytics_task
+    choose_load_path_task >> plan_shards_task >> extract_load_shard_tasks >> finalize_shards_task >> update_analytics_task
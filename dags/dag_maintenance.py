@@ -0,0 +1,28 @@
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+from datetime import datetime
+
+
+# Importação dentro da task: o parse da DAG não carrega SQLAlchemy nem o Cloud SQL Connector
+def run_partition_maintenance():
+    from include.database.partitioning import run_partition_maintenance
+    return run_partition_maintenance()
+
+
+with DAG(
+    dag_id='dag_dw_maintenance',
+    schedule='@daily',
+    start_date=datetime(2025, 5, 3),
+    catchup=False,
+    tags=['crypto', 'dw', 'maintenance'],
+    doc_md="""
+    ### Manutenção do Data Warehouse
+
+    Cria antecipadamente as partições mensais de `crypto_market_data` e aplica a
+    política de retenção (arquivar/remover partições expiradas).
+    """,
+) as dag:
+    partition_maintenance_task = PythonOperator(
+        task_id='partition_maintenance',
+        python_callable=run_partition_maintenance,
+    )
@@ -9,6 +9,14 @@ load_dotenv()
 # ======================
 COINCAP_API_KEY = os.getenv("COINCAP_API_KEY")
 COINCAP_API_URL = os.getenv("COINCAP_API_URL")
+COINCAP_PAGE_LIMIT = int(os.getenv("COINCAP_PAGE_LIMIT", "2000"))  # ativos por página (limit)
+COINCAP_MAX_PAGES = int(os.getenv("COINCAP_MAX_PAGES", "20"))
+COINCAP_WORKERS = int(os.getenv("COINCAP_WORKERS", "4"))  # requisições concorrentes
+COINCAP_RATE_LIMIT = float(os.getenv("COINCAP_RATE_LIMIT", "5"))  # requisições por segundo
+COINCAP_TIMEOUT = float(os.getenv("COINCAP_TIMEOUT", "10"))  # segundos
+COINCAP_MAX_RETRIES = int(os.getenv("COINCAP_MAX_RETRIES", "5"))
+COINCAP_BACKOFF_BASE = float(os.getenv("COINCAP_BACKOFF_BASE", "0.5"))  # segundos
+COINCAP_BACKOFF_MAX = float(os.getenv("COINCAP_BACKOFF_MAX", "30"))  # segundos
 
 # ======================
 # MySQL Configuration (Staging)
@@ -18,6 +26,8 @@ MYSQL_USER = os.getenv("MYSQL_USER", "user")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "password")
 MYSQL_DB = os.getenv("MYSQL_DB", "staging")
 MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3306"))
+# URL SQLAlchemy que substitui a conexão acima (ex.: MySQL local em container, SQLite no benchmark)
+STAGING_DATABASE_URL = os.getenv("STAGING_DATABASE_URL")
 
 # ======================
 # GCP Cloud SQL Configuration
@@ -27,4 +37,135 @@ GCP_REGION = os.getenv("GCP_REGION")
 GCP_INSTANCE_NAME = os.getenv("GCP_INSTANCE_NAME")
 GCP_DB_NAME = os.getenv("GCP_DB_NAME")
 GCP_DB_USER = os.getenv("GCP_DB_USER")
-GCP_DB_PASSWORD = os.getenv("GCP_DB_PASSWORD")
\ No newline at end of file
+GCP_DB_PASSWORD = os.getenv("GCP_DB_PASSWORD")
+GCP_DB_DIALECT = os.getenv("GCP_DB_DIALECT", "mysql")  # mysql (pymysql) | postgresql (pg8000)
+# URL SQLAlchemy que substitui o Cloud SQL Connector (ex.: MySQL local em container)
+DW_DATABASE_URL = os.getenv("DW_DATABASE_URL")
+
+# ======================
+# Staging Load Configuration
+# ======================
+# Quantidade de registros enviados em cada INSERT ... ON DUPLICATE KEY UPDATE multi-linha
+STAGING_CHUNK_SIZE = int(os.getenv("STAGING_CHUNK_SIZE", "1000"))
+# Lotes aguardando escrita no modo streaming (extração bloqueia quando a fila enche)
+STREAM_QUEUE_DEPTH = int(os.getenv("STREAM_QUEUE_DEPTH", "4"))
+
+# ======================
+# Bulk Load
+# ======================
+# auto: COPY FROM STDIN no PostgreSQL, INSERT multi-linha (executemany) no MySQL e no SQLite
+BULK_LOAD_METHOD = os.getenv("BULK_LOAD_METHOD", "auto")  # auto | copy | executemany
+
+# ======================
+# Connection Pool Configuration
+# ======================
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # segundos
+
+# ======================
+# Schema Cache Configuration
+# ======================
+# Validade (s) das tabelas refletidas que não estão em create_tables.py (0 = sem expiração)
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", "3600"))
+
+# ======================
+# Transform Configuration
+# ======================
+# Lê apenas as linhas novas da staging (marca d'água) e atualiza só dimensões alteradas
+TRANSFORM_INCREMENTAL = os.getenv("TRANSFORM_INCREMENTAL", "true").lower() in ("1", "true", "yes")
+# Baldes OHLCV por UPSERT (e fatos por fatia na reconstrução das agregações)
+ROLLUP_CHUNK_SIZE = int(os.getenv("ROLLUP_CHUNK_SIZE", "5000"))
+
+# ======================
+# Rolling Analytics
+# ======================
+# Indicadores por ativo (analytics.py); janelas em amostras (uma por execução/fato)
+ANALYTICS_ENABLED = os.getenv("ANALYTICS_ENABLED", "true").lower() in ("1", "true", "yes")
+ANALYTICS_EMA_SHORT = int(os.getenv("ANALYTICS_EMA_SHORT", "12"))
+ANALYTICS_EMA_LONG = int(os.getenv("ANALYTICS_EMA_LONG", "26"))
+ANALYTICS_SMA_WINDOW = int(os.getenv("ANALYTICS_SMA_WINDOW", "20"))
+ANALYTICS_VOLATILITY_WINDOW = int(os.getenv("ANALYTICS_VOLATILITY_WINDOW", "288"))  # 24h a cada 5 min
+# Fatos confirmados depois de outros mais novos (daemon, faixas repetidas) são relidos nesta janela
+ANALYTICS_LOOKBACK_MINUTES = int(os.getenv("ANALYTICS_LOOKBACK_MINUTES", "60"))
+
+# ======================
+# Parallel DW Load
+# ======================
+# Lotes com pelo menos DW_LOAD_PARALLEL_MIN_ROWS fatos são gravados em blocos paralelos
+DW_LOAD_WORKERS = int(os.getenv("DW_LOAD_WORKERS", "4"))  # conexões simultâneas (<= pool do DW)
+DW_LOAD_CHUNK_ROWS = int(os.getenv("DW_LOAD_CHUNK_ROWS", "2000"))  # fatos por bloco/transação
+DW_LOAD_PARALLEL_MIN_ROWS = int(os.getenv("DW_LOAD_PARALLEL_MIN_ROWS", "5000"))
+DW_LOAD_RETRIES = int(os.getenv("DW_LOAD_RETRIES", "3"))  # repetições idempotentes por bloco
+DW_LOAD_BACKOFF_BASE = float(os.getenv("DW_LOAD_BACKOFF_BASE", "0.5"))  # segundos
+DW_LOAD_BACKOFF_MAX = float(os.getenv("DW_LOAD_BACKOFF_MAX", "10"))  # segundos
+
+# ======================
+# Sharded DAG
+# ======================
+# Faixas de páginas do ranking extraídas e carregadas em tasks mapeadas (1 = DAG linear)
+ETL_SHARDS = int(os.getenv("ETL_SHARDS", "1"))
+
+# ======================
+# Fact Table Partitioning / Retention
+# ======================
+MARKET_DATA_PARTITIONS_AHEAD = int(os.getenv("MARKET_DATA_PARTITIONS_AHEAD", "3"))  # meses criados antecipadamente
+MARKET_DATA_RETENTION_MONTHS = int(os.getenv("MARKET_DATA_RETENTION_MONTHS", "12"))  # 0 = sem expiração
+MARKET_DATA_RETENTION_POLICY = os.getenv("MARKET_DATA_RETENTION_POLICY", "archive")  # archive | drop | keep
+
+# ======================
+# Landing Zone (Raw Extracts)
+# ======================
+# Cada extração é gravada em Arrow IPC comprimido, particionado por data (date=AAAA-MM-DD)
+LANDING_ENABLED = os.getenv("LANDING_ENABLED", "true").lower() in ("1", "true", "yes")
+LANDING_DIR = os.getenv("LANDING_DIR", "data/landing")
+LANDING_COMPRESSION = os.getenv("LANDING_COMPRESSION", "zstd")  # zstd | lz4 | none
+
+# ======================
+# Historical Backfill
+# ======================
+# Intervalo do endpoint /v3/assets/{id}/history (m1, m5, m15, m30, h1, h2, h6, h12, d1)
+BACKFILL_INTERVAL = os.getenv("BACKFILL_INTERVAL", "m5")
+BACKFILL_WINDOW_HOURS = int(os.getenv("BACKFILL_WINDOW_HOURS", "24"))  # período de cada unidade de trabalho
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+BACKFILL_LOAD_ROWS = int(os.getenv("BACKFILL_LOAD_ROWS", "5000"))  # fatos por transação (com checkpoint)
+
+# ======================
+# Conditional Fetch / Change Detection
+# ======================
+# ETag/Last-Modified de cada página, reenviados como If-None-Match/If-Modified-Since
+HTTP_CONDITIONAL_REQUESTS = os.getenv("HTTP_CONDITIONAL_REQUESTS", "true").lower() in ("1", "true", "yes")
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "data/cache/http_validators.json")
+# Só reescreve na staging os ativos cujo hash de conteúdo mudou
+STAGING_SKIP_UNCHANGED = os.getenv("STAGING_SKIP_UNCHANGED", "true").lower() in ("1", "true", "yes")
+# Carrega o lote extraído direto no DW; a staging passa a ser só auditoria (direct_load.py)
+DIRECT_LOAD_ENABLED = os.getenv("DIRECT_LOAD_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# ======================
+# Streaming Ingest (daemon)
+# ======================
+INGEST_SOURCE_URL = os.getenv("INGEST_SOURCE_URL", "wss://wss.coincap.io/prices?assets=ALL")
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", "5"))  # grava o micro-lote a cada N segundos
+INGEST_FLUSH_UPDATES = int(os.getenv("INGEST_FLUSH_UPDATES", "5000"))  # ... ou a cada M atualizações
+INGEST_REFERENCE_REFRESH_SECONDS = float(os.getenv("INGEST_REFERENCE_REFRESH_SECONDS", "300"))  # snapshot da staging
+INGEST_RECONNECT_MAX_SECONDS = float(os.getenv("INGEST_RECONNECT_MAX_SECONDS", "30"))  # backoff máximo do websocket
+
+# ======================
+# Logging
+# ======================
+# Diretório dos arquivos de log (substitui o `logs/` dos caminhos relativos; ex.: testes)
+LOG_DIR = os.getenv("LOG_DIR")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text | json
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size")  # size | time | none
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # rotação por tamanho
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")  # rotação por tempo (TimedRotatingFileHandler)
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "0"))  # mensagens/s por ponto de log (0 = sem limite)
+
+# ======================
+# Metrics
+# ======================
+METRICS_SINK = os.getenv("METRICS_SINK", "json")  # prometheus | json | none
+METRICS_DIR = os.getenv("METRICS_DIR", "data/metrics")
+METRICS_PROFILE = os.getenv("METRICS_PROFILE", "none")  # none | cprofile | pyinstrument
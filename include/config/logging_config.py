@@ -4,23 +4,172 @@ logging_config.py
 Este módulo define uma função utilitária para configurar loggers personalizados,
 permitindo rastreamento e depuração de diferentes partes do pipeline de dados.
 
+Funcionamento:
+- Cada logger recebe um único `QueueHandler` (chamadas repetidas de `setup_logger`, como
+  reimportações nos workers do Airflow ou execuções de testes, não duplicam handlers).
+- O arquivo e a thread de escrita só são criados no primeiro registro emitido: importar
+  um módulo do pipeline (ex.: no parse da DAG) não abre arquivos.
+- A escrita em disco é feita por um `QueueListener` em uma thread dedicada, um por
+  arquivo de log e compartilhado por todos os loggers que escrevem nele: o código do
+  pipeline apenas enfileira o registro, sem I/O bloqueante.
+- O arquivo é rotacionado por tamanho (`LOG_ROTATION=size`) ou por tempo (`time`),
+  em texto ou JSON (uma linha por registro, `LOG_FORMAT=json`).
+- Com `LOG_RATE_LIMIT`, cada ponto de log (arquivo + linha) emite no máximo N mensagens
+  por segundo; as suprimidas são contadas e informadas na próxima mensagem emitida.
+- Com `LOG_DIR`, os caminhos relativos (ex.: `logs/pipeline.log`) são gravados nesse
+  diretório; os testes o usam para não escrever nos arquivos versionados em `logs/`.
+
 Funções:
-- setup_logger: Cria e retorna um logger configurado para escrever logs em um arquivo específico.
+- setup_logger: Cria (ou retorna, já configurado) o logger que escreve em um arquivo.
+- flush_logs: Aguarda a escrita de todos os registros enfileirados.
 
 Exemplo de uso:
     from logging_config import setup_logger
     logger = setup_logger("extract", "logs/pipeline.log")
     logger.info("Mensagem de log")
 """
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+import time
+from include.config.config import (
+    LOG_BACKUP_COUNT, LOG_DIR, LOG_FORMAT, LOG_MAX_BYTES, LOG_RATE_LIMIT, LOG_ROTATE_WHEN, LOG_ROTATION
+)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_lock = threading.Lock()
+# arquivo (caminho absoluto) -> (fila, listener)
+_listeners = {}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket por ponto de log (logger, arquivo, linha): até `rate` mensagens por segundo.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated, suppressed = self._buckets.get(key, (self.rate, now, 0))
+            tokens = min(max(self.rate, 1.0), tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()} (+{suppressed} mensagens suprimidas)"
+            record.args = None
+        return True
+
+
+def _log_path(log_file):
+    if LOG_DIR and not os.path.isabs(log_file):
+        log_file = os.path.join(LOG_DIR, os.path.basename(log_file))
+    return os.path.abspath(log_file)
+
+
+def _file_handler(log_file):
+    if LOG_ROTATION == "size":
+        handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    elif LOG_ROTATION == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+        )
+    else:
+        handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
 
-def setup_logger(name, log_file, level=logging.INFO):
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler = logging.FileHandler(log_file)
-    handler.setFormatter(formatter)
 
+def _get_queue(log_file):
+    """
+    Fila (e listener) do arquivo, criada apenas uma vez por processo.
+    Deve ser chamada com `_lock` adquirido.
+    """
+    path = os.path.abspath(log_file)
+    entry = _listeners.get(path)
+    if entry is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        log_queue = queue.Queue()
+        listener = logging.handlers.QueueListener(log_queue, _file_handler(path), respect_handler_level=True)
+        listener.start()
+        entry = _listeners[path] = (log_queue, listener)
+    return entry[0]
+
+
+class _FileQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que obtém a fila (e inicia o listener do arquivo) no primeiro registro.
+    """
+
+    def __init__(self, log_file):
+        super().__init__(None)
+        self.log_file = _log_path(log_file)
+
+    def enqueue(self, record):
+        if self.queue is None:
+            with _lock:
+                self.queue = _get_queue(self.log_file)
+        self.queue.put_nowait(record)
+
+
+def setup_logger(name, log_file, level=logging.INFO, rate_limit=LOG_RATE_LIMIT):
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    logger.addHandler(handler)
-    return logger
\ No newline at end of file
+    with _lock:
+        for handler in logger.handlers:
+            if isinstance(handler, _FileQueueHandler) and handler.log_file == _log_path(log_file):
+                return logger
+
+        handler = _FileQueueHandler(log_file)
+        if rate_limit > 0:
+            handler.addFilter(RateLimitFilter(rate_limit))
+        logger.addHandler(handler)
+    return logger
+
+
+def flush_logs():
+    """
+    Bloqueia até que todos os registros enfileirados tenham sido gravados.
+    """
+    with _lock:
+        entries = list(_listeners.values())
+    for log_queue, listener in entries:
+        log_queue.join()
+        for handler in listener.handlers:
+            handler.flush()
+
+
+def _stop_listeners():
+    with _lock:
+        for _, listener in _listeners.values():
+            listener.stop()
+        _listeners.clear()
+
+
+atexit.register(_stop_listeners)
@@ -10,27 +10,85 @@ Data Warehouse (PostgreSQL):
 - cryptocurrencies: dimensão de criptomoedas com metadados.
 - crypto_market_data: fatos com dados de mercado vinculados às moedas.
 - crypto_powerbi_summary: visão agregada dos dados para consumo via Power BI.
+- crypto_powerbi_summary_shadow: tabela sombra usada na troca atômica do resumo.
+- etl_watermark: marcas d'água (high-water marks) da carga incremental.
+- crypto_ohlcv_1h / crypto_ohlcv_1d: agregações OHLCV por ativo, por hora e por dia.
+- etl_backfill_progress: unidades de trabalho concluídas do backfill histórico (checkpoint).
+- crypto_analytics: indicadores por ativo e amostra (médias móveis, volatilidade, máxima/mínima 24h).
+- crypto_analytics_state: estado acumulado por ativo usado na atualização incremental dos indicadores.
+
+Em ambos os bancos:
+- etl_schema_version: versão e hash do esquema declarado aplicado por este script,
+  conferidos pelo cache de esquema antes de confiar nas definições declaradas.
 
 Características:
 - Usa SQLAlchemy para abstração da criação das tabelas.
 - Criação automática de campos com timestamp.
-- Relacionamento entre dimensão e fato no DW via chave estrangeira.
+- Datas usam `DATETIME(6)` no MySQL (microssegundos) e o tipo padrão do dialeto nos
+  demais (`TIMESTAMP` no PostgreSQL, texto no SQLite).
+- `crypto_market_data` usa chave substituta (`market_data_id`, `timestamp`), índice único
+  em (`id`, `timestamp`) e índice em `timestamp`. A tabela é particionada por mês em
+  `timestamp` (`partitioning.py`); como o InnoDB não aceita chave estrangeira em tabelas
+  particionadas, o vínculo com `cryptocurrencies` é garantido pelo pipeline.
+- Colunas novas e anuláveis (ex.: `crypto_raw.content_hash`) são adicionadas às tabelas
+  já existentes com `ALTER TABLE ... ADD COLUMN`.
+- As definições (`define_staging_tables`/`define_dw_tables`) também alimentam o
+  cache de esquema (`schema_cache.py`), evitando `MetaData.reflect()` a cada execução.
+- Ao final de `create_all`, o hash das definições (`schema_hash`, que inclui
+  `SCHEMA_VERSION`) é gravado em `etl_schema_version`.
+
+Execução:
+    - PYTHONPATH=. python include/database/create_tables.py
 """
 
-from sqlalchemy import MetaData, Table, Column, String, Text, DECIMAL, DateTime, ForeignKey, Integer
+import hashlib
+from datetime import datetime
+from sqlalchemy import (
+    MetaData, Table, Column, String, Text, DECIMAL, DateTime, Integer, BigInteger, Index, LargeBinary, delete, inspect
+)
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.dialects.mysql import DATETIME as MYSQL_DATETIME
 from sqlalchemy.sql import text
-from db_connection import get_staging_area_engine, get_dw_engine
-from config.logging_config import setup_logger
+from include.database.db_connection import get_staging_area_engine, get_dw_engine
+from include.config.logging_config import setup_logger
 
 logger = setup_logger("create_tables", "logs/pipeline.log")
 
-def create_staging_tables():
-    logger.info("🔧 Criando tabelas da Staging Area...")
-    engine = get_staging_area_engine()
-    metadata = MetaData()
+TIMESTAMP_TYPE = DateTime().with_variant(MYSQL_DATETIME(fsp=6), "mysql")
+
+# Incrementar sempre que as definições abaixo mudarem (invalida o cache de esquema)
+SCHEMA_VERSION = 11
+SCHEMA_VERSION_TABLE = "etl_schema_version"
+# Dialetos suportados: o hash usa o tipo compilado em cada um (inclui as variantes)
+SCHEMA_DIALECTS = (mysql.dialect(), postgresql.dialect(), sqlite.dialect())
+
 
-    crypto_raw = Table(
+def schema_hash(metadata: MetaData) -> str:
+    digest = hashlib.sha256(f"v{SCHEMA_VERSION}".encode())
+    for name in sorted(metadata.tables):
+        table = metadata.tables[name]
+        digest.update(name.encode())
+        for column in table.columns:
+            types = [column.type.compile(dialect=dialect) for dialect in SCHEMA_DIALECTS]
+            digest.update(f"{column.name}:{types}:{column.primary_key}".encode())
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            digest.update(f"{index.name}:{[c.name for c in index.columns]}:{index.unique}".encode())
+    return digest.hexdigest()
+
+
+def define_schema_version_table(metadata: MetaData) -> Table:
+    # Uma única linha (id = 1) com o esquema aplicado por `create_all`
+    return Table(
+        SCHEMA_VERSION_TABLE, metadata,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("schema_version", Integer, nullable=False),
+        Column("schema_hash", String(64), nullable=False),
+        Column("updated_at", TIMESTAMP_TYPE, nullable=False)
+    )
+
+
+def define_staging_tables(metadata: MetaData) -> MetaData:
+    Table(
         "crypto_raw", metadata,
         Column("id", String(100), primary_key=True),
         Column("symbol", String(10)),
@@ -43,53 +101,179 @@ def create_staging_tables():
         Column("change_percent_24hr", DECIMAL(30, 10)),
         Column("vwap_24hr", DECIMAL(30, 10)),
         Column("supply", DECIMAL(30, 10)),
-        Column("timestamp", MYSQL_DATETIME(fsp=6))
+        Column("timestamp", TIMESTAMP_TYPE),
+        # Hash dos valores do ativo (`batch.HASHED_COLUMNS`): ativos inalterados não são reescritos
+        Column("content_hash", String(32))
     )
+    define_schema_version_table(metadata)
+    return metadata
 
-    metadata.create_all(engine)
-    logger.info("✅ Tabelas da Staging Area criadas com sucesso")
-
-
-def create_dw_tables():
-    logger.info("🔧 Criando tabelas do Data Warehouse...")
-    engine = get_dw_engine()
-    metadata = MetaData()
 
-    cryptocurrencies = Table(
+def define_dw_tables(metadata: MetaData) -> MetaData:
+    Table(
         "cryptocurrencies", metadata,
         Column("id", String(100), primary_key=True),
         Column("symbol", String(10)),
         Column("name", String(100)),
         Column("max_supply", DECIMAL(30, 10)),
         Column("explorer", Text),
-        Column("created_at", MYSQL_DATETIME(fsp=6), server_default=text("CURRENT_TIMESTAMP"))
+        Column("created_at", TIMESTAMP_TYPE, server_default=text("CURRENT_TIMESTAMP"))
     )
 
-    crypto_market_data = Table(
+    Table(
         "crypto_market_data", metadata,
-        Column("id", String(100), ForeignKey("cryptocurrencies.id")),
+        Column("market_data_id", BigInteger, primary_key=True, autoincrement=True),
+        Column("id", String(100), nullable=False),
         Column("price_usd", DECIMAL(30, 10)),
         Column("market_cap_usd", DECIMAL(30, 10)),
         Column("volume_usd_24hr", DECIMAL(30, 10)),
         Column("change_percent_24hr", DECIMAL(30, 10)),
         Column("vwap_24hr", DECIMAL(30, 10)),
         Column("supply", DECIMAL(30, 10)),
-        Column("timestamp", MYSQL_DATETIME(fsp=6))
+        # A coluna de particionamento precisa fazer parte de toda chave única
+        Column("timestamp", TIMESTAMP_TYPE, primary_key=True),
+        Index("ux_market_data_id_timestamp", "id", "timestamp", unique=True),
+        Index("ix_market_data_timestamp", "timestamp")
     )
 
-    crypto_powerbi_summary = Table(
-        "crypto_powerbi_summary", metadata,
-        Column("id", String(100)),
-        Column("rank", Integer),
-        Column("symbol", String(10)),
-        Column("supply", DECIMAL(30, 10)),
+    for summary_name in ("crypto_powerbi_summary", "crypto_powerbi_summary_shadow"):
+        Table(
+            summary_name, metadata,
+            Column("id", String(100)),
+            Column("rank", Integer),
+            Column("symbol", String(10)),
+            Column("supply", DECIMAL(30, 10)),
+            Column("price_usd", DECIMAL(30, 10)),
+            Column("updated_at", TIMESTAMP_TYPE)
+        )
+
+    Table(
+        "etl_watermark", metadata,
+        Column("name", String(100), primary_key=True),
+        Column("value", TIMESTAMP_TYPE),
+        Column("updated_at", TIMESTAMP_TYPE)
+    )
+
+    for rollup_name in ("crypto_ohlcv_1h", "crypto_ohlcv_1d"):
+        Table(
+            rollup_name, metadata,
+            Column("id", String(100), primary_key=True),
+            Column("bucket_start", TIMESTAMP_TYPE, primary_key=True),
+            Column("open_price", DECIMAL(30, 10)),
+            Column("high_price", DECIMAL(30, 10)),
+            Column("low_price", DECIMAL(30, 10)),
+            Column("close_price", DECIMAL(30, 10)),
+            Column("avg_volume_usd_24hr", DECIMAL(30, 10)),
+            Column("last_market_cap_usd", DECIMAL(30, 10)),
+            Column("sample_count", Integer, nullable=False),
+            Column("first_timestamp", TIMESTAMP_TYPE),
+            Column("last_timestamp", TIMESTAMP_TYPE)
+        )
+
+    Table(
+        "etl_backfill_progress", metadata,
+        Column("job", String(100), primary_key=True),
+        Column("asset_id", String(100), primary_key=True),
+        Column("window_start", TIMESTAMP_TYPE, primary_key=True),
+        Column("window_end", TIMESTAMP_TYPE, nullable=False),
+        Column("rows", Integer, nullable=False),
+        Column("completed_at", TIMESTAMP_TYPE)
+    )
+
+    Table(
+        "crypto_analytics", metadata,
+        Column("id", String(100), primary_key=True),
+        Column("timestamp", TIMESTAMP_TYPE, primary_key=True),
         Column("price_usd", DECIMAL(30, 10)),
-        Column("updated_at", MYSQL_DATETIME(fsp=6))
+        Column("ema_short", DECIMAL(30, 10)),
+        Column("ema_long", DECIMAL(30, 10)),
+        Column("sma", DECIMAL(30, 10)),
+        Column("volatility", DECIMAL(30, 10)),
+        Column("high_24h", DECIMAL(30, 10)),
+        Column("low_24h", DECIMAL(30, 10)),
+        Index("ix_analytics_timestamp", "timestamp")
+    )
+
+    Table(
+        "crypto_analytics_state", metadata,
+        Column("id", String(100), primary_key=True),
+        Column("last_timestamp", TIMESTAMP_TYPE, nullable=False),
+        Column("samples", Integer, nullable=False),
+        # Janelas usadas para montar `state`; uma mudança de configuração reinicia o estado
+        Column("layout", String(100), nullable=False),
+        Column("state", LargeBinary, nullable=False)
     )
+    define_schema_version_table(metadata)
+    return metadata
 
+
+def create_all(metadata: MetaData, engine):
+    """
+    Cria as tabelas de `metadata` em `engine`. No SQLite (substituto local do MySQL em
+    testes e no benchmark) a chave substituta de `crypto_market_data` não pode ser
+    AUTO_INCREMENT (chave composta): ela fica nula e a unicidade vem do índice (id, timestamp).
+    """
+    if engine.dialect.name == "sqlite" and "crypto_market_data" in metadata.tables:
+        surrogate = metadata.tables["crypto_market_data"].c.market_data_id
+        surrogate.autoincrement, surrogate.nullable = False, True
     metadata.create_all(engine)
+    add_missing_columns(metadata, engine)
+    record_schema_version(metadata, engine)
+
+
+def add_missing_columns(metadata: MetaData, engine):
+    """
+    Adiciona às tabelas existentes as colunas anuláveis declaradas que ainda não existem.
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable or column.server_default is not None:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+                logger.info(f"🔧 Coluna '{column.name}' adicionada à tabela '{table.name}'")
+
+
+def record_schema_version(metadata: MetaData, engine):
+    """
+    Grava em `etl_schema_version` a versão e o hash das definições aplicadas.
+    """
+    if SCHEMA_VERSION_TABLE not in metadata.tables:
+        return
+    version_table = metadata.tables[SCHEMA_VERSION_TABLE]
+    with engine.begin() as conn:
+        conn.execute(delete(version_table))
+        conn.execute(version_table.insert(), {"id": 1, "schema_version": SCHEMA_VERSION,
+                                              "schema_hash": schema_hash(metadata), "updated_at": datetime.utcnow()})
+    logger.info(f"🔖 Esquema versão {SCHEMA_VERSION} registrado em '{SCHEMA_VERSION_TABLE}'")
+
+
+def create_staging_tables():
+    logger.info("🔧 Criando tabelas da Staging Area...")
+    engine = get_staging_area_engine(verify=False)
+    metadata = define_staging_tables(MetaData())
+
+    create_all(metadata, engine)
+    logger.info("✅ Tabelas da Staging Area criadas com sucesso")
+
+
+def create_dw_tables():
+    logger.info("🔧 Criando tabelas do Data Warehouse...")
+    engine = get_dw_engine(verify=False)
+    metadata = define_dw_tables(MetaData())
+
+    create_all(metadata, engine)
     logger.info("✅ Tabelas do DW criadas com sucesso")
 
+    # Aplica chave/índices/partições em tabelas já existentes e cria as partições futuras
+    if engine.dialect.name == "mysql":
+        from include.database.partitioning import migrate_market_data
+        migrate_market_data(engine)
+
 
 if __name__ == "__main__":
     try:
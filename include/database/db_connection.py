@@ -3,65 +3,205 @@ db_connection.py
 
 Este módulo contém funções para criar conexões com bancos de dados MySQL,
 tanto locais quanto em nuvem (GCP Cloud SQL), utilizando SQLAlchemy e Cloud SQL Connector.
+O DW no Cloud SQL pode ser MySQL (pymysql) ou PostgreSQL (pg8000), conforme `GCP_DB_DIALECT`.
+
+As engines são mantidas em um registro por processo, indexado pelo destino
+("staging" ou "dw"), para que execuções repetidas da DAG ou manuais reutilizem
+o pool de conexões já aquecido em vez de refazer os handshakes TLS/IAM. Cada engine
+criada tem seus comandos SQL contados e cronometrados pelas métricas (`metrics.py`).
+
+Antes de a engine ser entregue, o esquema gravado no banco é conferido com o declarado
+(`schema_cache.verify_schema`, uma vez por destino); `create_tables.py` obtém as engines
+sem essa verificação, já que é ele quem aplica e registra o esquema.
+
+`STAGING_DATABASE_URL`/`DW_DATABASE_URL`, quando definidas, substituem as conexões
+padrão por uma URL SQLAlchemy qualquer (MySQL local em container, SQLite no benchmark).
 
 Funções:
-- get_staging_area_engine: Cria engine para banco de dados MySQL local (staging area).
-- get_dw_engine: Cria engine para banco de dados MySQL hospedado no GCP via Cloud SQL Connector.
+- get_staging_area_engine: Retorna a engine (em cache) do MySQL local (staging area).
+- get_dw_engine: Retorna a engine (em cache) do DW hospedado no GCP via Cloud SQL Connector.
+- get_pool_stats: Retorna os contadores de acertos/falhas do registro de engines.
+- dispose_engines: Libera todas as engines e fecha o Cloud SQL Connector.
 """
 
-from google.cloud.sql.connector import Connector
+import atexit
+import threading
 from sqlalchemy import create_engine, text
 from include.config.config import (
-    MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_PORT,
-    GCP_PROJECT_ID, GCP_REGION, GCP_INSTANCE_NAME, GCP_DB_NAME, GCP_DB_USER, GCP_DB_PASSWORD
+    MYSQL_HOST, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DB, MYSQL_PORT, STAGING_DATABASE_URL,
+    GCP_PROJECT_ID, GCP_REGION, GCP_INSTANCE_NAME, GCP_DB_NAME, GCP_DB_USER, GCP_DB_PASSWORD, GCP_DB_DIALECT,
+    DW_DATABASE_URL,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_TIMEOUT
 )
+from include.etl.metrics import instrument_engine
 import logging
 
-def get_staging_area_engine():
+STAGING = "staging"
+DW = "dw"
+
+_engines = {}
+_connector = None
+_lock = threading.Lock()
+_pool_stats = {"hits": 0, "misses": 0}
+
+# Dialeto do DW no Cloud SQL -> (URL SQLAlchemy, driver do Cloud SQL Connector)
+_CLOUD_SQL_DRIVERS = {
+    "mysql": ("mysql+pymysql://", "pymysql"),
+    "postgresql": ("postgresql+pg8000://", "pg8000"),
+}
+
+
+def _pool_options():
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+
+
+def _get_connector():
+    """
+    Cria o Cloud SQL Connector apenas uma vez por processo.
+    Deve ser chamado com `_lock` adquirido.
+    """
+    global _connector
+    if _connector is None:
+        # Importação tardia: o connector (aiohttp, google-auth) custa ~0,3s e só é
+        # necessário no DW em nuvem, não na staging nem no parse da DAG
+        from google.cloud.sql.connector import Connector
+        _connector = Connector()
+    return _connector
+
+
+def _get_or_create_engine(target, factory):
+    with _lock:
+        engine = _engines.get(target)
+        if engine is not None:
+            _pool_stats["hits"] += 1
+            return engine
+
+        _pool_stats["misses"] += 1
+        engine = instrument_engine(factory())
+        _engines[target] = engine
+        return engine
+
+
+def _create_url_engine(url):
+    # O SQLite usa um pool próprio (sem tamanho/overflow configuráveis)
+    options = {} if url.startswith("sqlite") else _pool_options()
+    return create_engine(url, **options)
+
+
+def _create_staging_engine():
+    if STAGING_DATABASE_URL:
+        return _create_url_engine(STAGING_DATABASE_URL)
+    connection_string = (
+        f"mysql+mysqlconnector://"
+        f"{MYSQL_USER}:{MYSQL_PASSWORD}@"
+        f"{MYSQL_HOST}:{MYSQL_PORT}/"
+        f"{MYSQL_DB}"
+    )
+    engine = create_engine(connection_string, **_pool_options())
+    logging.info("Conexão com MySQL estabelecida com sucesso.")
+    return engine
+
+
+def _create_dw_engine():
+    if DW_DATABASE_URL:
+        return _create_url_engine(DW_DATABASE_URL)
+    if GCP_DB_DIALECT not in _CLOUD_SQL_DRIVERS:
+        raise ValueError(f"GCP_DB_DIALECT inválido: {GCP_DB_DIALECT} (use mysql | postgresql)")
+    url, driver = _CLOUD_SQL_DRIVERS[GCP_DB_DIALECT]
+    connector = _get_connector()
+
+    engine = create_engine(
+        url,
+        creator=lambda: connector.connect(
+            f"{GCP_PROJECT_ID}:{GCP_REGION}:{GCP_INSTANCE_NAME}",
+            driver,
+            user=GCP_DB_USER,
+            password=GCP_DB_PASSWORD,
+            db=GCP_DB_NAME
+        ),
+        **_pool_options()
+    )
+
+    # Teste rápido da conexão (apenas na criação; chamadas seguintes reutilizam o pool)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    logging.info("✅ Engine criada com sucesso (usando Cloud SQL Connector).")
+    return engine
+
+
+def _verified(target, engine, verify: bool):
+    if verify:
+        # Importação tardia: schema_cache depende deste módulo (STAGING/DW)
+        from include.database.schema_cache import verify_schema
+        verify_schema(target, engine)
+    return engine
+
+
+def get_staging_area_engine(verify: bool = True):
     """
     Retorna uma engine SQLAlchemy para conexão com o MySQL (staging area).
-    Usa variáveis importadas do config.py
+    Usa variáveis importadas do config.py. A engine é criada na primeira chamada
+    e reutilizada nas seguintes.
     """
     try:
-        connection_string = (
-            f"mysql+mysqlconnector://"
-            f"{MYSQL_USER}:{MYSQL_PASSWORD}@"
-            f"{MYSQL_HOST}:{MYSQL_PORT}/"
-            f"{MYSQL_DB}"
-        )
-        engine = create_engine(connection_string, pool_pre_ping=True)
-        logging.info("Conexão com MySQL estabelecida com sucesso.")
-        return engine
+        engine = _get_or_create_engine(STAGING, _create_staging_engine)
     except Exception as e:
         logging.error(f"Erro ao conectar no MySQL: {e}")
         raise
+    return _verified(STAGING, engine, verify)
+
 
-def get_dw_engine():
+def get_dw_engine(verify: bool = True):
     """
-    Retorna uma Engine SQLAlchemy para Cloud SQL MySQL, usando Cloud SQL Connector.
+    Retorna uma Engine SQLAlchemy para o Cloud SQL (MySQL ou PostgreSQL), usando Cloud SQL Connector.
+    A engine e o Connector são criados uma única vez por processo.
     """
     try:
-        # Configuração do Cloud SQL Connector (exatamente como no seu exemplo)
-        connector = Connector()
-        
-        engine = create_engine(
-            "mysql+pymysql://",
-            creator=lambda: connector.connect(
-               f"{GCP_PROJECT_ID}:{GCP_REGION}:{GCP_INSTANCE_NAME}", 
-                "pymysql",
-                user=GCP_DB_USER,
-                password=GCP_DB_PASSWORD,
-                db=GCP_DB_NAME
-            ),
-        )
-        
-        # Teste rápido da conexão
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1")) 
-        
-        logging.info("✅ Engine criada com sucesso (usando Cloud SQL Connector).")
-        return engine
-
+        engine = _get_or_create_engine(DW, _create_dw_engine)
     except Exception as e:
         logging.error(f"❌ Falha ao criar a Engine: {e}")
         raise
+    return _verified(DW, engine, verify)
+
+
+def get_pool_stats():
+    """
+    Retorna um dicionário com acertos/falhas do registro de engines e o
+    estado atual de cada pool (`Pool.status()`).
+    """
+    with _lock:
+        stats = dict(_pool_stats)
+        stats["pools"] = {target: engine.pool.status() for target, engine in _engines.items()}
+    return stats
+
+
+def dispose_engines():
+    """
+    Libera todas as conexões em cache e fecha o Cloud SQL Connector.
+    Registrada com `atexit` para rodar no encerramento do worker.
+    """
+    global _connector
+    with _lock:
+        for target, engine in list(_engines.items()):
+            try:
+                engine.dispose()
+            except Exception as e:
+                logging.warning(f"⚠️ Falha ao liberar engine '{target}': {e}")
+        _engines.clear()
+
+        if _connector is not None:
+            try:
+                _connector.close()
+            except Exception as e:
+                logging.warning(f"⚠️ Falha ao fechar o Cloud SQL Connector: {e}")
+            _connector = None
+
+
+atexit.register(dispose_engines)
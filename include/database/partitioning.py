@@ -0,0 +1,234 @@
+"""
+partitioning.py
+
+Este módulo gerencia o particionamento mensal e a retenção da tabela de fatos
+`crypto_market_data` no Data Warehouse (MySQL).
+
+Funcionamento:
+- A tabela é particionada por `RANGE COLUMNS(timestamp)`, uma partição por mês
+  (`pAAAAMM`), mais a partição coringa `pmax` (`MAXVALUE`).
+- A manutenção cria antecipadamente as partições dos próximos
+  `MARKET_DATA_PARTITIONS_AHEAD` meses, dividindo `pmax`.
+- Partições mais antigas que `MARKET_DATA_RETENTION_MONTHS` são arquivadas em
+  `crypto_market_data_archive` e removidas (`archive`), apenas removidas (`drop`)
+  ou mantidas (`keep`).
+
+Funções:
+- migrate_market_data: Migra uma tabela existente (remove FK, cria chave substituta,
+  índices e particionamento). Idempotente.
+- run_partition_maintenance: Cria partições futuras e aplica a política de retenção.
+
+Execução:
+    - PYTHONPATH=. python include/database/partitioning.py            (manutenção)
+    - PYTHONPATH=. python include/database/partitioning.py --migrate  (migração + manutenção)
+"""
+
+import sys
+from datetime import date
+from typing import List, Tuple
+from sqlalchemy import text
+from include.config.config import (
+    MARKET_DATA_PARTITIONS_AHEAD, MARKET_DATA_RETENTION_MONTHS, MARKET_DATA_RETENTION_POLICY
+)
+from include.database.db_connection import get_dw_engine
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("partitioning", "logs/pipeline.log")
+
+TABLE = "crypto_market_data"
+ARCHIVE_TABLE = "crypto_market_data_archive"
+MAX_PARTITION = "pmax"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + (day.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def planned_partitions(first_month: date, last_month: date) -> List[Tuple[str, date]]:
+    """
+    Retorna (nome, limite superior exclusivo) de cada partição mensal entre
+    `first_month` e `last_month`, inclusive.
+    """
+    partitions = []
+    month = month_start(first_month)
+    while month <= last_month:
+        partitions.append((partition_name(month), add_months(month, 1)))
+        month = add_months(month, 1)
+    return partitions
+
+
+def expired_partitions(existing: List[str], today: date, retention_months: int) -> List[str]:
+    """
+    Partições mensais cujo mês inteiro é anterior à janela de retenção.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = partition_name(add_months(month_start(today), -retention_months))
+    return sorted(name for name in existing if name != MAX_PARTITION and name < cutoff)
+
+
+def _partition_clause(partitions: List[Tuple[str, date]]) -> str:
+    definitions = [f"PARTITION {name} VALUES LESS THAN ('{bound.isoformat()}')" for name, bound in partitions]
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)")
+    return ", ".join(definitions)
+
+
+def _existing_partitions(conn, table: str = TABLE) -> List[str]:
+    rows = conn.execute(text("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL
+    """), {"table": table}).scalars().all()
+    return list(rows)
+
+
+def _columns(conn) -> List[str]:
+    return list(conn.execute(text("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+    """), {"table": TABLE}).scalars().all())
+
+
+def _indexes(conn) -> List[str]:
+    return list(conn.execute(text("""
+        SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+    """), {"table": TABLE}).scalars().all())
+
+
+def _foreign_keys(conn) -> List[str]:
+    return list(conn.execute(text("""
+        SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+    """), {"table": TABLE}).scalars().all())
+
+
+def migrate_market_data(engine=None, today: date = None):
+    """
+    Leva uma `crypto_market_data` criada pelo esquema antigo (sem chave, com FK)
+    ao esquema atual. Cada passo verifica o estado antes de agir, então a função
+    pode ser executada quantas vezes for necessário.
+    """
+    engine = engine or get_dw_engine()
+    today = today or date.today()
+
+    # DDL no MySQL faz commit implícito: cada passo roda em sua própria transação
+    with engine.begin() as conn:
+        for fk_name in _foreign_keys(conn):
+            logger.info(f"🔧 Removendo chave estrangeira {fk_name} (incompatível com particionamento)")
+            conn.execute(text(f"ALTER TABLE {TABLE} DROP FOREIGN KEY `{fk_name}`"))
+
+    with engine.begin() as conn:
+        if "market_data_id" not in _columns(conn):
+            logger.info("🔧 Criando chave substituta market_data_id")
+            # Fatos sem timestamp não têm partição possível (nem utilidade em séries temporais)
+            orphans = conn.execute(text(f"DELETE FROM {TABLE} WHERE `timestamp` IS NULL")).rowcount
+            if orphans:
+                logger.warning(f"⚠️ {orphans} fatos sem timestamp removidos")
+            conn.execute(text(f"""
+                ALTER TABLE {TABLE}
+                    MODIFY `id` VARCHAR(100) NOT NULL,
+                    MODIFY `timestamp` DATETIME(6) NOT NULL,
+                    ADD COLUMN market_data_id BIGINT NOT NULL AUTO_INCREMENT FIRST,
+                    ADD PRIMARY KEY (market_data_id, `timestamp`)
+            """))
+
+    with engine.begin() as conn:
+        indexes = _indexes(conn)
+        if "ux_market_data_id_timestamp" not in indexes:
+            logger.info("🔧 Removendo duplicatas de (id, timestamp) e criando índice único")
+            conn.execute(text(f"""
+                DELETE newer FROM {TABLE} newer
+                JOIN {TABLE} older
+                  ON newer.id = older.id AND newer.`timestamp` = older.`timestamp`
+                 AND newer.market_data_id > older.market_data_id
+            """))
+            conn.execute(text(f"CREATE UNIQUE INDEX ux_market_data_id_timestamp ON {TABLE} (id, `timestamp`)"))
+        if "ix_market_data_timestamp" not in indexes:
+            conn.execute(text(f"CREATE INDEX ix_market_data_timestamp ON {TABLE} (`timestamp`)"))
+
+    with engine.begin() as conn:
+        if not _existing_partitions(conn):
+            oldest = conn.execute(text(f"SELECT MIN(`timestamp`) FROM {TABLE}")).scalar()
+            first_month = month_start(oldest.date() if oldest else today)
+            last_month = add_months(month_start(today), MARKET_DATA_PARTITIONS_AHEAD)
+            partitions = planned_partitions(first_month, last_month)
+            logger.info(f"🔧 Particionando {TABLE} em {len(partitions)} partições mensais")
+            conn.execute(text(
+                f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(`timestamp`) ({_partition_clause(partitions)})"
+            ))
+
+    logger.info(f"✅ Migração de {TABLE} concluída")
+    run_partition_maintenance(engine, today)
+
+
+def ensure_future_partitions(conn, today: date, months_ahead: int = MARKET_DATA_PARTITIONS_AHEAD) -> List[str]:
+    existing = set(_existing_partitions(conn))
+    if not existing:
+        logger.warning(f"⚠️ {TABLE} não está particionada; execute partitioning.py --migrate")
+        return []
+    last_month = add_months(month_start(today), months_ahead)
+    missing = [p for p in planned_partitions(month_start(today), last_month) if p[0] not in existing]
+    if not missing:
+        return []
+
+    # Só é possível dividir a pmax para frente: ignora meses anteriores à última partição criada
+    latest = max((name for name in existing if name != MAX_PARTITION), default="")
+    missing = [p for p in missing if p[0] > latest]
+    if missing:
+        conn.execute(text(
+            f"ALTER TABLE {TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO ({_partition_clause(missing)})"
+        ))
+    return [name for name, _ in missing]
+
+
+def apply_retention(conn, today: date, retention_months: int = MARKET_DATA_RETENTION_MONTHS,
+                    policy: str = MARKET_DATA_RETENTION_POLICY) -> List[str]:
+    expired = expired_partitions(_existing_partitions(conn), today, retention_months)
+    if not expired or policy == "keep":
+        return []
+
+    if policy == "archive":
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {ARCHIVE_TABLE} LIKE {TABLE}"))
+        if _existing_partitions(conn, ARCHIVE_TABLE):
+            conn.execute(text(f"ALTER TABLE {ARCHIVE_TABLE} REMOVE PARTITIONING"))
+        for name in expired:
+            conn.execute(text(f"INSERT IGNORE INTO {ARCHIVE_TABLE} SELECT * FROM {TABLE} PARTITION ({name})"))
+    elif policy != "drop":
+        raise ValueError(f"Política de retenção desconhecida: {policy}")
+
+    conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(expired)}"))
+    return expired
+
+
+def run_partition_maintenance(engine=None, today: date = None):
+    logger.info(f"🔧 Manutenção de partições de {TABLE}...")
+    engine = engine or get_dw_engine()
+    today = today or date.today()
+    try:
+        with engine.begin() as conn:
+            created = ensure_future_partitions(conn, today)
+        with engine.begin() as conn:
+            expired = apply_retention(conn, today)
+        logger.info(
+            f"✅ Partições criadas: {created or 'nenhuma'}; "
+            f"expiradas ({MARKET_DATA_RETENTION_POLICY}): {expired or 'nenhuma'}"
+        )
+    except Exception as e:
+        logger.error(f"❌ Erro na manutenção de partições: {str(e)}")
+        raise
+
+
+if __name__ == "__main__":
+    if "--migrate" in sys.argv:
+        migrate_market_data()
+    else:
+        run_partition_maintenance()
@@ -0,0 +1,139 @@
+"""
+schema_cache.py
+
+Este módulo mantém um cache, por processo, das definições de tabelas usadas
+pelo pipeline, evitando `MetaData.reflect()` (várias consultas ao
+information_schema por tabela) a cada execução.
+
+Funcionamento:
+- O cache é alimentado diretamente pelas definições de `create_tables.py`
+  (`define_staging_tables`/`define_dw_tables`), sem nenhuma consulta ao banco.
+- Cada destino guarda o hash do esquema declarado (incluindo `SCHEMA_VERSION`).
+  `verify_schema`, chamada por `db_connection` na primeira obtenção de cada engine,
+  compara esse hash com o gravado por `create_tables.py` em `etl_schema_version`:
+  se diferirem, o cache do destino é descartado (`invalidate`) e a execução falha até
+  que o banco seja migrado. Bancos sem registro de versão são aceitos com um aviso.
+- Tabelas que não estão declaradas são refletidas individualmente (`only=[nome]`)
+  e expiram após `SCHEMA_CACHE_TTL` segundos (0 = nunca expiram).
+
+Funções:
+- get_table: Retorna a `Table` de um destino ("staging" ou "dw").
+- get_schema_hash: Retorna o hash do esquema declarado de um destino.
+- verify_schema: Confere o esquema gravado no banco com o declarado.
+- invalidate: Descarta o cache de um destino (ou de todos), ex.: após migrações.
+"""
+
+import threading
+import time
+from sqlalchemy import MetaData, Table, inspect, select
+from include.config.config import SCHEMA_CACHE_TTL
+from include.database import create_tables
+from include.database.create_tables import SCHEMA_VERSION_TABLE, schema_hash
+from include.database.db_connection import STAGING, DW
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("schema_cache", "logs/pipeline.log")
+
+_DEFINITIONS = {
+    STAGING: create_tables.define_staging_tables,
+    DW: create_tables.define_dw_tables,
+}
+
+_declared = {}   # destino -> (MetaData, hash)
+_reflected = {}  # (destino, tabela) -> (Table, expira_em)
+_verified = set()  # destinos cujo esquema no banco já foi conferido
+_lock = threading.Lock()
+
+
+def _declared_metadata(target: str) -> MetaData:
+    cached = _declared.get(target)
+    if cached is not None:
+        return cached[0]
+
+    metadata = _DEFINITIONS[target](MetaData())
+    _declared[target] = (metadata, schema_hash(metadata))
+    return metadata
+
+
+def _declared_hash(target: str) -> str:
+    _declared_metadata(target)
+    return _declared[target][1]
+
+
+def get_schema_hash(target: str) -> str:
+    with _lock:
+        return _declared_hash(target)
+
+
+def verify_schema(target: str, bind) -> bool:
+    """
+    Compara o hash gravado em `etl_schema_version` com o do esquema declarado de `target`.
+    Retorna True se conferem e False se o banco não tem registro de versão; em caso de
+    divergência, descarta o cache do destino e levanta `RuntimeError`. A consulta é feita
+    uma vez por destino e processo (até o próximo `invalidate`).
+    """
+    with _lock:
+        if target in _verified:
+            return True
+        expected = _declared_hash(target)
+
+    if not inspect(bind).has_table(SCHEMA_VERSION_TABLE):
+        stored = None
+    else:
+        with bind.connect() as conn:
+            stored = conn.execute(select(get_table(target, SCHEMA_VERSION_TABLE))).mappings().first()
+
+    if stored is None:
+        logger.warning(f"⚠️ Banco '{target}' sem registro de versão do esquema: rode create_tables.py")
+        with _lock:
+            _verified.add(target)
+        return False
+    if stored["schema_hash"] != expected:
+        invalidate(target)
+        raise RuntimeError(
+            f"❌ Esquema do banco '{target}' (versão {stored['schema_version']}) difere do declarado "
+            f"(versão {create_tables.SCHEMA_VERSION}): rode create_tables.py antes do pipeline"
+        )
+    with _lock:
+        _verified.add(target)
+    return True
+
+
+def get_table(target: str, name: str, bind=None) -> Table:
+    """
+    Retorna a definição da tabela `name` no destino `target`.
+    `bind` só é usado se a tabela não estiver declarada em `create_tables.py`.
+    """
+    with _lock:
+        if target in _DEFINITIONS:
+            metadata = _declared_metadata(target)
+            if name in metadata.tables:
+                return metadata.tables[name]
+
+        key = (target, name)
+        cached = _reflected.get(key)
+        if cached is not None and (cached[1] is None or cached[1] > time.monotonic()):
+            return cached[0]
+
+        if bind is None:
+            raise KeyError(f"Tabela '{name}' não declarada para '{target}' e nenhuma conexão informada")
+
+        metadata = MetaData()
+        metadata.reflect(bind=bind, only=[name])
+        table = metadata.tables[name]
+        expires_at = time.monotonic() + SCHEMA_CACHE_TTL if SCHEMA_CACHE_TTL > 0 else None
+        _reflected[key] = (table, expires_at)
+        return table
+
+
+def invalidate(target: str = None):
+    with _lock:
+        if target is None:
+            _declared.clear()
+            _reflected.clear()
+            _verified.clear()
+            return
+        _declared.pop(target, None)
+        _verified.discard(target)
+        for key in [k for k in _reflected if k[0] == target]:
+            del _reflected[key]
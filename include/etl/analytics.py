@@ -0,0 +1,264 @@
+"""
+analytics.py
+
+Este módulo mantém indicadores de mercado pré-calculados por ativo na tabela
+`crypto_analytics`, para que os dashboards leiam valores prontos em vez de recalculá-los
+sobre o histórico de `crypto_market_data` a cada atualização.
+
+Indicadores (janelas em amostras, configuráveis em `ANALYTICS_*`):
+- ema_short / ema_long: médias móveis exponenciais do preço (alfa = 2 / (janela + 1));
+- sma: média móvel simples dos últimos preços;
+- volatility: desvio padrão amostral dos log-retornos entre amostras consecutivas;
+- high_24h / low_24h: máxima e mínima das últimas 24 horas (resolução de uma hora).
+
+Funcionamento:
+- O estado de cada ativo (último preço, EMAs, janelas circulares de preços e retornos,
+  máxima/mínima por hora) fica em `crypto_analytics_state`, como um vetor `float64`.
+- Cada execução lê os fatos a partir da marca d'água (`crypto_analytics` em
+  `etl_watermark`) menos `ANALYTICS_LOOKBACK_MINUTES`, e o estado dos ativos desses fatos.
+  A marca d'água é o maior timestamp aplicado, não a ordem de confirmação: um lote da DAG
+  pode ser confirmado depois de fatos mais novos do daemon (ou de outra faixa), e a janela
+  relida recupera esses fatos atrasados. Os fatos relidos já aplicados são descartados por
+  (id, timestamp) pelo último timestamp de cada ativo (abaixo). As amostras são aplicadas
+  em ordem de tempo: a cada passo, uma amostra de cada ativo, com operações vetorizadas
+  sobre todos os ativos (O(ativos) por passo, sem reler o histórico).
+- Estado, indicadores e marca d'água são gravados na mesma transação. Amostras com
+  timestamp até o último aplicado ao ativo são ignoradas: reexecuções, a janela relida e
+  backfills de períodos antigos não alteram o estado. Um fato atrasado só é aplicado se
+  for mais novo que a última amostra do seu ativo (o estado é sequencial).
+- Na primeira execução (sem marca d'água), o estado é iniciado com as últimas 24 horas.
+  Mudar as janelas reinicia o estado dos ativos (o `layout` gravado deixa de conferir).
+
+Classes:
+- RollingState: Estado dos indicadores de um conjunto de ativos, em arrays NumPy.
+
+Funções:
+- update_analytics: Aplica os fatos novos do DW ao estado e grava os indicadores.
+
+Execução:
+    - PYTHONPATH=. python include/etl/analytics.py
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import func, select
+from include.config.config import (
+    ANALYTICS_EMA_LONG, ANALYTICS_EMA_SHORT, ANALYTICS_LOOKBACK_MINUTES, ANALYTICS_SMA_WINDOW,
+    ANALYTICS_VOLATILITY_WINDOW, STAGING_CHUNK_SIZE
+)
+from include.database.db_connection import get_dw_engine, DW
+from include.database.schema_cache import get_table
+from include.etl import metrics
+from include.etl.batch import nullable_list
+from include.etl.bulk_load import bulk_write
+from include.etl.transform_load_final import read_watermark, write_watermark
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("analytics", "logs/pipeline.log")
+
+ANALYTICS_COLUMNS = ("id", "timestamp", "price_usd", "ema_short", "ema_long", "sma", "volatility",
+                     "high_24h", "low_24h")
+STATE_COLUMNS = ("id", "last_timestamp", "samples", "layout", "state")
+WATERMARK_NAME = "crypto_analytics"
+BOOTSTRAP = timedelta(hours=24)
+HOURS = 24
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+HOUR = 3600 * 1_000_000  # microssegundos
+
+
+def _micros(timestamps: Sequence[datetime]) -> np.ndarray:
+    return np.fromiter(((timestamp - EPOCH) // MICROSECOND for timestamp in timestamps),
+                       dtype=np.int64, count=len(timestamps))
+
+
+class RollingState:
+    """
+    Uma linha de `values` por ativo: [último preço | EMA curta, EMA longa | preços (SMA) |
+    retornos (volatilidade) | máximas por hora | mínimas por hora | hora de cada posição].
+    """
+
+    def __init__(self, ids: Sequence[str], ema_short: int = ANALYTICS_EMA_SHORT, ema_long: int = ANALYTICS_EMA_LONG,
+                 sma_window: int = ANALYTICS_SMA_WINDOW, volatility_window: int = ANALYTICS_VOLATILITY_WINDOW):
+        self.ids = list(ids)
+        self.index = {asset_id: row for row, asset_id in enumerate(self.ids)}
+        self.windows = (ema_short, ema_long, sma_window, volatility_window)
+        bounds = np.cumsum([0, 1, 2, sma_window, volatility_window, HOURS, HOURS, HOURS]).tolist()
+        (self._price, self._ema, self._prices, self._returns, self._highs, self._lows,
+         self._hours) = [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+        self.alphas = 2.0 / (np.array([ema_short, ema_long], dtype=np.float64) + 1.0)
+        self.values = np.full((len(self.ids), bounds[-1]), np.nan)
+        self.values[:, self._hours] = -1.0
+        self.samples = np.zeros(len(self.ids), dtype=np.int64)
+        self.last_time = np.full(len(self.ids), np.iinfo(np.int64).min, dtype=np.int64)
+
+    @property
+    def layout(self) -> str:
+        return "ema{}-{}/sma{}/vol{}/h{}".format(*self.windows, HOURS)
+
+    @classmethod
+    def load(cls, conn, ids: Sequence[str], **windows) -> "RollingState":
+        """
+        Estado gravado dos ativos `ids`; ativos novos (ou com outro layout) começam vazios.
+        """
+        state = cls(ids, **windows)
+        state_table = get_table(DW, "crypto_analytics_state")
+        stored = conn.execute(select(state_table).where(state_table.c.id.in_(state.ids))).all()
+        for row in stored:
+            if row.layout != state.layout:
+                continue
+            index = state.index[row.id]
+            state.values[index] = np.frombuffer(row.state, dtype=np.float64)
+            state.samples[index] = row.samples
+            state.last_time[index] = (row.last_timestamp - EPOCH) // MICROSECOND
+        return state
+
+    def rows(self) -> List[Tuple]:
+        """
+        Linhas de `crypto_analytics_state` (na ordem de `STATE_COLUMNS`) dos ativos com amostras.
+        """
+        layout = self.layout
+        return [
+            (asset_id, EPOCH + int(self.last_time[index]) * MICROSECOND, int(self.samples[index]), layout,
+             self.values[index].tobytes())
+            for index, asset_id in enumerate(self.ids) if self.samples[index]
+        ]
+
+    def _step(self, rows: np.ndarray, prices: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """
+        Aplica uma amostra a cada ativo de `rows` (sem repetições) e retorna os indicadores
+        (EMA curta, EMA longa, SMA, volatilidade, máxima 24h, mínima 24h).
+        """
+        values, samples = self.values, self.samples[rows]
+        fresh = samples == 0
+        previous = values[rows, self._price.start]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.log(prices / previous)
+        returns[fresh | ~(previous > 0) | ~(prices > 0)] = np.nan
+
+        ema = values[rows, self._ema]
+        ema = np.where(fresh[:, None], prices[:, None], ema + self.alphas * (prices[:, None] - ema))
+        values[rows, self._ema] = ema
+
+        sma_window, volatility_window = self.windows[2:]
+        values[rows, self._prices.start + samples % sma_window] = prices
+        values[rows, self._returns.start + (samples - 1) % volatility_window] = returns
+
+        # Máxima/mínima por hora em posições circulares; posições de outra hora são reiniciadas
+        hours = times // HOUR
+        offset = hours % HOURS
+        stale = values[rows, self._hours.start + offset] != hours
+        high, low = values[rows, self._highs.start + offset], values[rows, self._lows.start + offset]
+        values[rows, self._highs.start + offset] = np.where(stale, prices, np.fmax(high, prices))
+        values[rows, self._lows.start + offset] = np.where(stale, prices, np.fmin(low, prices))
+        values[rows, self._hours.start + offset] = hours
+        live = values[rows, self._hours] > (hours - HOURS)[:, None]
+        high_24h = np.where(live, values[rows, self._highs], -np.inf).max(axis=1)
+        low_24h = np.where(live, values[rows, self._lows], np.inf).min(axis=1)
+
+        sma = np.nanmean(values[rows, self._prices], axis=1)
+        window = values[rows, self._returns]
+        count = np.count_nonzero(~np.isnan(window), axis=1)
+        mean = np.nansum(window, axis=1) / np.maximum(count, 1)
+        variance = np.nansum((window - mean[:, None]) ** 2, axis=1) / np.maximum(count - 1, 1)
+        volatility = np.where(count >= 2, np.sqrt(variance), np.nan)
+
+        values[rows, self._price.start] = prices
+        self.samples[rows] = samples + 1
+        self.last_time[rows] = times
+        return np.column_stack([ema[:, 0], ema[:, 1], sma, volatility, high_24h, low_24h])
+
+    def apply(self, ids: Sequence[str], prices: Sequence[float], timestamps: Sequence[datetime]) -> List[Tuple]:
+        """
+        Aplica as amostras (em qualquer ordem) e retorna as linhas de `crypto_analytics`
+        (na ordem de `ANALYTICS_COLUMNS`) das amostras efetivamente aplicadas.
+        """
+        rows = np.fromiter((self.index[asset_id] for asset_id in ids), dtype=np.int64, count=len(ids))
+        prices = np.asarray(prices, dtype=np.float64)
+        times = _micros(timestamps)
+        order = np.lexsort((times, rows))
+        order = order[~np.isnan(prices[order]) & (times[order] > self.last_time[rows[order]])]
+        if not len(order):
+            return []
+        rows, prices, times = rows[order], prices[order], times[order]
+
+        # Posição de cada amostra dentro do seu ativo: o passo k aplica a k-ésima de cada ativo
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        position = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        by_step = np.argsort(position, kind="stable")
+        bounds = np.searchsorted(position[by_step], np.arange(position.max() + 2))
+        indicators = np.empty((len(rows), 6))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            step = by_step[start:end]
+            indicators[step] = self._step(rows[step], prices[step], times[step])
+
+        return list(zip(
+            [self.ids[row] for row in rows.tolist()],
+            [timestamps[index] for index in order.tolist()],
+            prices.tolist(),
+            *(nullable_list(indicators[:, column]) for column in range(indicators.shape[1]))
+        ))
+
+
+@metrics.instrumented("analytics")
+def update_analytics(dw_engine=None, chunk_size: int = STAGING_CHUNK_SIZE,
+                     lookback: timedelta = timedelta(minutes=ANALYTICS_LOOKBACK_MINUTES), **windows) -> int:
+    """
+    Aplica os fatos com timestamp maior que a marca d'água menos `lookback` (ainda não
+    aplicados aos seus ativos) e retorna a quantidade de amostras gravadas em
+    `crypto_analytics`.
+    """
+    logger.info("📈 Atualizando indicadores de mercado...")
+    dw_engine = dw_engine or get_dw_engine()
+    market_table = get_table(DW, "crypto_market_data")
+
+    try:
+        with dw_engine.begin() as conn:
+            since: Optional[datetime] = read_watermark(conn, WATERMARK_NAME)
+            if since is not None:
+                since -= lookback
+            else:
+                latest = conn.execute(select(func.max(market_table.c.timestamp))).scalar()
+                if latest is None:
+                    logger.warning("⚠️ Nenhum fato no DW para calcular indicadores")
+                    return 0
+                since = latest - BOOTSTRAP
+                logger.info(f"🔖 Estado dos indicadores iniciado a partir de {since}")
+
+            with metrics.phase("read_facts"):
+                facts = conn.execute(
+                    select(market_table.c.id, market_table.c.price_usd, market_table.c.timestamp)
+                    .where(market_table.c.timestamp > since)
+                ).all()
+            if not facts:
+                logger.info("⏭️ Nenhum fato novo para os indicadores")
+                return 0
+
+            ids = [fact.id for fact in facts]
+            timestamps = [fact.timestamp for fact in facts]
+            prices = [float(fact.price_usd) if fact.price_usd is not None else np.nan for fact in facts]
+            with metrics.phase("compute"):
+                state = RollingState.load(conn, sorted(set(ids)), **windows)
+                rows = state.apply(ids, prices, timestamps)
+            if not rows:
+                logger.info("⏭️ Nenhum fato novo para os indicadores")
+                return 0
+
+            with metrics.phase("write"):
+                bulk_write(conn, get_table(DW, "crypto_analytics_state"), STATE_COLUMNS, state.rows(), chunk_size,
+                           assignments=lambda new: [(name, new[name]) for name in STATE_COLUMNS if name != "id"])
+                bulk_write(conn, get_table(DW, "crypto_analytics"), ANALYTICS_COLUMNS, rows, chunk_size)
+                write_watermark(conn, max(timestamps), WATERMARK_NAME)
+
+        metrics.add_rows(len(rows))
+        logger.info(f"✅ Indicadores atualizados: {len(rows)} amostras de {len(state.ids)} ativos")
+        return len(rows)
+    except Exception as e:
+        logger.error(f"❌ Erro ao atualizar os indicadores de mercado: {str(e)}")
+        raise
+
+
+if __name__ == "__main__":
+    update_analytics()
@@ -0,0 +1,259 @@
+"""
+backfill.py
+
+Este módulo preenche lacunas históricas de `crypto_market_data` a partir do endpoint
+de histórico por ativo da API CoinCap (`/v3/assets/{id}/history`).
+
+Funcionamento:
+- O conjunto de ativos e o intervalo pedido são divididos em unidades de trabalho
+  (ativo, janela de `BACKFILL_WINDOW_HOURS` horas).
+- As unidades são buscadas em paralelo (`BACKFILL_WORKERS` threads), compartilhando a
+  sessão HTTP e o token bucket da extração, com no máximo o dobro de requisições em voo.
+- Os pontos são acumulados e carregados em lotes de `BACKFILL_LOAD_ROWS` fatos pelo
+  mesmo caminho da transformação (`load_batch_to_dw` em modo histórico: dimensão só
+  para moedas novas, fatos já existentes ignorados, agregações OHLCV mescladas).
+- As unidades de cada lote são registradas em `etl_backfill_progress` na mesma transação
+  dos fatos; uma execução interrompida retoma apenas as unidades pendentes.
+
+Os pontos de histórico trazem apenas preço e supply circulante: o market cap é
+calculado (`preço * supply`) e volume, variação e VWAP ficam nulos.
+
+Funções:
+- plan_units: Divide ativos e intervalo em unidades de trabalho.
+- completed_units / mark_completed: Leitura e gravação do checkpoint.
+- history_records: Converte os pontos de histórico em registros no formato de `/v3/assets`.
+- run_backfill: Executa (ou retoma) um backfill.
+
+Execução:
+    - PYTHONPATH=. python include/etl/backfill.py --start AAAA-MM-DD --end AAAA-MM-DD [--assets bitcoin,ethereum] [--job nome]
+"""
+
+import argparse
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import insert, select
+from include.config.config import (
+    BACKFILL_INTERVAL, BACKFILL_LOAD_ROWS, BACKFILL_WINDOW_HOURS, BACKFILL_WORKERS, COINCAP_API_URL,
+    COINCAP_RATE_LIMIT
+)
+from include.database.db_connection import get_dw_engine, DW
+from include.database.schema_cache import get_table
+from include.etl.batch import AssetBatch
+from include.etl.extract import TokenBucket, build_session, fetch_json, _ExtractStats
+from include.etl.utils import chunked
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("backfill", "logs/pipeline.log")
+
+EPOCH = datetime(1970, 1, 1)
+# Quantidade de ids por requisição de metadados (`/v3/assets?ids=...`)
+METADATA_PAGE = 100
+
+
+@dataclass(frozen=True)
+class WorkUnit:
+    asset_id: str
+    start: datetime
+    end: datetime
+
+
+def plan_units(asset_ids: Sequence[str], start: datetime, end: datetime,
+               window: timedelta = timedelta(hours=BACKFILL_WINDOW_HOURS)) -> List[WorkUnit]:
+    """
+    Unidades (ativo, [início, fim)) que cobrem o intervalo pedido, ativo por ativo.
+    """
+    if window <= timedelta(0):
+        raise ValueError("A janela do backfill deve ser positiva")
+    units = []
+    for asset_id in asset_ids:
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + window, end)
+            units.append(WorkUnit(asset_id, window_start, window_end))
+            window_start = window_end
+    return units
+
+
+def completed_units(conn, job: str) -> Set[Tuple[str, datetime]]:
+    progress = get_table(DW, "etl_backfill_progress")
+    rows = conn.execute(
+        select(progress.c.asset_id, progress.c.window_start).where(progress.c.job == job)
+    ).all()
+    return {(asset_id, window_start) for asset_id, window_start in rows}
+
+
+def mark_completed(conn, job: str, units: List[Tuple[WorkUnit, int]]):
+    if not units:
+        return
+    completed_at = datetime.utcnow()
+    conn.execute(insert(get_table(DW, "etl_backfill_progress")), [
+        {"job": job, "asset_id": unit.asset_id, "window_start": unit.start, "window_end": unit.end,
+         "rows": rows, "completed_at": completed_at}
+        for unit, rows in units
+    ])
+
+
+def _epoch_ms(value: datetime) -> int:
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+def history_records(unit: WorkUnit, points: List[Dict], asset: Optional[Dict] = None
+                    ) -> Tuple[List[Dict], List[datetime]]:
+    """
+    Registros (formato de `/v3/assets`) e timestamps dos pontos dentro da janela da unidade.
+    Os campos de dimensão vêm dos metadados do ativo (`asset`), quando disponíveis.
+    """
+    asset = asset or {}
+    records, timestamps = [], []
+    for point in points:
+        timestamp = EPOCH + timedelta(milliseconds=int(point["time"]))
+        if not unit.start <= timestamp < unit.end:
+            continue
+        price, supply = point.get("priceUsd"), point.get("circulatingSupply")
+        market_cap = float(price) * float(supply) if price not in (None, "") and supply not in (None, "") else None
+        records.append({
+            "id": unit.asset_id,
+            "symbol": asset.get("symbol"),
+            "name": asset.get("name"),
+            "explorer": asset.get("explorer"),
+            "maxSupply": asset.get("maxSupply"),
+            "priceUsd": price,
+            "marketCapUsd": market_cap,
+            "volumeUsd24Hr": None,
+            "changePercent24Hr": None,
+            "vwap24Hr": None,
+            "supply": supply,
+        })
+        timestamps.append(timestamp)
+    return records, timestamps
+
+
+def _fetch_history(session, bucket, url, unit: WorkUnit, interval: str, stats) -> List[Dict]:
+    params = {"interval": interval, "start": _epoch_ms(unit.start), "end": _epoch_ms(unit.end)}
+    return fetch_json(session, bucket, f"{url}/{unit.asset_id}/history", params, stats).get("data", [])
+
+
+def _fetch_metadata(session, bucket, url, asset_ids: List[str], stats) -> Dict[str, Dict]:
+    assets = {}
+    for ids in chunked(asset_ids, METADATA_PAGE):
+        page = fetch_json(session, bucket, url, {"ids": ",".join(ids), "limit": len(ids)}, stats).get("data", [])
+        assets.update((asset["id"], asset) for asset in page)
+    return assets
+
+
+def _known_assets(engine) -> List[str]:
+    crypto_table = get_table(DW, "cryptocurrencies")
+    with engine.connect() as conn:
+        return list(conn.execute(select(crypto_table.c.id).order_by(crypto_table.c.id)).scalars().all())
+
+
+def run_backfill(start: datetime, end: datetime, asset_ids: Sequence[str] = None, job: str = "default",
+                 interval: str = BACKFILL_INTERVAL, window: timedelta = timedelta(hours=BACKFILL_WINDOW_HOURS),
+                 workers: int = BACKFILL_WORKERS, rate_limit: float = COINCAP_RATE_LIMIT, url: str = None,
+                 load_rows: int = BACKFILL_LOAD_ROWS, engine=None,
+                 load: Callable[[AssetBatch, Callable], None] = None) -> int:
+    """
+    Executa o backfill `job` de `start` a `end` (UTC) para `asset_ids` (padrão: moedas da
+    dimensão). Unidades já registradas no checkpoint do job são ignoradas.
+
+    `load(batch, checkpoint)` deve carregar o lote e chamar `checkpoint(conn)` na mesma
+    transação; o padrão é `load_batch_to_dw` em modo histórico. Se uma unidade falhar, as
+    unidades já buscadas são carregadas e registradas antes de o erro ser propagado.
+    Retorna a quantidade de pontos buscados.
+    """
+    url = url or COINCAP_API_URL
+    workers = max(workers, 1)
+    engine = engine or get_dw_engine()
+    if load is None:
+        # Importação tardia: o planejamento e o checkpoint não dependem da carga
+        from include.etl.transform_load_final import load_batch_to_dw
+
+        def load(batch, checkpoint):
+            load_batch_to_dw(batch, incremental=False, historical=True, dw_engine=engine, checkpoint=checkpoint)
+
+    asset_ids = list(asset_ids) if asset_ids is not None else _known_assets(engine)
+    units = plan_units(asset_ids, start, end, window)
+    with engine.connect() as conn:
+        done = completed_units(conn, job)
+    pending = [unit for unit in units if (unit.asset_id, unit.start) not in done]
+    logger.info(
+        f"⏪ Backfill '{job}' de {start} a {end}: {len(units)} unidades, "
+        f"{len(units) - len(pending)} já concluídas, {len(pending)} pendentes"
+    )
+    if not pending:
+        return 0
+
+    bucket = TokenBucket(rate_limit, capacity=max(rate_limit, workers))
+    stats = _ExtractStats()
+    started = time.perf_counter()
+    records, timestamps, finished = [], [], []
+    total = 0
+
+    def flush():
+        if not finished:
+            return
+        checkpoint = lambda conn, units=list(finished): mark_completed(conn, job, units)
+        if records:
+            load(AssetBatch.from_records(records, timestamps=timestamps), checkpoint)
+        else:
+            with engine.begin() as conn:
+                checkpoint(conn)
+        logger.info(f"💾 Backfill '{job}': {len(records)} fatos de {len(finished)} unidade(s) carregados")
+        records.clear()
+        timestamps.clear()
+        finished.clear()
+
+    with build_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        assets = _fetch_metadata(session, bucket, url, sorted({unit.asset_id for unit in pending}), stats)
+        queue = iter(pending)
+        in_flight = {}
+        try:
+            while True:
+                # Mantém no máximo 2x `workers` unidades em voo (memória limitada)
+                while len(in_flight) < workers * 2:
+                    unit = next(queue, None)
+                    if unit is None:
+                        break
+                    in_flight[executor.submit(_fetch_history, session, bucket, url, unit, interval, stats)] = unit
+                if not in_flight:
+                    break
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    unit = in_flight.pop(future)
+                    unit_records, unit_timestamps = history_records(unit, future.result(), assets.get(unit.asset_id))
+                    records.extend(unit_records)
+                    timestamps.extend(unit_timestamps)
+                    finished.append((unit, len(unit_records)))
+                    total += len(unit_records)
+                if len(records) >= load_rows:
+                    flush()
+            flush()
+        except Exception as e:
+            logger.error(f"❌ Erro no backfill '{job}': {str(e)}")
+            for future in in_flight:
+                future.cancel()
+            try:
+                # Preserva o progresso das unidades já buscadas
+                flush()
+            except Exception as flush_error:
+                logger.error(f"❌ Erro ao gravar o progresso do backfill '{job}': {str(flush_error)}")
+            raise
+
+    logger.info(
+        f"✅ Backfill '{job}' concluído: {total} fatos de {len(pending)} unidade(s) em "
+        f"{time.perf_counter() - started:.2f}s ({stats.summary()})"
+    )
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill histórico de crypto_market_data")
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True, help="início (AAAA-MM-DD, UTC)")
+    parser.add_argument("--end", type=datetime.fromisoformat, required=True, help="fim exclusivo (AAAA-MM-DD, UTC)")
+    parser.add_argument("--assets", type=lambda value: value.split(","), help="ids separados por vírgula")
+    parser.add_argument("--job", default="default", help="nome do job (chave do checkpoint)")
+    args = parser.parse_args()
+    run_backfill(args.start, args.end, args.assets, args.job)
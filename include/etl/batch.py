@@ -0,0 +1,242 @@
+"""
+batch.py
+
+Este módulo define `AssetBatch`, a representação colunar (NumPy) de um lote de ativos
+compartilhada pela carga na staging e pela transformação final.
+
+Em vez de converter campo a campo com `float(...)` e montar dicionários duas vezes
+(API -> staging e staging -> dimensão/fatos), o lote é convertido uma única vez:
+- colunas numéricas viram arrays `float64`, com `NaN` para nulos (`maxSupply`, `vwap24Hr`);
+- o primeiro link de `explorer` é extraído em uma única passada sobre a coluna;
+- o lote carrega um único timestamp (ou a lista de timestamps das linhas lidas da staging).
+
+As cargas recebem o lote e enviam tuplas posicionais ao driver (`AssetBatch.rows`,
+montadas com `zip` sobre as colunas, sem um dicionário por linha). Dicionários
+(`AssetBatch.records`) só são montados para quem os consome em memória
+(hash da dimensão, agregações OHLCV e resumo do Power BI).
+
+Cada ativo tem um hash de conteúdo (`content_hash`, gravado em `crypto_raw`) calculado
+sobre todos os valores exceto o timestamp: a carga na staging compara esse hash com o
+da linha atual e só reescreve os ativos cujos valores mudaram.
+
+Classes:
+- AssetBatch: Lote colunar de ativos.
+- BatchHasher: Hash de um lote inteiro, calculado incrementalmente a partir dos hashes dos ativos.
+
+Funções:
+- nullable_list: Converte um array `float64` em lista Python com `None` no lugar de `NaN`.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from operator import itemgetter
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+
+# coluna do lote (= coluna da staging) -> campo da API
+NUMERIC_FIELDS = {
+    "max_supply": "maxSupply",
+    "price_usd": "priceUsd",
+    "market_cap_usd": "marketCapUsd",
+    "volume_usd_24hr": "volumeUsd24Hr",
+    "change_percent_24hr": "changePercent24Hr",
+    "vwap_24hr": "vwap24Hr",
+    "supply": "supply",
+}
+TEXT_FIELDS = ("id", "symbol", "name", "explorer")
+# Campos que a carga original tratava como nulos quando vazios/zero
+FALSY_AS_NULL = ("max_supply", "vwap_24hr")
+
+# Colunas de cada saída, na ordem das tuplas de `AssetBatch.rows`
+STAGING_COLUMNS = ("id", "symbol", "name", "max_supply", "explorer", "price_usd", "market_cap_usd",
+                   "volume_usd_24hr", "change_percent_24hr", "vwap_24hr", "supply", "timestamp", "content_hash")
+DIMENSION_COLUMNS = ("id", "symbol", "name", "max_supply", "explorer")
+FACT_COLUMNS = ("id", "price_usd", "market_cap_usd", "volume_usd_24hr", "change_percent_24hr",
+                "vwap_24hr", "supply", "timestamp")
+# Valores cobertos pelo hash de conteúdo de cada ativo (o id é a chave; o timestamp muda a cada extração)
+HASHED_COLUMNS = ("symbol", "name", "max_supply", "explorer", "price_usd", "market_cap_usd",
+                  "volume_usd_24hr", "change_percent_24hr", "vwap_24hr", "supply")
+
+
+def _to_float(values: Sequence) -> np.ndarray:
+    """
+    Converte uma sequência de strings/`Decimal`/números/None em `float64`, com `NaN` para nulos.
+    O caminho rápido (sem nulos) preenche o array direto de um iterador, sem lista intermediária.
+    """
+    if isinstance(values, np.ndarray) and values.dtype == np.float64:
+        return values
+    try:
+        return np.fromiter(map(float, values), dtype=np.float64, count=len(values))
+    except (TypeError, ValueError):
+        return np.fromiter((float(value) if value is not None and value != "" else np.nan for value in values),
+                           dtype=np.float64, count=len(values))
+
+
+def nullable_list(column: np.ndarray) -> List:
+    """
+    Lista com `None` no lugar de `NaN`, pronta para o driver do banco.
+    """
+    values = column.tolist()
+    for index in np.flatnonzero(np.isnan(column)).tolist():
+        values[index] = None
+    return values
+
+
+class BatchHasher:
+    """
+    Hash do lote: muda se qualquer ativo entrar, sair ou mudar de valor (ou de posição).
+    Alimentado com pares (id, content_hash), de uma vez ou página a página.
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+
+    def update(self, pairs: Iterable[Tuple[str, str]]):
+        for asset_id, content_hash in pairs:
+            self._digest.update(f"{asset_id}\x1f{content_hash}\x1e".encode())
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def _content_hashes(rows: Iterable[Tuple]) -> List[str]:
+    # `repr` de str/float/None é estável entre processos; BLAKE2 de 16 bytes basta para detectar mudança
+    return [hashlib.blake2b(repr(row).encode(), digest_size=16).hexdigest() for row in rows]
+
+
+def _first_link(explorer: Sequence) -> List:
+    # Uma passada de `str.partition` sobre a coluna; `np.char.partition` mediu ~5x mais lento
+    return [link.partition(",")[0] if link else None for link in explorer]
+
+
+@dataclass
+class AssetBatch:
+    timestamp: datetime
+    # Colunas de texto: listas Python (extraídas direto do payload), sem cópia para arrays
+    id: Sequence[str]
+    symbol: Sequence[str]
+    name: Sequence[str]
+    explorer: Sequence[Optional[str]]
+    max_supply: np.ndarray
+    price_usd: np.ndarray
+    market_cap_usd: np.ndarray
+    volume_usd_24hr: np.ndarray
+    change_percent_24hr: np.ndarray
+    vwap_24hr: np.ndarray
+    supply: np.ndarray
+    # Timestamps por linha (lote lido da staging); None = todas as linhas usam `timestamp`
+    timestamps: Optional[Sequence[datetime]] = None
+    # Listas Python de cada coluna, geradas uma vez e compartilhadas pelas saídas
+    _lists: Dict[str, List] = field(default_factory=dict, init=False, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    @classmethod
+    def _build(cls, timestamp, columns: List[Sequence], timestamps=None) -> "AssetBatch":
+        numeric = dict(zip(NUMERIC_FIELDS, (_to_float(column) for column in columns[len(TEXT_FIELDS):])))
+        for name in FALSY_AS_NULL:
+            numeric[name][numeric[name] == 0] = np.nan
+        return cls(timestamp, *columns[:len(TEXT_FIELDS)], timestamps=timestamps, **numeric)
+
+    @classmethod
+    def _empty(cls, timestamp) -> "AssetBatch":
+        return cls._build(timestamp, [()] * (len(TEXT_FIELDS) + len(NUMERIC_FIELDS)))
+
+    @classmethod
+    def from_records(cls, records: Sequence[Mapping], timestamp: datetime = None,
+                     timestamps: Optional[Sequence[datetime]] = None) -> "AssetBatch":
+        """
+        Constrói o lote a partir do payload da API CoinCap (`/v3/assets`). `timestamps`
+        (um por registro) é usado por cargas históricas, como o backfill.
+        """
+        timestamp = timestamp or datetime.utcnow()
+        if not records:
+            return cls._empty(timestamp)
+        fields = TEXT_FIELDS + tuple(NUMERIC_FIELDS.values())
+        try:
+            # Uma passada em C por coluna, sem tuplas intermediárias por linha
+            columns = [list(map(itemgetter(name), records)) for name in fields]
+        except KeyError:
+            columns = [[record.get(name) for record in records] for name in fields]
+        return cls._build(timestamp, columns, timestamps=list(timestamps) if timestamps is not None else None)
+
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, Sequence], timestamp: datetime) -> "AssetBatch":
+        """
+        Constrói o lote a partir de colunas já separadas, indexadas pelos campos da API
+        (ex.: colunas de um arquivo da landing zone).
+        """
+        fields = TEXT_FIELDS + tuple(NUMERIC_FIELDS.values())
+        return cls._build(timestamp, [list(columns[name]) for name in fields])
+
+    @classmethod
+    def from_staging_rows(cls, rows: Sequence[Mapping], timestamp: datetime = None,
+                          row_timestamps: bool = True) -> "AssetBatch":
+        """
+        Constrói o lote a partir de linhas da tabela `crypto_raw`. Com `row_timestamps`, cada
+        linha preserva o seu timestamp; caso contrário, todo o lote recebe `timestamp`.
+        """
+        timestamp = timestamp or datetime.utcnow()
+        if not rows:
+            return cls._empty(timestamp)
+        fields = TEXT_FIELDS + tuple(NUMERIC_FIELDS)
+        columns = [list(map(itemgetter(name), rows)) for name in fields]
+        timestamps = list(map(itemgetter("timestamp"), rows)) if row_timestamps else None
+        return cls._build(timestamp, columns, timestamps=timestamps)
+
+    def select(self, mask: Sequence[bool]) -> "AssetBatch":
+        """
+        Novo lote apenas com as linhas em que `mask` é verdadeiro.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        indexes = np.flatnonzero(mask).tolist()
+        text = [[getattr(self, name)[i] for i in indexes] for name in TEXT_FIELDS]
+        numeric = {name: getattr(self, name)[mask] for name in NUMERIC_FIELDS}
+        timestamps = [self.timestamps[i] for i in indexes] if self.timestamps is not None else None
+        return AssetBatch(self.timestamp, *text, timestamps=timestamps, **numeric)
+
+    def column(self, name: str) -> Sequence:
+        """
+        Coluna como sequência Python (nulos como `None`), memorizada entre as saídas.
+        Na dimensão, `explorer` é apenas o primeiro link; nos fatos, `vwap_24hr` nulo vira 0.
+        `content_hash` é o hash dos valores do ativo (`HASHED_COLUMNS`).
+        """
+        if name in TEXT_FIELDS:
+            return getattr(self, name)
+        if name == "timestamp":
+            if self.timestamps is not None:
+                return self.timestamps
+            return [self.timestamp] * len(self)
+        if name not in self._lists:
+            if name == "explorer_link":
+                self._lists[name] = _first_link(self.explorer)
+            elif name == "content_hash":
+                self._lists[name] = _content_hashes(zip(*map(self.column, HASHED_COLUMNS)))
+            elif name == "vwap_or_zero":
+                self._lists[name] = np.nan_to_num(self.vwap_24hr, nan=0.0).tolist()
+            else:
+                self._lists[name] = nullable_list(getattr(self, name))
+        return self._lists[name]
+
+    def _sources(self, columns: Sequence[str]) -> List[str]:
+        # Colunas cuja representação muda conforme a saída (dimensão/fatos)
+        if columns == DIMENSION_COLUMNS:
+            return [name if name != "explorer" else "explorer_link" for name in columns]
+        if columns == FACT_COLUMNS:
+            return [name if name != "vwap_24hr" else "vwap_or_zero" for name in columns]
+        return list(columns)
+
+    def rows(self, columns: Sequence[str] = STAGING_COLUMNS) -> List[Tuple]:
+        """
+        Tuplas posicionais na ordem de `columns` (`STAGING_COLUMNS`, `DIMENSION_COLUMNS`
+        ou `FACT_COLUMNS`), prontas para um `executemany`.
+        """
+        return list(zip(*map(self.column, self._sources(columns))))
+
+    def records(self, columns: Sequence[str] = STAGING_COLUMNS) -> List[Dict]:
+        """
+        Mesmas linhas de `rows`, como dicionários (para consumidores em memória).
+        """
+        return [dict(zip(columns, row)) for row in zip(*map(self.column, self._sources(columns)))]
@@ -0,0 +1,113 @@
+"""
+bulk_load.py
+
+Este módulo grava tuplas posicionais em uma tabela (INSERT simples ou UPSERT) pelo
+caminho de carga em massa mais rápido de cada banco, escolhido por `BULK_LOAD_METHOD`:
+
+- copy (PostgreSQL): as linhas são enviadas com `COPY ... FROM STDIN` (formato texto)
+  para uma tabela temporária com as mesmas colunas e copiadas para o destino com um único
+  `INSERT ... SELECT` (com `ON CONFLICT ... DO UPDATE` no UPSERT). São três comandos por
+  carga, independentemente da quantidade de linhas;
+- executemany (MySQL, SQLite): um comando compilado uma vez e enviado em fatias com
+  `executemany` (`execute_rows`); os drivers MySQL reescrevem cada fatia em um único
+  INSERT multi-linha.
+
+Com `auto` (padrão), o PostgreSQL usa `copy` e os demais dialetos `executemany`. No
+`copy`, cada chave deve aparecer uma única vez no lote (restrição do `ON CONFLICT`).
+
+Funções:
+- resolve_method: Retorna o método efetivo para o dialeto.
+- copy_text: Serializa as linhas no formato texto do `COPY`.
+- bulk_write: Grava as linhas pelo método do dialeto e retorna a quantidade de comandos.
+"""
+
+import io
+import uuid
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+from sqlalchemy import Table, column, select, table as sql_table
+from include.config.config import BULK_LOAD_METHOD
+from include.etl.utils import execute_rows, upsert_statement
+
+METHODS = ("auto", "copy", "executemany")
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def resolve_method(dialect, method: str = BULK_LOAD_METHOD) -> str:
+    if method not in METHODS:
+        raise ValueError(f"Método de carga em massa desconhecido: {method} (use {' | '.join(METHODS)})")
+    if method == "auto":
+        return "copy" if dialect.name == "postgresql" else "executemany"
+    if method == "copy" and dialect.name != "postgresql":
+        raise NotImplementedError(f"COPY não suportado para o dialeto {dialect.name}")
+    return method
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPES)
+    if isinstance(value, float) and value != value:
+        return "NaN"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()  # bytea em hexadecimal, com a barra escapada
+    return str(value)
+
+
+def copy_text(rows: List[Tuple]) -> io.StringIO:
+    """
+    Linhas no formato texto do `COPY` (campos separados por tabulação, `\\N` para nulo).
+    """
+    buffer = io.StringIO()
+    buffer.writelines("\t".join(map(_copy_value, row)) + "\n" for row in rows)
+    buffer.seek(0)
+    return buffer
+
+
+def _copy_from(conn, sql: str, buffer: io.StringIO):
+    # Cursor do driver na mesma conexão (e transação) do SQLAlchemy
+    cursor = conn.connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):
+            cursor.copy_expert(sql, buffer)  # psycopg2
+        else:
+            cursor.execute(sql, stream=buffer)  # pg8000 (Cloud SQL Connector)
+    finally:
+        cursor.close()
+
+
+def _copy_rows(conn, target: Table, columns: Sequence[str], rows: List[Tuple],
+               assignments: Optional[Callable[[Any], List[Tuple[str, Any]]]]) -> int:
+    quote = conn.dialect.identifier_preparer.quote
+    temp_name = f"_bulk_{target.name}_{uuid.uuid4().hex[:8]}"
+    column_list = ", ".join(quote(name) for name in columns)
+    conn.exec_driver_sql(
+        f"CREATE TEMPORARY TABLE {quote(temp_name)} ON COMMIT DROP AS "
+        f"SELECT {column_list} FROM {conn.dialect.identifier_preparer.format_table(target)} WITH NO DATA"
+    )
+    _copy_from(conn, f"COPY {quote(temp_name)} ({column_list}) FROM STDIN", copy_text(rows))
+
+    source = (list(columns), select(sql_table(temp_name, *[column(name) for name in columns])))
+    if assignments is None:
+        stmt = target.insert().from_select(*source)
+    else:
+        stmt = upsert_statement(conn.dialect, target, assignments, source=source)
+    conn.execute(stmt)
+    return 3
+
+
+def bulk_write(conn, target: Table, columns: Sequence[str], rows: List[Tuple], chunk_size: int,
+               assignments: Optional[Callable[[Any], List[Tuple[str, Any]]]] = None,
+               method: str = BULK_LOAD_METHOD) -> int:
+    """
+    Grava `rows` (tuplas na ordem de `columns`) em `target` na transação de `conn`: INSERT
+    simples ou, com `assignments` (ver `upsert_statement`), UPSERT pela chave primária.
+    Retorna a quantidade de comandos enviados ao banco.
+    """
+    if not rows:
+        return 0
+    if resolve_method(conn.dialect, method) == "copy":
+        return _copy_rows(conn, target, columns, rows, assignments)
+    stmt = target.insert() if assignments is None else upsert_statement(conn.dialect, target, assignments)
+    return execute_rows(conn, stmt, columns, rows, chunk_size)
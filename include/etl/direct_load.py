@@ -0,0 +1,195 @@
+"""
+direct_load.py
+
+Este módulo implementa o caminho direto API -> DW (`DIRECT_LOAD_ENABLED`): o lote extraído
+é transformado em memória e carregado em `cryptocurrencies`/`crypto_market_data` sem
+ser gravado e relido da staging, de modo que o resumo do Power BI fica a uma única
+escrita no banco da extração.
+
+Funcionamento:
+- As páginas da API são consolidadas em um `AssetBatch` (com hash de conteúdo por ativo).
+- Com `STAGING_SKIP_UNCHANGED`, os hashes atuais da staging (uma consulta) definem os
+  ativos alterados; no modo incremental só eles viram fatos, como na transformação.
+- A escrita na staging (auditoria) roda em uma thread, em paralelo com a carga no DW,
+  mas só é confirmada depois que a transação do DW é confirmada: se o DW falhar, a
+  staging é desfeita e os hashes não marcam como carregados ativos que não chegaram ao DW.
+- Ao final, uma verificação de consistência compara o hash do lote com os hashes
+  gravados na staging e confere que cada ativo carregado tem o seu fato no DW (mesmo
+  timestamp). Uma divergência é registrada e faz a task falhar.
+
+Funções:
+- extract_and_load_direct: Executa extração + carga direta no DW + staging de auditoria.
+- load_pages_direct: Carrega páginas já extraídas no DW e na staging (usada também pelos
+  shards da DAG particionada, `shards.py`).
+- check_consistency: Compara o lote com a staging e com o DW.
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import func, select
+from include.config.config import (
+    HTTP_CACHE_PATH, HTTP_CONDITIONAL_REQUESTS, LANDING_ENABLED, STAGING_CHUNK_SIZE, STAGING_SKIP_UNCHANGED,
+    TRANSFORM_INCREMENTAL
+)
+from include.database.db_connection import get_dw_engine, get_staging_area_engine, DW, STAGING
+from include.database.schema_cache import get_table
+from include.etl import metrics
+from include.etl.batch import AssetBatch, BatchHasher, STAGING_COLUMNS
+from include.etl.extract import ConditionalCache, iter_pages
+from include.etl.landing import land_pages
+from include.etl.bulk_load import bulk_write
+from include.etl.load_staging import _staging_assignments, current_hashes
+from include.etl.transform_load_final import load_batch_to_dw
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("direct_load", "logs/pipeline.log")
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _StagingWriter:
+    """
+    Grava as linhas na staging em uma thread e mantém a transação aberta até `finish`:
+    `finish(commit=True)` confirma, `finish(commit=False)` desfaz.
+    """
+
+    def __init__(self, engine, rows: List[Tuple], chunk_size: int = STAGING_CHUNK_SIZE):
+        self.engine = engine
+        self.rows = rows
+        self.chunk_size = chunk_size
+        self.error: Optional[BaseException] = None
+        self._decided = threading.Event()
+        self._commit = False
+        self._thread = threading.Thread(target=self._run, name="staging-audit-writer", daemon=True)
+
+    def _run(self):
+        try:
+            with self.engine.begin() as conn:
+                bulk_write(conn, get_table(STAGING, "crypto_raw"), STAGING_COLUMNS, self.rows, self.chunk_size,
+                           assignments=_staging_assignments)
+                self._decided.wait()
+                if not self._commit:
+                    raise _Rollback()
+        except _Rollback:
+            pass
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        self._thread.start()
+
+    def finish(self, commit: bool):
+        self._commit = commit
+        self._decided.set()
+        self._thread.join()
+        if commit and self.error is not None:
+            raise self.error
+
+
+def check_consistency(batch: AssetBatch, content_hash: str, loaded_ids: Sequence[str], staging_engine, dw_engine):
+    """
+    A staging deve conter exatamente os hashes do lote e o DW, um fato com o timestamp
+    do lote para cada ativo de `loaded_ids`. A contagem é restrita a esses ativos porque
+    outros shards do mesmo snapshot gravam fatos com o mesmo timestamp.
+    """
+    with staging_engine.connect() as conn:
+        staged = current_hashes(conn, get_table(STAGING, "crypto_raw"))
+    hasher = BatchHasher()
+    hasher.update((asset_id, staged.get(asset_id)) for asset_id in batch.id)
+
+    market_table = get_table(DW, "crypto_market_data")
+    with dw_engine.connect() as conn:
+        loaded = conn.execute(
+            select(func.count()).select_from(market_table).where(
+                market_table.c.timestamp == batch.timestamp, market_table.c.id.in_(list(loaded_ids))
+            )
+        ).scalar()
+
+    problems = []
+    if hasher.hexdigest() != content_hash:
+        problems.append("hashes da staging diferem do lote")
+    facts = len(loaded_ids)
+    if loaded != facts:
+        problems.append(f"{loaded} fatos no DW para {facts} esperados")
+    if problems:
+        logger.error(f"❌ Inconsistência entre staging e DW no lote {batch.timestamp.isoformat()}: {'; '.join(problems)}")
+        raise Exception(f"❌ Inconsistência entre staging e DW: {'; '.join(problems)}")
+    logger.info(f"🔍 Consistência verificada: staging e DW conferem com o lote ({facts} fatos)")
+
+
+def load_pages_direct(pages: Iterable[List[Dict]], timestamp: datetime, staging_engine, dw_engine,
+                      skip_unchanged: bool = STAGING_SKIP_UNCHANGED, incremental: bool = TRANSFORM_INCREMENTAL,
+                      publish: bool = True) -> Dict:
+    """
+    Consolida as páginas em um lote, carrega os ativos alterados no DW e na staging de
+    auditoria e confere a consistência. Com `publish=False`, o resumo do Power BI não é
+    atualizado e fatos já existentes são ignorados (ver `load_batch_to_dw`).
+    """
+    with metrics.phase("extract"):
+        batch = AssetBatch.from_records([asset for page in pages for asset in page], timestamp)
+
+    hashes = batch.column("content_hash")
+    hasher = BatchHasher()
+    hasher.update(zip(batch.id, hashes))
+    content_hash = hasher.hexdigest()
+
+    if skip_unchanged:
+        with staging_engine.connect() as conn:
+            previous = current_hashes(conn, get_table(STAGING, "crypto_raw"))
+        changed = [previous.get(asset_id) != content for asset_id, content in zip(batch.id, hashes)]
+    else:
+        changed = [True] * len(batch)
+    written = sum(changed)
+    batch_ref = {"batch_id": timestamp.isoformat(), "rows": len(batch), "changed": written,
+                 "content_hash": content_hash, "dw_loaded": True}
+
+    if written:
+        staging_rows = [row for row, keep in zip(batch.rows(STAGING_COLUMNS), changed) if keep]
+        loaded = batch.select(changed) if incremental else batch
+        writer = _StagingWriter(staging_engine, staging_rows)
+        writer.start()
+        try:
+            facts = load_batch_to_dw(loaded, incremental=incremental, dw_engine=dw_engine, publish=publish)
+        except BaseException:
+            writer.finish(commit=False)
+            raise
+        with metrics.phase("staging_write"):
+            writer.finish(commit=True)
+        with metrics.phase("consistency_check"):
+            check_consistency(batch, content_hash, loaded.id, staging_engine, dw_engine)
+        metrics.add_rows(facts)
+    else:
+        logger.info(f"⏭️ Lote {batch_ref['batch_id']} sem alterações: nenhuma escrita")
+    return batch_ref
+
+
+@metrics.instrumented("extract_load_direct")
+def extract_and_load_direct(url: str = None, staging_engine=None, dw_engine=None,
+                            skip_unchanged: bool = STAGING_SKIP_UNCHANGED, incremental: bool = TRANSFORM_INCREMENTAL,
+                            landing: bool = LANDING_ENABLED,
+                            cache_path: Optional[str] = HTTP_CACHE_PATH if HTTP_CONDITIONAL_REQUESTS else None) -> Dict:
+    """
+    Retorna a referência do lote (mesmo formato de `extract_and_load_staging`), com
+    `dw_loaded` indicando que a transformação da DAG não precisa rodar.
+    """
+    logger.info("🚀 Extraindo dados da API CoinCap e carregando direto no DW")
+    staging_engine = staging_engine or get_staging_area_engine()
+    dw_engine = dw_engine or get_dw_engine()
+    timestamp = datetime.utcnow()
+
+    conditional = ConditionalCache(cache_path) if cache_path else None
+    pages = iter_pages(url, conditional=conditional)
+    if landing:
+        pages = land_pages(pages, timestamp)
+    batch_ref = load_pages_direct(pages, timestamp, staging_engine, dw_engine, skip_unchanged, incremental)
+
+    if conditional is not None:
+        conditional.save()
+    logger.info(
+        f"✅ Lote {batch_ref['batch_id']} carregado direto no DW "
+        f"({batch_ref['changed']} de {batch_ref['rows']} registros alterados)"
+    )
+    return batch_ref
@@ -0,0 +1,119 @@
+"""
+dw_loader.py
+
+Este módulo grava lotes grandes de fatos no DW em paralelo: o lote é dividido em blocos
+de `DW_LOAD_CHUNK_ROWS` linhas, cada um gravado em sua própria transação curta, em
+`DW_LOAD_WORKERS` conexões do pool ao mesmo tempo. Com o Cloud SQL remoto, a latência de
+cada comando deixa de se somar em uma única conexão e nenhuma transação longa segura locks.
+
+Ordem e idempotência (orquestradas por `transform_load_final.load_batch_to_dw`):
+1. a dimensão é gravada e confirmada antes de qualquer fato;
+2. os blocos de fatos são gravados em paralelo; cada tentativa insere apenas os pares
+   (id, timestamp) que ainda não existem e um bloco que falha é repetido (com backoff), de
+   modo que uma falha ambígua (commit confirmado, conexão perdida) não duplica fatos;
+3. agregações OHLCV, marca d'água e checkpoint são gravados uma única vez, em uma
+   transação final, depois que todos os blocos foram confirmados.
+Se a transação final falhar, a reexecução reaproveita os fatos já gravados (passo 2) e
+refaz as agregações. No modo histórico os fatos já existentes são descartados antes do
+passo 2, então as agregações desses fatos ficam de fora: use `rollups.rebuild_rollups`.
+
+Funções:
+- existing_keys: Pares (id, timestamp) que já existem em `crypto_market_data`.
+- parallel_enabled: Indica se o lote deve usar a carga paralela.
+- load_facts_parallel: Grava os fatos em blocos paralelos e retorna as estatísticas.
+"""
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Sequence, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+from include.config.config import (
+    DW_LOAD_CHUNK_ROWS, DW_LOAD_PARALLEL_MIN_ROWS, DW_LOAD_RETRIES, DW_LOAD_WORKERS, DW_LOAD_BACKOFF_BASE,
+    DW_LOAD_BACKOFF_MAX
+)
+from include.database.db_connection import DW
+from include.database.schema_cache import get_table
+from include.etl.batch import AssetBatch, FACT_COLUMNS
+from include.etl.bulk_load import bulk_write
+from include.etl.utils import chunked
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("dw_loader", "logs/pipeline.log")
+
+ID_INDEX = FACT_COLUMNS.index("id")
+TIMESTAMP_INDEX = FACT_COLUMNS.index("timestamp")
+
+
+@dataclass
+class ParallelLoad:
+    rows: int
+    chunks: int
+    retries: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+def existing_keys(conn, ids: Sequence[str], timestamps: Sequence[datetime]) -> Set[Tuple[str, datetime]]:
+    market_table = get_table(DW, "crypto_market_data")
+    rows = conn.execute(
+        select(market_table.c.id, market_table.c.timestamp).where(
+            market_table.c.id.in_(sorted(set(ids))),
+            market_table.c.timestamp.between(min(timestamps), max(timestamps))
+        )
+    )
+    return {(row.id, row.timestamp) for row in rows}
+
+
+def parallel_enabled(dw_engine, rows: int, workers: int = DW_LOAD_WORKERS,
+                     min_rows: int = DW_LOAD_PARALLEL_MIN_ROWS) -> bool:
+    # Pools de conexão única (SQLite em memória) não podem ser compartilhados entre threads
+    single_connection = isinstance(dw_engine.pool, (SingletonThreadPool, StaticPool))
+    return workers > 1 and rows >= min_rows and not single_connection
+
+
+def _write_chunk(dw_engine, rows: List[Tuple], retries: int) -> Tuple[int, int]:
+    """
+    Grava um bloco em uma transação própria; retorna (linhas inseridas, repetições).
+    """
+    market_table = get_table(DW, "crypto_market_data")
+    for attempt in range(retries + 1):
+        try:
+            with dw_engine.begin() as conn:
+                existing = existing_keys(conn, [row[ID_INDEX] for row in rows],
+                                         [row[TIMESTAMP_INDEX] for row in rows])
+                pending = [row for row in rows if (row[ID_INDEX], row[TIMESTAMP_INDEX]) not in existing]
+                bulk_write(conn, market_table, FACT_COLUMNS, pending, len(pending))
+            return len(pending), attempt
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = random.uniform(0, min(DW_LOAD_BACKOFF_MAX, DW_LOAD_BACKOFF_BASE * (2 ** attempt)))
+            logger.warning(f"⚠️ Falha ao gravar bloco de {len(rows)} fatos (tentativa {attempt + 1}): {e}")
+            time.sleep(delay)
+
+
+def load_facts_parallel(dw_engine, batch: AssetBatch, chunk_rows: int = DW_LOAD_CHUNK_ROWS,
+                        workers: int = DW_LOAD_WORKERS, retries: int = DW_LOAD_RETRIES) -> ParallelLoad:
+    started = time.perf_counter()
+    chunks = list(chunked(batch.rows(FACT_COLUMNS), chunk_rows))
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="dw-loader") as executor:
+        results = list(executor.map(lambda chunk: _write_chunk(dw_engine, chunk, retries), chunks))
+
+    result = ParallelLoad(
+        rows=sum(rows for rows, _ in results),
+        chunks=len(chunks),
+        retries=sum(attempts for _, attempts in results),
+        seconds=time.perf_counter() - started,
+    )
+    logger.info(
+        f"✅ {result.rows} fatos gravados em {result.chunks} blocos paralelos ({workers} conexões, "
+        f"{result.retries} repetições), {result.seconds:.3f}s ({result.rows_per_second:.0f} fatos/s)"
+    )
+    return result
@@ -3,8 +3,27 @@ extract.py
 
 Este módulo é responsável por extrair dados da API CoinCap.
 
+Classes:
+- ConditionalCache: Validadores HTTP por página, persistidos entre execuções.
+
 Funções:
-- extract_data: Realiza uma requisição GET autenticada à API CoinCap e retorna os dados extraídos.
+- iter_pages: Gera as páginas do endpoint de ativos (`limit`/`offset`) buscadas em paralelo,
+  sem duplicatas, para consumo em streaming.
+- extract_data: Retorna a lista consolidada de todas as páginas.
+
+Estratégia de extração:
+- Uma única `requests.Session` com pool de conexões keep-alive é compartilhada pelas threads.
+- As páginas são buscadas em ondas de `COINCAP_WORKERS` requisições concorrentes, até que
+  uma página venha incompleta ou `COINCAP_MAX_PAGES` seja atingido.
+- Um token bucket limita a taxa de requisições e é ajustado pelos cabeçalhos de rate limit
+  da API (`X-RateLimit-Remaining`, `X-RateLimit-Reset`, `Retry-After`).
+- Respostas 429/5xx e falhas de rede são repetidas com backoff exponencial com jitter.
+- As respostas são pedidas comprimidas (`Accept-Encoding`) e as métricas registram os
+  bytes trafegados (`Content-Length`), não o tamanho descomprimido.
+- Requisições condicionais (opcional, `ConditionalCache`): o `ETag`/`Last-Modified` de
+  cada página é guardado em `HTTP_CACHE_PATH` e reenviado como `If-None-Match`/
+  `If-Modified-Since`; uma página `304 Not Modified` não é baixada nem repassada à carga.
+  O cache só deve ser salvo depois que as páginas foram gravadas (`ConditionalCache.save`).
 
 Requisitos:
 - Variáveis de ambiente definidas em config.py:
@@ -12,20 +31,302 @@ Requisitos:
     - COINCAP_API_URL: URL base da API CoinCap
 """
 
-from typing import Dict, List
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
 import requests
-from include.config.config import COINCAP_API_KEY, COINCAP_API_URL
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from include.config.config import (
+    COINCAP_API_KEY, COINCAP_API_URL, COINCAP_PAGE_LIMIT, COINCAP_MAX_PAGES, COINCAP_WORKERS,
+    COINCAP_RATE_LIMIT, COINCAP_TIMEOUT, COINCAP_MAX_RETRIES, COINCAP_BACKOFF_BASE, COINCAP_BACKOFF_MAX
+)
+from include.etl import metrics
 from include.config.logging_config import setup_logger
 
 logger = setup_logger("extract", "logs/pipeline.log")
 
-def extract_data() -> List[Dict]:
-    logger.info("🔍 Extraindo dados da API CoinCap")
-    headers = {"Authorization": f"Bearer {COINCAP_API_KEY}"}
-    response = requests.get(COINCAP_API_URL, headers=headers)
-    if response.status_code == 200:
-        logger.info("✅ Extração concluída com sucesso")
-        return response.json().get("data", [])
-    else:
+RETRY_STATUS = {429, 500, 502, 503, 504}
+NOT_MODIFIED = 304
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: `rate` tokens por segundo, até `capacity` acumulados.
+    `pause` bloqueia todas as threads até o instante informado (ex.: Retry-After).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+    def update_from_headers(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        try:
+            if remaining is not None and int(remaining) <= 0 and reset is not None:
+                reset = float(reset)
+                # A API pode enviar segundos restantes ou um epoch absoluto
+                self.pause(reset - time.time() if reset > 1e9 else reset)
+        except ValueError:
+            pass
+
+
+def _retry_after(response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(COINCAP_BACKOFF_MAX, COINCAP_BACKOFF_BASE * (2 ** attempt)))
+
+
+def build_session(pool_size: int = COINCAP_WORKERS) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Authorization": f"Bearer {COINCAP_API_KEY}", "Accept-Encoding": DEFAULT_ACCEPT_ENCODING})
+    return session
+
+
+class ConditionalCache:
+    """
+    Validadores HTTP (`ETag`, `Last-Modified`) e tamanho de cada página, por URL + parâmetros,
+    persistidos em um arquivo JSON entre as execuções da DAG.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as cache_file:
+                self._entries = json.load(cache_file)
+        except (OSError, ValueError):
+            pass
+
+    def entry(self, url: str, params: Dict) -> Dict:
+        key = f"{url}?{urlencode(sorted(params.items()))}"
+        with self._lock:
+            return self._entries.setdefault(key, {})
+
+    def save(self):
+        with self._lock:
+            entries = {key: entry for key, entry in self._entries.items() if entry}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        partial = f"{self.path}.tmp"
+        with open(partial, "w", encoding="utf-8") as cache_file:
+            json.dump(entries, cache_file)
+        os.replace(partial, self.path)
+
+
+def _conditional_headers(validators: Dict) -> Dict:
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+class _ExtractStats:
+    def __init__(self):
+        self.latencies = []
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, retried: bool):
+        with self._lock:
+            self.latencies.append(latency)
+            if retried:
+                self.retries += 1
+
+    def summary(self) -> str:
+        if not self.latencies:
+            return "nenhuma requisição"
+        ordered = sorted(self.latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return (
+            f"{len(ordered)} requisições, {self.retries} repetidas, latência "
+            f"média {sum(ordered) / len(ordered) * 1000:.0f}ms / p95 {p95 * 1000:.0f}ms / "
+            f"máx {ordered[-1] * 1000:.0f}ms"
+        )
+
+
+def fetch_json(session: requests.Session, bucket: TokenBucket, url: str, params: Dict,
+               stats: Optional[_ExtractStats] = None, timeout: float = COINCAP_TIMEOUT,
+               validators: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Executa um GET respeitando o token bucket, repetindo em 429/5xx e falhas de rede.
+    Com `validators` (uma entrada de `ConditionalCache`), a requisição é condicional:
+    retorna None em `304 Not Modified` e atualiza `validators` a partir da resposta 200.
+    """
+    headers = _conditional_headers(validators) if validators is not None else None
+    for attempt in range(COINCAP_MAX_RETRIES + 1):
+        bucket.acquire()
+        started = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=timeout, headers=headers)
+        except requests.RequestException as e:
+            if attempt == COINCAP_MAX_RETRIES:
+                raise Exception(f"❌ Erro de rede na API: {e}") from e
+            logger.warning(f"⚠️ Falha de rede em {params} (tentativa {attempt + 1}): {e}")
+            time.sleep(_backoff(attempt))
+            continue
+
+        latency = time.perf_counter() - started
+        if stats is not None:
+            stats.record(latency, attempt > 0)
+        # Bytes trafegados (comprimidos), quando o servidor informa o tamanho
+        metrics.record_http(latency, int(response.headers.get("Content-Length") or len(response.content)))
+        bucket.update_from_headers(response.headers)
+
+        if response.status_code == 200:
+            if validators is not None:
+                validators["etag"] = response.headers.get("ETag")
+                validators["last_modified"] = response.headers.get("Last-Modified")
+            return response.json()
+
+        if response.status_code == NOT_MODIFIED and headers:
+            return None
+
+        if response.status_code in RETRY_STATUS and attempt < COINCAP_MAX_RETRIES:
+            delay = _retry_after(response)
+            if delay is not None:
+                bucket.pause(delay)
+            else:
+                delay = _backoff(attempt)
+            logger.warning(f"⚠️ API retornou {response.status_code} para {params}, nova tentativa em {delay:.2f}s")
+            time.sleep(delay)
+            continue
+
         raise Exception(f"❌ Erro na API: {response.status_code}: {response.text}")
 
+
+def _fetch_page(session, bucket, url, offset, limit, stats,
+                conditional: Optional[ConditionalCache] = None) -> Tuple[Optional[List[Dict]], int]:
+    """
+    Retorna (ativos da página, tamanho da página); em `304` os ativos são None e o tamanho
+    é o da última resposta completa.
+    """
+    params = {"limit": limit, "offset": offset}
+    if conditional is None:
+        page_data = fetch_json(session, bucket, url, params, stats).get("data", [])
+        return page_data, len(page_data)
+
+    validators = conditional.entry(url, params)
+    payload = fetch_json(session, bucket, url, params, stats, validators=validators)
+    if payload is None:
+        return None, validators.get("count", limit)
+    page_data = payload.get("data", [])
+    validators["count"] = len(page_data)
+    return page_data, len(page_data)
+
+
+def iter_pages(url: str = None, page_limit: int = COINCAP_PAGE_LIMIT, max_pages: int = COINCAP_MAX_PAGES,
+               workers: int = COINCAP_WORKERS, rate_limit: float = COINCAP_RATE_LIMIT,
+               conditional: Optional[ConditionalCache] = None, first_page: int = 0) -> Iterator[List[Dict]]:
+    """
+    Gera as páginas da API (já sem ativos repetidos) na ordem dos offsets, à medida que
+    cada onda de requisições concorrentes termina. Apenas uma onda fica em memória.
+    Com `conditional`, páginas inalteradas (`304`) são puladas. `first_page` e `max_pages`
+    delimitam a faixa do ranking extraída (uma faixa por shard da DAG particionada).
+    """
+    url = url or COINCAP_API_URL
+    workers = max(workers, 1)
+    bucket = TokenBucket(rate_limit, capacity=max(rate_limit, workers))
+    stats = _ExtractStats()
+    started = time.perf_counter()
+
+    seen = set()
+    total = 0
+    duplicates = 0
+    pages = 0
+    not_modified = 0
+
+    with build_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        next_page = first_page
+        last_page = first_page + max_pages
+        finished = False
+        while not finished and next_page < last_page:
+            wave = range(next_page, min(next_page + workers, last_page))
+            futures = [
+                executor.submit(_fetch_page, session, bucket, url, page * page_limit, page_limit, stats, conditional)
+                for page in wave
+            ]
+            next_page = wave.stop
+
+            # Resultados consumidos na ordem dos offsets para preservar o ranking da API
+            for future in futures:
+                page_data, page_size = future.result()
+                if finished:
+                    continue
+                pages += 1
+                if page_size < page_limit:
+                    finished = True
+                if page_data is None:
+                    not_modified += 1
+                    continue
+                unique = []
+                for asset in page_data:
+                    if asset["id"] in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(asset["id"])
+                    unique.append(asset)
+                if unique:
+                    total += len(unique)
+                    yield unique
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"✅ Extração concluída com sucesso: {total} ativos em {pages} página(s) "
+        f"({not_modified} inalteradas), "
+        f"{duplicates} duplicados descartados, {elapsed:.2f}s ({stats.summary()})"
+    )
+
+
+@metrics.instrumented("extract")
+def extract_data(url: str = None, page_limit: int = COINCAP_PAGE_LIMIT, max_pages: int = COINCAP_MAX_PAGES,
+                 workers: int = COINCAP_WORKERS, rate_limit: float = COINCAP_RATE_LIMIT) -> List[Dict]:
+    logger.info("🔍 Extraindo dados da API CoinCap")
+    assets = []
+    for page in iter_pages(url, page_limit, max_pages, workers, rate_limit):
+        assets.extend(page)
+    metrics.add_rows(len(assets))
+    return assets
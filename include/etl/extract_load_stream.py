@@ -0,0 +1,50 @@
+"""
+extract_load_stream.py
+
+Este módulo encadeia a extração da API CoinCap e a carga na staging em modo streaming:
+as páginas geradas por `extract.iter_pages` alimentam diretamente as escritas em lote de
+`load_staging.load_stream_to_staging`, sem materializar a lista completa de ativos.
+Com `LANDING_ENABLED`, as mesmas páginas são gravadas na landing zone (`landing.py`).
+
+Com `HTTP_CONDITIONAL_REQUESTS`, as páginas são pedidas condicionalmente (ETag /
+Last-Modified); os validadores só são salvos depois que a carga na staging termina,
+para que uma falha no meio não faça a próxima execução pular páginas nunca gravadas.
+
+Funções:
+- extract_and_load_staging: Executa extração + carga em streaming e retorna apenas uma
+  referência pequena do lote (id, registros recebidos e alterados, hash do conteúdo),
+  adequada para XCom. Um lote com `changed == 0` dispensa a transformação.
+"""
+
+from datetime import datetime
+from typing import Dict
+from include.config.config import HTTP_CACHE_PATH, HTTP_CONDITIONAL_REQUESTS, LANDING_ENABLED
+from include.etl import metrics
+from include.etl.extract import ConditionalCache, iter_pages
+from include.etl.landing import land_pages
+from include.etl.load_staging import load_stream_to_staging
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("extract_load_stream", "logs/pipeline.log")
+
+
+@metrics.instrumented("extract_load_staging")
+def extract_and_load_staging() -> Dict:
+    logger.info("🔍 Extraindo dados da API CoinCap e carregando na staging (streaming)")
+    timestamp = datetime.utcnow()
+    conditional = ConditionalCache(HTTP_CACHE_PATH) if HTTP_CONDITIONAL_REQUESTS else None
+    pages = iter_pages(conditional=conditional)
+    if LANDING_ENABLED:
+        pages = land_pages(pages, timestamp)
+    load = load_stream_to_staging(pages, timestamp=timestamp)
+    if conditional is not None:
+        conditional.save()
+
+    # Todos os registros do lote compartilham o mesmo timestamp, que serve de identificador
+    batch = {"batch_id": timestamp.isoformat(), "rows": load.rows, "changed": load.written,
+             "content_hash": load.content_hash}
+    logger.info(
+        f"✅ Lote {batch['batch_id']} carregado na staging ({load.written} de {load.rows} registros "
+        f"alterados, hash {load.content_hash[:12]})"
+    )
+    return batch
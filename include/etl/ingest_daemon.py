@@ -0,0 +1,357 @@
+"""
+ingest_daemon.py
+
+Este módulo implementa o modo de ingestão contínua: um processo de longa duração que
+assina um fluxo de preços e grava micro-lotes na staging e no DW, sem esperar o
+agendamento de 5 minutos da DAG.
+
+Funcionamento:
+- A fonte é o websocket de preços da CoinCap (`INGEST_SOURCE_URL`, mensagens como
+  `{"bitcoin": "6929.82", ...}`) ou qualquer fonte de linhas JSON (arquivo ou stdin);
+  a conexão do websocket é refeita com backoff exponencial se cair.
+- As atualizações são coalescidas em memória por ativo: entre duas gravações, apenas
+  o último preço de cada ativo é mantido.
+- A cada `INGEST_FLUSH_SECONDS` segundos ou `INGEST_FLUSH_UPDATES` atualizações (o que
+  vier primeiro), o micro-lote é gravado em uma thread, sem interromper a recepção:
+  - `crypto_market_data`: um fato por ativo, com o timestamp da última atualização
+    recebida, mais as agregações OHLCV, na mesma transação;
+  - `crypto_raw`: apenas preço, market cap e o hash de conteúdo recalculado para a
+    linha atualizada (a detecção de ativos alterados e a verificação de consistência
+    comparam hashes que descrevem a linha gravada), em um upsert multi-linha. O
+    `timestamp` continua sendo o do último snapshot completo, que é a marca d'água da
+    transformação incremental (a DAG não recarrega como fatos os preços do daemon).
+    A transação da staging só é confirmada depois da do DW: se o DW falhar, a staging
+    não fica com preços sem fato correspondente.
+- O fluxo traz apenas o preço: supply, volume, variação e VWAP vêm do último snapshot
+  da staging (recarregado a cada `INGEST_REFERENCE_REFRESH_SECONDS` segundos) e o
+  market cap é recalculado (`preço * supply`). Ativos ausentes da staging são ignorados
+  até a próxima extração completa.
+- Após cada gravação, os contadores (atualizações recebidas e coalescidas, fatos
+  gravados, lag e vazão) vão para o log e para `METRICS_SINK` (componente `ingest`).
+
+Classes:
+- PriceBuffer: Coalescência das atualizações por ativo.
+- IngestStats: Contadores de lag e vazão.
+- MicroBatchWriter: Grava um micro-lote na staging e no DW.
+- IngestDaemon: Laço de recepção e gravação.
+
+Funções:
+- parse_prices: Converte uma mensagem da fonte em {ativo: preço}.
+- websocket_source / line_source: Fontes de mensagens.
+
+Execução:
+    - PYTHONPATH=. python include/etl/ingest_daemon.py [--source wss://...|arquivo.jsonl|-]
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import aiohttp
+from sqlalchemy import select
+from include.config.config import (
+    COINCAP_API_KEY, INGEST_FLUSH_SECONDS, INGEST_FLUSH_UPDATES, INGEST_RECONNECT_MAX_SECONDS,
+    INGEST_REFERENCE_REFRESH_SECONDS, INGEST_SOURCE_URL, METRICS_DIR, METRICS_SINK, STAGING_CHUNK_SIZE
+)
+from include.database.db_connection import get_dw_engine, get_staging_area_engine, DW, STAGING
+from include.database.schema_cache import get_table
+from include.etl import metrics
+from include.etl.batch import AssetBatch, FACT_COLUMNS, NUMERIC_FIELDS, TEXT_FIELDS
+from include.etl.rollups import update_rollups
+from include.etl.bulk_load import bulk_write
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("ingest_daemon", "logs/pipeline.log")
+
+# Colunas da staging atualizadas pelo daemon
+LIVE_COLUMNS = ("id", "price_usd", "market_cap_usd", "content_hash")
+
+
+def parse_prices(message) -> Dict[str, float]:
+    """
+    Aceita o formato do websocket da CoinCap (`{"bitcoin": "6929.82"}`) ou um registro
+    no formato de `/v3/assets` (`{"id": "bitcoin", "priceUsd": "6929.82"}`).
+    """
+    if "id" in message and "priceUsd" in message:
+        message = {message["id"]: message["priceUsd"]}
+    prices = {}
+    for asset, price in message.items():
+        try:
+            prices[asset] = float(price)
+        except (TypeError, ValueError):
+            continue
+    return prices
+
+
+class PriceBuffer:
+    """
+    Último preço de cada ativo desde a gravação anterior.
+    """
+
+    def __init__(self):
+        # ativo -> (preço, recebido_em)
+        self._latest: Dict[str, Tuple[float, datetime]] = {}
+        self.pending_updates = 0
+        self.oldest = None
+
+    def add(self, prices: Dict[str, float]):
+        if not prices:
+            return
+        now, received = time.monotonic(), datetime.utcnow()
+        for asset, price in prices.items():
+            self._latest[asset] = (price, received)
+        self.pending_updates += len(prices)
+        if self.oldest is None:
+            self.oldest = now
+
+    def drain(self) -> Tuple[Dict[str, Tuple[float, datetime]], int, Optional[float]]:
+        """
+        Retorna (e esvazia) os preços pendentes, a quantidade de atualizações que eles
+        representam e o instante (monotonic) da atualização mais antiga.
+        """
+        drained = (self._latest, self.pending_updates, self.oldest)
+        self._latest, self.pending_updates, self.oldest = {}, 0, None
+        return drained
+
+
+@dataclass
+class IngestStats:
+    started: float
+    messages: int = 0
+    updates: int = 0
+    flushes: int = 0
+    # Atualizações substituídas por uma mais recente do mesmo ativo antes da gravação
+    coalesced: int = 0
+    facts_written: int = 0
+    unknown_assets: int = 0
+    flush_errors: int = 0
+    last_flush_seconds: float = 0.0
+    # Tempo entre a atualização mais antiga do micro-lote e o fim da sua gravação
+    last_lag_seconds: float = 0.0
+    max_lag_seconds: float = 0.0
+
+    def snapshot(self) -> Dict[str, float]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        values = asdict(self)
+        del values["started"]
+        values["updates_per_second"] = self.updates / elapsed
+        values["facts_per_second"] = self.facts_written / elapsed
+        return values
+
+
+class MicroBatchWriter:
+    """
+    Grava micro-lotes coalescidos na staging (`crypto_raw`) e no DW (`crypto_market_data`).
+    """
+
+    def __init__(self, staging_engine=None, dw_engine=None,
+                 reference_refresh: float = INGEST_REFERENCE_REFRESH_SECONDS):
+        self.staging_engine = staging_engine or get_staging_area_engine()
+        self.dw_engine = dw_engine or get_dw_engine()
+        self.reference_refresh = reference_refresh
+        self.raw_table = get_table(STAGING, "crypto_raw")
+        self.market_table = get_table(DW, "crypto_market_data")
+        self._reference: Dict[str, Dict] = {}
+        self._reference_loaded = None
+
+    def refresh_reference(self):
+        """
+        Recarrega da staging o último snapshot completo de cada ativo.
+        """
+        columns = [self.raw_table.c[name] for name in TEXT_FIELDS + tuple(NUMERIC_FIELDS)]
+        with self.staging_engine.connect() as conn:
+            rows = conn.execute(select(*columns)).mappings().all()
+        self._reference = {row["id"]: dict(row) for row in rows}
+        self._reference_loaded = time.monotonic()
+        logger.info(f"🔄 Referência do daemon recarregada: {len(self._reference)} ativos")
+
+    def _records(self, prices: Dict[str, Tuple[float, datetime]]) -> Tuple[List[Dict], List[datetime]]:
+        records, timestamps = [], []
+        for asset, (price, received) in prices.items():
+            reference = self._reference.get(asset)
+            if reference is None:
+                continue
+            record = {"id": asset, "symbol": reference["symbol"], "name": reference["name"],
+                      "explorer": reference["explorer"]}
+            record.update({field: reference[column] for column, field in NUMERIC_FIELDS.items()})
+            supply = reference["supply"]
+            record["priceUsd"] = price
+            record["marketCapUsd"] = price * float(supply) if supply else reference["market_cap_usd"]
+            records.append(record)
+            timestamps.append(received)
+        return records, timestamps
+
+    def write(self, prices: Dict[str, Tuple[float, datetime]], chunk_size: int = STAGING_CHUNK_SIZE) -> int:
+        """
+        Grava os preços coalescidos e retorna a quantidade de fatos inseridos.
+        """
+        if self._reference_loaded is None or time.monotonic() - self._reference_loaded >= self.reference_refresh:
+            self.refresh_reference()
+
+        records, timestamps = self._records(prices)
+        if not records:
+            return 0
+        batch = AssetBatch.from_records(records, timestamps=timestamps)
+
+        # A staging é confirmada só depois do DW; uma falha no DW desfaz as duas
+        with self.staging_engine.begin() as staging_conn:
+            bulk_write(staging_conn, self.raw_table, LIVE_COLUMNS, batch.rows(LIVE_COLUMNS), chunk_size,
+                       assignments=lambda new: [(name, new[name]) for name in LIVE_COLUMNS if name != "id"])
+            with self.dw_engine.begin() as dw_conn:
+                bulk_write(dw_conn, self.market_table, FACT_COLUMNS, batch.rows(FACT_COLUMNS), chunk_size)
+                update_rollups(dw_conn, batch)
+        return len(batch)
+
+
+class IngestDaemon:
+    """
+    Recebe mensagens de `source`, coalesce os preços e grava um micro-lote a cada
+    `flush_seconds` segundos ou `flush_updates` atualizações (uma gravação por vez).
+    """
+
+    def __init__(self, writer: MicroBatchWriter, flush_seconds: float = INGEST_FLUSH_SECONDS,
+                 flush_updates: int = INGEST_FLUSH_UPDATES, metrics_sink: str = METRICS_SINK,
+                 metrics_dir: str = METRICS_DIR):
+        self.writer = writer
+        self.flush_seconds = flush_seconds
+        self.flush_updates = flush_updates
+        self.metrics_sink = metrics_sink
+        self.metrics_dir = metrics_dir
+        self.buffer = PriceBuffer()
+        self.stats = IngestStats(started=time.monotonic())
+        self._flush_lock = asyncio.Lock()
+        self._pending_flush: Optional[asyncio.Task] = None
+
+    async def flush(self):
+        async with self._flush_lock:
+            prices, updates, oldest = self.buffer.drain()
+            if not prices:
+                return
+            started = time.monotonic()
+            try:
+                written = await asyncio.get_running_loop().run_in_executor(None, self.writer.write, prices)
+            except Exception as e:
+                # O micro-lote é descartado: o próximo preço de cada ativo o substitui
+                self.stats.flush_errors += 1
+                logger.error(f"❌ Erro ao gravar micro-lote ({len(prices)} ativos): {e}")
+                return
+            finished = time.monotonic()
+
+            stats = self.stats
+            stats.flushes += 1
+            stats.coalesced += updates - len(prices)
+            stats.facts_written += written
+            stats.unknown_assets += len(prices) - written
+            stats.last_flush_seconds = finished - started
+            stats.last_lag_seconds = finished - oldest
+            stats.max_lag_seconds = max(stats.max_lag_seconds, stats.last_lag_seconds)
+            snapshot = stats.snapshot()
+            logger.info(
+                f"⚡ Micro-lote gravado: {written} fatos de {updates} atualizações em "
+                f"{stats.last_flush_seconds:.3f}s, lag {stats.last_lag_seconds:.3f}s "
+                f"({snapshot['updates_per_second']:.0f} atualizações/s)"
+            )
+            try:
+                metrics.write_counters("ingest", snapshot, self.metrics_sink, self.metrics_dir)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao gravar métricas do daemon: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def run(self, source: AsyncIterator[Dict]):
+        """
+        Consome `source` até que ela termine ou a tarefa seja cancelada; o micro-lote
+        pendente é gravado antes de retornar.
+        """
+        ticker = asyncio.create_task(self._flush_periodically())
+        try:
+            async for message in source:
+                prices = parse_prices(message)
+                self.stats.messages += 1
+                self.stats.updates += len(prices)
+                self.buffer.add(prices)
+                if self.buffer.pending_updates >= self.flush_updates and \
+                        (self._pending_flush is None or self._pending_flush.done()):
+                    self._pending_flush = asyncio.create_task(self.flush())
+        finally:
+            ticker.cancel()
+            if self._pending_flush is not None:
+                await asyncio.gather(self._pending_flush, return_exceptions=True)
+            await self.flush()
+            logger.info(f"🛑 Daemon de ingestão encerrado: {self.stats.snapshot()}")
+
+
+def _with_api_key(url: str) -> str:
+    if COINCAP_API_KEY and "apiKey=" not in url:
+        return f"{url}{'&' if '?' in url else '?'}apiKey={COINCAP_API_KEY}"
+    return url
+
+
+async def websocket_source(url: str = INGEST_SOURCE_URL,
+                           reconnect_max: float = INGEST_RECONNECT_MAX_SECONDS) -> AsyncIterator[Dict]:
+    """
+    Mensagens JSON do websocket `url`, reconectando com backoff exponencial.
+    """
+    attempt = 0
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.ws_connect(_with_api_key(url), heartbeat=30) as ws:
+                    logger.info(f"🔌 Conectado ao fluxo de preços {url}")
+                    attempt = 0
+                    async for message in ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            yield json.loads(message.data)
+                        elif message.type == aiohttp.WSMsgType.ERROR:
+                            break
+                logger.warning("⚠️ Fluxo de preços encerrado pelo servidor")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"⚠️ Falha na conexão com o fluxo de preços: {e}")
+            delay = min(reconnect_max, 0.5 * 2 ** attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def line_source(path: str) -> AsyncIterator[Dict]:
+    """
+    Uma mensagem JSON por linha de `path` (`-` = stdin).
+    """
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        while True:
+            line = await asyncio.to_thread(stream.readline)
+            if not line:
+                return
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+async def _main(source_name: str):
+    source = websocket_source(source_name) if source_name.startswith(("ws://", "wss://")) else line_source(source_name)
+    daemon = IngestDaemon(MicroBatchWriter())
+    task = asyncio.create_task(daemon.run(source))
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão contínua de preços em micro-lotes")
+    parser.add_argument("--source", default=INGEST_SOURCE_URL, help="URL ws(s)://, arquivo JSONL ou - (stdin)")
+    args = parser.parse_args()
+    asyncio.run(_main(args.source))
@@ -0,0 +1,208 @@
+"""
+landing.py
+
+Este módulo mantém a *landing zone*: uma cópia bruta, colunar e comprimida de cada
+extração da API CoinCap, gravada em Arrow IPC e particionada por data:
+
+    LANDING_DIR/date=AAAA-MM-DD/assets-AAAAMMDDTHHMMSSffffff.arrow
+
+Na DAG particionada, cada shard grava a sua faixa do ranking em um arquivo próprio do
+mesmo snapshot (`assets-AAAAMMDDTHHMMSSffffff-shardN.arrow`).
+
+Como a staging guarda apenas o último snapshot de cada ativo (UPSERT por `id`), estes
+arquivos são a única cópia durável dos snapshots anteriores. O replay relê os arquivos
+e refaz a carga na staging ou no DW sem acessar a API. Cada página da API é um record
+batch do arquivo: o replay lê e descomprime uma página por vez (`iter_landed`), de modo
+que a memória fica limitada a uma página, não ao arquivo inteiro.
+
+Com `HTTP_CONDITIONAL_REQUESTS` (padrão), as páginas que a API responde com `304 Not
+Modified` não são baixadas e, portanto, não são gravadas: cada arquivo traz apenas as
+páginas alteradas desde a extração anterior, não um snapshot completo. Reaplicados em
+ordem cronológica, os arquivos reconstroem a staging (cada ativo fica com a última
+versão gravada) e os mesmos fatos que a carga original gravou no DW (que também só
+recebe os ativos alterados). Para arquivos com snapshots completos, desative
+`HTTP_CONDITIONAL_REQUESTS`.
+
+Funções:
+- land_pages: Repassa as páginas de uma extração, gravando-as no arquivo do snapshot.
+- write_landing: Grava uma extração já materializada (ex.: resultado de `extract_data`).
+- list_landed: Lista os arquivos da landing zone em um intervalo de datas.
+- iter_landed: Lê um arquivo página a página, como um `AssetBatch` por record batch.
+- read_landed: Lê um arquivo inteiro como um único `AssetBatch`.
+- replay: Recarrega a staging ou o DW a partir dos arquivos.
+
+Execução (replay):
+    - PYTHONPATH=. python include/etl/landing.py --replay [--since AAAA-MM-DD] [--until AAAA-MM-DD] [--target staging|dw]
+"""
+
+import argparse
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+import pyarrow as pa
+import pyarrow.compute as pc
+from include.config.config import LANDING_COMPRESSION, LANDING_DIR
+from include.etl.batch import AssetBatch, NUMERIC_FIELDS
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("landing", "logs/pipeline.log")
+
+# Campos do payload `/v3/assets` preservados na landing zone (todos texto na API)
+ASSET_FIELDS = ("id", "rank", "symbol", "name", "supply", "maxSupply", "marketCapUsd", "volumeUsd24Hr",
+                "priceUsd", "changePercent24Hr", "vwap24Hr", "explorer")
+SCHEMA = pa.schema([(field, pa.string()) for field in ASSET_FIELDS])
+TIMESTAMP_KEY = b"snapshot_timestamp"
+TARGETS = ("staging", "dw")
+
+
+def landing_path(timestamp: datetime, root: str = LANDING_DIR, part: str = None) -> Path:
+    suffix = f"-{part}" if part else ""
+    return Path(root) / f"date={timestamp:%Y-%m-%d}" / f"assets-{timestamp:%Y%m%dT%H%M%S%f}{suffix}.arrow"
+
+
+def _as_text(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _record_batch(page: List[Dict], schema: pa.Schema) -> pa.RecordBatch:
+    return pa.record_batch(
+        [pa.array([_as_text(asset.get(field)) for asset in page], type=pa.string()) for field in ASSET_FIELDS],
+        schema=schema
+    )
+
+
+def land_pages(pages: Iterable[List[Dict]], timestamp: datetime, root: str = LANDING_DIR,
+               compression: str = LANDING_COMPRESSION, part: str = None) -> Iterator[List[Dict]]:
+    """
+    Gera as mesmas páginas de `pages`, gravando cada uma como um record batch do arquivo
+    do snapshot (`part` distingue os arquivos de um mesmo snapshot). O arquivo é escrito
+    com sufixo `.tmp` e renomeado ao final; se a extração falhar ou o consumidor parar no
+    meio, o arquivo parcial é removido.
+    """
+    path = landing_path(timestamp, root, part)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".arrow.tmp")
+    schema = SCHEMA.with_metadata({TIMESTAMP_KEY: timestamp.isoformat()})
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+
+    rows = 0
+    try:
+        with pa.OSFile(str(partial), "wb") as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+            for page in pages:
+                if page:
+                    writer.write_batch(_record_batch(page, schema))
+                    rows += len(page)
+                yield page
+        os.replace(partial, path)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    logger.info(f"🛬 Extração gravada na landing zone: {path} ({rows} registros, {path.stat().st_size} bytes)")
+
+
+def write_landing(records: List[Dict], timestamp: datetime, root: str = LANDING_DIR,
+                  compression: str = LANDING_COMPRESSION) -> Path:
+    for _ in land_pages([records], timestamp, root, compression):
+        pass
+    return landing_path(timestamp, root)
+
+
+def list_landed(since: date = None, until: date = None, root: str = LANDING_DIR) -> List[Path]:
+    """
+    Arquivos da landing zone com data entre `since` e `until` (inclusive), em ordem cronológica.
+    """
+    files = []
+    for path in Path(root).glob("date=*/assets-*.arrow"):
+        day = date.fromisoformat(path.parent.name.split("=", 1)[1])
+        if (since is None or day >= since) and (until is None or day <= until):
+            files.append(path)
+    return sorted(files, key=lambda path: path.name)
+
+
+def _numeric_column(column: pa.ChunkedArray):
+    # Conversão texto -> float64 vetorizada pelo Arrow (nulos viram NaN); valores
+    # fora do padrão caem no caminho genérico do AssetBatch
+    try:
+        return pc.cast(column, pa.float64()).to_numpy(zero_copy_only=False)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return column.to_pylist()
+
+
+def _as_batch(table, timestamp: datetime) -> AssetBatch:
+    numeric = set(NUMERIC_FIELDS.values())
+    columns = {
+        name: _numeric_column(table.column(name)) if name in numeric else table.column(name).to_pylist()
+        for name in table.column_names
+    }
+    return AssetBatch.from_columns(columns, timestamp)
+
+
+def iter_landed(path: Path) -> Iterator[AssetBatch]:
+    """
+    Gera um `AssetBatch` por página gravada. O arquivo é mapeado em memória e cada
+    record batch só é descomprimido quando lido: apenas uma página fica em memória.
+    """
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        timestamp = datetime.fromisoformat(reader.schema.metadata[TIMESTAMP_KEY].decode())
+        for index in range(reader.num_record_batches):
+            yield _as_batch(pa.Table.from_batches([reader.get_batch(index)]), timestamp)
+
+
+def read_landed(path: Path) -> AssetBatch:
+    """
+    O arquivo inteiro em um único lote: todas as páginas são descomprimidas de uma vez
+    (use `iter_landed` para arquivos grandes).
+    """
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        timestamp = datetime.fromisoformat(reader.schema.metadata[TIMESTAMP_KEY].decode())
+        return _as_batch(reader.read_all(), timestamp)
+
+
+def replay(since: date = None, until: date = None, target: str = "staging", root: str = LANDING_DIR) -> int:
+    """
+    Recarrega os snapshots da landing zone, em ordem cronológica e página a página:
+    - `staging`: refaz a carga em `crypto_raw` (cada snapshot sobrescreve o anterior);
+    - `dw`: carrega dimensão, fatos e agregações em modo histórico (fatos já existentes
+      são ignorados e o resumo publicado do Power BI não é substituído).
+    Arquivos gravados com requisições condicionais trazem só as páginas alteradas (ver
+    o início do módulo): ativos de páginas `304` não têm fato naquele timestamp.
+    Retorna a quantidade de registros lidos.
+    """
+    if target not in TARGETS:
+        raise ValueError(f"Destino de replay desconhecido: {target}")
+    # Importação tardia: a gravação da landing zone não depende das cargas
+    from include.etl.load_staging import load_data_to_staging
+    from include.etl.transform_load_final import load_batch_to_dw
+
+    files = list_landed(since, until, root)
+    logger.info(f"🔁 Replay de {len(files)} arquivo(s) da landing zone para {target}...")
+    total = 0
+    try:
+        for path in files:
+            for batch in iter_landed(path):
+                if target == "staging":
+                    load_data_to_staging(batch)
+                else:
+                    load_batch_to_dw(batch, incremental=True, historical=True)
+                total += len(batch)
+        logger.info(f"✅ Replay concluído: {total} registros de {len(files)} arquivo(s)")
+    except Exception as e:
+        logger.error(f"❌ Erro no replay da landing zone: {str(e)}")
+        raise
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Landing zone das extrações da API CoinCap")
+    parser.add_argument("--replay", action="store_true", help="recarrega a partir dos arquivos gravados")
+    parser.add_argument("--since", type=date.fromisoformat, help="primeira data (AAAA-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="última data (AAAA-MM-DD)")
+    parser.add_argument("--target", choices=TARGETS, default="staging", help="destino do replay")
+    args = parser.parse_args()
+    if args.replay:
+        replay(args.since, args.until, args.target)
+    else:
+        parser.print_help()
@@ -6,67 +6,195 @@ para a tabela `crypto_raw` da área de staging no banco de dados MySQL.
 
 Funções:
 - load_data_to_staging: Insere ou atualiza os registros de criptomoedas na tabela staging.
+  Aceita o payload da API ou um `AssetBatch` já convertido.
+- load_stream_to_staging: Consome páginas de um gerador e as grava em lotes, com uma fila
+  limitada entre a extração e a escrita (backpressure), sem materializar todo o payload.
 
 Requisitos:
 - A tabela `crypto_raw` deve existir no banco de dados MySQL.
 - O módulo `db_connection` deve fornecer a engine com `get_staging_area_engine`.
 
 Estratégia de inserção:
-- Utiliza `ON DUPLICATE KEY UPDATE` para atualizar registros existentes
-  com base na chave primária (geralmente o campo `id`).
+- Utiliza `ON DUPLICATE KEY UPDATE` (ou `ON CONFLICT DO UPDATE` em outros dialetos)
+  para atualizar registros existentes com base na chave primária (`id`).
+- Os registros são enviados em lotes de `STAGING_CHUNK_SIZE` linhas, um único
+  INSERT multi-linha por lote, em vez de um comando por ativo.
+- Com `STAGING_SKIP_UNCHANGED`, os hashes de conteúdo atuais (`content_hash`) são lidos em
+  uma consulta e apenas os ativos novos ou com valores alterados são gravados: os demais
+  mantêm o timestamp anterior e não são reprocessados pela transformação incremental.
+  Cada carga retorna também o hash do lote (`StagingLoad`), que identifica lotes idênticos.
+- O payload é convertido uma vez em um `AssetBatch` (colunar) e enviado ao driver
+  como tuplas posicionais (`bulk_load.bulk_write`), sem um dicionário por linha; no
+  PostgreSQL as linhas seguem por `COPY` (ver `BULK_LOAD_METHOD`).
 """
 
+import queue
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List
-from sqlalchemy import MetaData, Table
-from sqlalchemy.dialects.mysql import insert as mysql_insert
-from include.database.db_connection import get_staging_area_engine
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from sqlalchemy import Table, select
+from include.database.db_connection import get_staging_area_engine, STAGING
+from include.database.schema_cache import get_table
+from include.etl import metrics
+from include.etl.batch import AssetBatch, BatchHasher, STAGING_COLUMNS
+from include.etl.bulk_load import bulk_write
+from include.etl.utils import upsert_statement
+from include.config.config import STAGING_CHUNK_SIZE, STAGING_SKIP_UNCHANGED, STREAM_QUEUE_DEPTH
 from include.config.logging_config import setup_logger
 
 logger = setup_logger("load_staging", "logs/pipeline.log")
 
-def load_data_to_staging(raw_data: List[Dict]):
+HASH_INDEX = STAGING_COLUMNS.index("content_hash")
+
+
+@dataclass
+class StagingLoad:
+    rows: int           # ativos recebidos
+    written: int        # ativos novos ou alterados, efetivamente gravados
+    content_hash: str   # hash do lote recebido
+
+
+def current_hashes(conn, raw_table: Table) -> Dict[str, Optional[str]]:
+    return dict(conn.execute(select(raw_table.c.id, raw_table.c.content_hash)).all())
+
+
+def _changed_rows(rows: List[Tuple], previous: Dict[str, Optional[str]]) -> List[Tuple]:
+    return [row for row in rows if previous.get(row[0]) != row[HASH_INDEX]]
+
+
+def _staging_assignments(new):
+    # Todas as colunas exceto a chave (`id`) são sobrescritas pelo snapshot mais recente
+    return [(name, new[name]) for name in STAGING_COLUMNS if name != "id"]
+
+
+def _upsert_statement(raw_table: Table, dialect):
+    return upsert_statement(dialect, raw_table, _staging_assignments)
+
+
+@metrics.instrumented("load_staging")
+def load_data_to_staging(raw_data: Union[List[Dict], AssetBatch], chunk_size: int = STAGING_CHUNK_SIZE,
+                         skip_unchanged: bool = STAGING_SKIP_UNCHANGED) -> StagingLoad:
     try:
         engine = get_staging_area_engine()
-        metadata = MetaData()
-        metadata.reflect(bind=engine, only=["crypto_raw"])
-        raw_table = metadata.tables["crypto_raw"]
+        raw_table = get_table(STAGING, "crypto_raw")
+
+        batch = raw_data if isinstance(raw_data, AssetBatch) else AssetBatch.from_records(raw_data)
+        rows = batch.rows(STAGING_COLUMNS)
+        hasher = BatchHasher()
+        hasher.update((row[0], row[HASH_INDEX]) for row in rows)
 
+        started = time.perf_counter()
+        statements = 0
         with engine.begin() as conn:
-            for asset in raw_data:
-                data = {
-                    "id": asset["id"],
-                    "symbol": asset["symbol"],
-                    "name": asset["name"],
-                    "max_supply": float(asset["maxSupply"]) if asset["maxSupply"] else None,
-                    "explorer": asset.get("explorer"),
-                    "price_usd": float(asset["priceUsd"]),
-                    "market_cap_usd": float(asset["marketCapUsd"]),
-                    "volume_usd_24hr": float(asset["volumeUsd24Hr"]),
-                    "change_percent_24hr": float(asset["changePercent24Hr"]),
-                    "vwap_24hr": float(asset["vwap24Hr"]) if asset.get("vwap24Hr") else None,
-                    "supply": float(asset["supply"]),
-                    "timestamp": datetime.utcnow()
-                }
-
-                stmt = mysql_insert(raw_table).values(data)
-                stmt = stmt.on_duplicate_key_update(
-                    symbol=stmt.inserted.symbol,
-                    name=stmt.inserted.name,
-                    max_supply=stmt.inserted.max_supply,
-                    explorer=stmt.inserted.explorer,
-                    price_usd=stmt.inserted.price_usd,
-                    market_cap_usd=stmt.inserted.market_cap_usd,
-                    volume_usd_24hr=stmt.inserted.volume_usd_24hr,
-                    change_percent_24hr=stmt.inserted.change_percent_24hr,
-                    vwap_24hr=stmt.inserted.vwap_24hr,
-                    supply=stmt.inserted.supply,
-                    timestamp=stmt.inserted.timestamp
-                )
-                conn.execute(stmt)
-
-            logger.info(f"✅ Dados carregados/atualizados ({len(raw_data)} registros) na staging")
+            if skip_unchanged:
+                rows = _changed_rows(rows, current_hashes(conn, raw_table))
+            statements = bulk_write(conn, raw_table, STAGING_COLUMNS, rows, chunk_size,
+                                    assignments=_staging_assignments)
+
+        elapsed = time.perf_counter() - started
+        rate = len(rows) / elapsed if elapsed > 0 else float("inf")
+        metrics.add_rows(len(rows))
+        logger.info(
+            f"✅ Dados carregados/atualizados ({len(rows)} de {len(batch)} registros alterados) na staging "
+            f"em {statements} comando(s), {elapsed:.3f}s ({rate:.0f} registros/s)"
+        )
+        return StagingLoad(len(batch), len(rows), hasher.hexdigest())
 
     except Exception as e:
         logger.error(f"❌ Erro no carregamento para staging: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+def _rechunk(pages: Iterable[List[Dict]], size: int) -> Iterator[List[Dict]]:
+    pending = []
+    for page in pages:
+        pending.extend(page)
+        while len(pending) >= size:
+            yield pending[:size]
+            pending = pending[size:]
+    if pending:
+        yield pending
+
+
+def load_stream_to_staging(pages: Iterable[List[Dict]], timestamp: datetime = None,
+                           chunk_size: int = STAGING_CHUNK_SIZE, queue_depth: int = STREAM_QUEUE_DEPTH,
+                           skip_unchanged: bool = STAGING_SKIP_UNCHANGED) -> StagingLoad:
+    """
+    Grava na staging os ativos produzidos por `pages` (ex.: `extract.iter_pages()`).
+
+    A extração roda nesta thread e a escrita em uma thread dedicada; entre elas há uma
+    fila com no máximo `queue_depth` lotes. Quando o banco fica para trás, a extração
+    bloqueia no `put`, limitando a memória a `queue_depth * chunk_size` registros.
+    Com `skip_unchanged`, só os ativos novos ou alterados chegam à fila.
+    """
+    engine = get_staging_area_engine()
+    raw_table = get_table(STAGING, "crypto_raw")
+    timestamp = timestamp or datetime.utcnow()
+    previous = None
+    if skip_unchanged:
+        with engine.connect() as conn:
+            previous = current_hashes(conn, raw_table)
+    hasher = BatchHasher()
+    received = 0
+    chunks = queue.Queue(maxsize=max(queue_depth, 1))
+    done, abort = object(), object()
+    state = {"rows": 0, "statements": 0, "error": None}
+
+    class _Aborted(Exception):
+        pass
+
+    def writer():
+        try:
+            with engine.begin() as conn:
+                while True:
+                    chunk = chunks.get()
+                    if chunk is done:
+                        return
+                    if chunk is abort:
+                        # Desfaz a transação: a extração falhou no meio do caminho
+                        raise _Aborted()
+                    state["statements"] += bulk_write(conn, raw_table, STAGING_COLUMNS, chunk, len(chunk),
+                                                      assignments=_staging_assignments)
+                    state["rows"] += len(chunk)
+        except _Aborted:
+            pass
+        except Exception as e:
+            state["error"] = e
+            # Esvazia a fila para não deixar a extração bloqueada no put
+            while chunks.get() not in (done, abort):
+                pass
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=writer, name="staging-writer", daemon=True)
+    thread.start()
+    finished = False
+    try:
+        for chunk in _rechunk(pages, max(chunk_size, 1)):
+            if state["error"] is not None:
+                break
+            rows = AssetBatch.from_records(chunk, timestamp).rows(STAGING_COLUMNS)
+            hasher.update((row[0], row[HASH_INDEX]) for row in rows)
+            received += len(rows)
+            if previous is not None:
+                rows = _changed_rows(rows, previous)
+            if rows:
+                chunks.put(rows)
+        finished = True
+    finally:
+        chunks.put(done if finished else abort)
+        thread.join()
+
+    if state["error"] is not None:
+        logger.error(f"❌ Erro no carregamento em streaming para staging: {state['error']}")
+        raise state["error"]
+
+    elapsed = time.perf_counter() - started
+    rate = state["rows"] / elapsed if elapsed > 0 else float("inf")
+    metrics.add_rows(state["rows"])
+    logger.info(
+        f"✅ Streaming concluído: {state['rows']} de {received} registros alterados gravados na staging "
+        f"em {state['statements']} comando(s), {elapsed:.3f}s ({rate:.0f} registros/s)"
+    )
+    return StagingLoad(received, state["rows"], hasher.hexdigest())
@@ -0,0 +1,285 @@
+"""
+metrics.py
+
+Este módulo mede cada etapa do pipeline (extração, carga na staging, transformação)
+para identificar o gargalo quando uma execução passa do intervalo de 5 minutos da DAG.
+
+Por etapa são registrados:
+- duração total e de fases internas (ex.: leitura da staging, carga no DW, resumo do Power BI);
+- registros processados e bytes de payload recebidos da API;
+- requisições HTTP e suas latências (registradas por `extract.fetch_json`);
+- comandos SQL e o tempo gasto neles, via eventos de cursor das engines do SQLAlchemy
+  (`instrument_engine`, aplicado pelo registro de engines de `db_connection.py`).
+
+Ao final de cada etapa as métricas são registradas no log e enviadas ao destino
+`METRICS_SINK`:
+- `prometheus`: um arquivo `crypto_pipeline_<etapa>.prom` em `METRICS_DIR`, no formato do
+  textfile collector do node_exporter (cada etapa roda em um processo diferente na DAG);
+- `json`: uma linha JSON por execução de etapa em `METRICS_DIR/metrics.jsonl`;
+- `none`: apenas o log.
+
+Com `METRICS_PROFILE` (`cprofile` ou `pyinstrument`), cada etapa também é perfilada e o
+resultado é gravado em `METRICS_DIR/profiles/`.
+
+Funções:
+- instrumented: Decorador que mede uma função como uma etapa.
+- stage: Context manager equivalente ao decorador.
+- phase: Mede uma fase dentro da etapa atual.
+- add_rows / record_http / record_sql: Registram contadores na etapa atual.
+- instrument_engine: Conecta os eventos de cursor de uma engine às métricas.
+- write_counters: Envia contadores de um componente contínuo (ex.: o daemon de ingestão).
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from include.config.config import METRICS_DIR, METRICS_PROFILE, METRICS_SINK
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("metrics", "logs/pipeline.log")
+
+PROMETHEUS_PREFIX = "crypto_pipeline"
+
+_lock = threading.Lock()
+# Etapas em andamento no processo (a mais interna recebe os contadores). A pilha é global,
+# e não por thread, para que as threads de extração e de escrita contem na etapa que as criou
+_active: List["StageMetrics"] = []
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    started_at: str
+    status: str = "running"
+    duration_seconds: float = 0.0
+    rows: int = 0
+    payload_bytes: int = 0
+    http_requests: int = 0
+    http_seconds: float = 0.0
+    http_max_seconds: float = 0.0
+    sql_statements: int = 0
+    sql_seconds: float = 0.0
+    phases: Dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases.items())
+        return (
+            f"{self.stage}: {self.status}, {self.duration_seconds:.3f}s, {self.rows} registros, "
+            f"{self.http_requests} HTTP ({self.http_seconds:.3f}s, {self.payload_bytes} bytes), "
+            f"{self.sql_statements} SQL ({self.sql_seconds:.3f}s)" + (f" [{phases}]" if phases else "")
+        )
+
+
+def _current() -> Optional[StageMetrics]:
+    return _active[-1] if _active else None
+
+
+def add_rows(count: int):
+    with _lock:
+        metrics = _current()
+        if metrics is not None:
+            metrics.rows += count
+
+
+def record_http(seconds: float, payload_bytes: int):
+    with _lock:
+        metrics = _current()
+        if metrics is not None:
+            metrics.http_requests += 1
+            metrics.http_seconds += seconds
+            metrics.http_max_seconds = max(metrics.http_max_seconds, seconds)
+            metrics.payload_bytes += payload_bytes
+
+
+def record_sql(seconds: float):
+    with _lock:
+        metrics = _current()
+        if metrics is not None:
+            metrics.sql_statements += 1
+            metrics.sql_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if started:
+        record_sql(time.perf_counter() - started.pop())
+
+
+def instrument_engine(engine):
+    """
+    Conta comandos SQL e o tempo de execução no cursor de `engine`
+    (um `executemany` conta como um comando).
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            metrics = _current()
+            if metrics is not None:
+                metrics.phases[name] = metrics.phases.get(name, 0.0) + elapsed
+
+
+def _prometheus_text(metrics: StageMetrics) -> str:
+    labels = f'{{stage="{metrics.stage}"}}'
+    values = {
+        "stage_duration_seconds": metrics.duration_seconds,
+        "stage_success": 1 if metrics.status == "ok" else 0,
+        "stage_rows": metrics.rows,
+        "stage_payload_bytes": metrics.payload_bytes,
+        "stage_http_requests": metrics.http_requests,
+        "stage_http_seconds": metrics.http_seconds,
+        "stage_http_max_seconds": metrics.http_max_seconds,
+        "stage_sql_statements": metrics.sql_statements,
+        "stage_sql_seconds": metrics.sql_seconds,
+        "stage_last_run_timestamp_seconds": datetime.fromisoformat(metrics.started_at).timestamp(),
+    }
+    lines = []
+    for name, value in values.items():
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_{name}{labels} {value}")
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_stage_phase_seconds gauge")
+    for name, seconds in metrics.phases.items():
+        lines.append(f'{PROMETHEUS_PREFIX}_stage_phase_seconds{{stage="{metrics.stage}",phase="{name}"}} {seconds}')
+    return "\n".join(lines) + "\n"
+
+
+def _write(name: str, prometheus_text: str, record: Dict, sink: str, directory: str):
+    if sink == "none":
+        return
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    if sink == "prometheus":
+        target = path / f"{PROMETHEUS_PREFIX}_{name}.prom"
+        # Escrita atômica: o collector nunca lê um arquivo pela metade
+        partial = target.with_suffix(".prom.tmp")
+        partial.write_text(prometheus_text)
+        os.replace(partial, target)
+    elif sink == "json":
+        with open(path / "metrics.jsonl", "a") as output:
+            output.write(json.dumps(record) + "\n")
+    else:
+        raise ValueError(f"Destino de métricas desconhecido: {sink}")
+
+
+def write_metrics(metrics: StageMetrics, sink: str = METRICS_SINK, directory: str = METRICS_DIR):
+    _write(metrics.stage, _prometheus_text(metrics), asdict(metrics), sink, directory)
+
+
+def write_counters(component: str, values: Dict[str, float], sink: str = METRICS_SINK,
+                   directory: str = METRICS_DIR):
+    """
+    Envia os contadores atuais de um componente de longa duração: `prometheus` sobrescreve
+    `crypto_pipeline_<componente>.prom` e `json` acrescenta uma linha a `metrics.jsonl`.
+    """
+    lines = []
+    for name, value in values.items():
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{component}_{name} gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_{component}_{name} {value}")
+    record = {"component": component, "time": datetime.utcnow().isoformat(), **values}
+    _write(component, "\n".join(lines) + "\n", record, sink, directory)
+
+
+class _Profiler:
+    """
+    Perfil opcional da etapa: `cprofile` (biblioteca padrão) ou `pyinstrument` (se instalado).
+    """
+
+    def __init__(self, mode: str, stage_name: str, directory: str):
+        self.mode = mode
+        self.output = Path(directory) / "profiles" / f"{stage_name}-{datetime.utcnow():%Y%m%dT%H%M%S}"
+        self._profiler = None
+
+    def start(self):
+        if self.mode == "cprofile":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("⚠️ pyinstrument não está instalado; etapa executada sem perfil")
+                return
+            self._profiler = Profiler()
+            self._profiler.start()
+
+    def stop(self):
+        if self._profiler is None:
+            return
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            path = self.output.with_suffix(".prof")
+            self._profiler.dump_stats(str(path))
+        else:
+            self._profiler.stop()
+            path = self.output.with_suffix(".html")
+            path.write_text(self._profiler.output_html())
+        logger.info(f"🔬 Perfil da etapa gravado em {path}")
+
+
+@contextmanager
+def stage(name: str, sink: str = METRICS_SINK, directory: str = METRICS_DIR, profile: str = METRICS_PROFILE):
+    """
+    Mede o bloco como a etapa `name` e envia as métricas ao final (inclusive em caso de erro).
+    """
+    metrics = StageMetrics(stage=name, started_at=datetime.utcnow().isoformat())
+    profiler = _Profiler(profile, name, directory) if profile != "none" else None
+    with _lock:
+        _active.append(metrics)
+    started = time.perf_counter()
+    if profiler is not None:
+        profiler.start()
+    try:
+        yield metrics
+        metrics.status = "ok"
+    except BaseException:
+        metrics.status = "error"
+        raise
+    finally:
+        metrics.duration_seconds = time.perf_counter() - started
+        if profiler is not None:
+            profiler.stop()
+        with _lock:
+            _active.remove(metrics)
+        logger.info(f"📊 Métricas da etapa {metrics.summary()}")
+        try:
+            write_metrics(metrics, sink, directory)
+        except Exception as e:
+            # Métricas nunca derrubam a etapa
+            logger.warning(f"⚠️ Falha ao gravar métricas da etapa {name}: {e}")
+
+
+def instrumented(name: str):
+    """
+    Decorador: cada chamada da função é medida como a etapa `name`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,235 @@
+"""
+rollups.py
+
+Este módulo mantém as tabelas de agregação OHLCV por ativo (`crypto_ohlcv_1h` e
+`crypto_ohlcv_1d`), atualizadas a cada execução a partir do lote recém-carregado em
+`crypto_market_data`, para que gráficos de longo prazo leiam milhares de linhas
+em vez de milhões de snapshots de 5 minutos.
+
+Cada balde (ativo, início do período) guarda: preço de abertura/máxima/mínima/fechamento,
+volume médio, último market cap, quantidade de amostras e o primeiro/último timestamp
+vistos. O lote é agregado em memória e mesclado com o balde existente via
+`INSERT ... ON DUPLICATE KEY UPDATE` (`ON CONFLICT DO UPDATE` em outros dialetos),
+tocando apenas os baldes do lote.
+
+Funções:
+- aggregate_ohlcv: Agrega fatos (lista de dicionários ou `AssetBatch`) em baldes de uma
+  granularidade, de forma vetorizada (NumPy).
+- update_rollups: Mescla um lote de fatos em todas as tabelas de agregação.
+- rebuild_rollups: Recalcula as agregações a partir do histórico de `crypto_market_data`.
+
+Execução (reconstrução do histórico):
+    - PYTHONPATH=. python include/etl/rollups.py --rebuild [--since AAAA-MM-DD]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple, Union
+import numpy as np
+from sqlalchemy import case, delete, select
+from include.config.config import ROLLUP_CHUNK_SIZE
+from include.database.db_connection import get_dw_engine, DW
+from include.database.schema_cache import get_table
+from include.etl.batch import AssetBatch, nullable_list
+from include.etl.bulk_load import bulk_write
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("rollups", "logs/pipeline.log")
+
+
+ROLLUP_COLUMNS = ("id", "bucket_start", "open_price", "high_price", "low_price", "close_price",
+                  "avg_volume_usd_24hr", "last_market_cap_usd", "sample_count", "first_timestamp",
+                  "last_timestamp")
+# granularidade -> (tabela, unidade do datetime64 usada para truncar o timestamp)
+GRANULARITIES = {
+    "1h": ("crypto_ohlcv_1h", "h"),
+    "1d": ("crypto_ohlcv_1d", "D"),
+}
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _floats(values) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _datetime64(timestamps) -> np.ndarray:
+    # Aritmética de timedelta é bem mais rápida que a conversão de datetime do NumPy
+    return np.fromiter(((timestamp - EPOCH) // MICROSECOND for timestamp in timestamps),
+                       dtype=np.int64, count=len(timestamps)).view("datetime64[us]")
+
+
+def _fact_columns(facts: Union[List[Dict], AssetBatch]):
+    """
+    (ids, timestamps, preço, volume, market cap) dos fatos, com `NaN` para nulos.
+    """
+    if isinstance(facts, AssetBatch):
+        return (facts.id, facts.column("timestamp"), facts.price_usd,
+                facts.volume_usd_24hr, facts.market_cap_usd)
+    return (
+        [fact["id"] for fact in facts],
+        [fact["timestamp"] for fact in facts],
+        _floats(fact["price_usd"] for fact in facts),
+        _floats(fact.get("volume_usd_24hr") for fact in facts),
+        _floats(fact.get("market_cap_usd") for fact in facts),
+    )
+
+
+def _aggregate_rows(facts: Union[List[Dict], AssetBatch], granularity: str) -> List[Tuple]:
+    """
+    Agrega os fatos em baldes (ativo, início do período) de forma vetorizada: os fatos
+    são ordenados por (ativo, timestamp) e cada balde é reduzido com `ufunc.reduceat`.
+    Retorna tuplas na ordem de `ROLLUP_COLUMNS`.
+    """
+    _, unit = GRANULARITIES[granularity]
+    ids, timestamps, prices, volumes, market_caps = _fact_columns(facts)
+    valid = np.flatnonzero(~np.isnan(prices))
+    if not len(valid):
+        return []
+
+    ids = np.array(ids, dtype=object)[valid]
+    # Código por ativo (ordem de aparição): ordenar inteiros é mais barato que ordenar strings
+    codes_by_id = {}
+    codes = np.fromiter((codes_by_id.setdefault(asset_id, len(codes_by_id)) for asset_id in ids.tolist()),
+                        dtype=np.int64, count=len(ids))
+    times = _datetime64(timestamps)[valid]
+    # lexsort é estável: o último array é a chave primária
+    order = np.lexsort((times, codes))
+    ids, codes, times = ids[order], codes[order], times[order]
+    prices, volumes, market_caps = prices[valid][order], volumes[valid][order], market_caps[valid][order]
+    buckets = times.astype(f"datetime64[{unit}]")
+
+    starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])])
+    ends = np.r_[starts[1:], len(codes)] - 1
+    has_volume = ~np.isnan(volumes)
+    volume_count = np.add.reduceat(has_volume.astype(np.int64), starts)
+    average_volume = np.add.reduceat(np.where(has_volume, volumes, 0.0), starts) / np.maximum(volume_count, 1)
+    average_volume[volume_count == 0] = np.nan
+
+    return list(zip(
+        ids[starts].tolist(),
+        buckets[starts].astype("datetime64[us]").tolist(),
+        prices[starts].tolist(),
+        np.maximum.reduceat(prices, starts).tolist(),
+        np.minimum.reduceat(prices, starts).tolist(),
+        prices[ends].tolist(),
+        nullable_list(average_volume),
+        nullable_list(market_caps[ends]),
+        (ends - starts + 1).tolist(),
+        times[starts].tolist(),
+        times[ends].tolist(),
+    ))
+
+
+def aggregate_ohlcv(facts: Union[List[Dict], AssetBatch], granularity: str) -> List[Dict]:
+    return [dict(zip(ROLLUP_COLUMNS, row)) for row in _aggregate_rows(facts, granularity)]
+
+
+def _merge_assignments(old, new):
+    """
+    Atribuições do UPSERT que mescla o balde do lote com o balde existente. São
+    ordenadas (o MySQL as avalia da esquerda para a direita) de modo que cada
+    expressão leia os valores antigos de `first_timestamp`, `last_timestamp` e
+    `sample_count`, que só são atualizados no final.
+    """
+    total = old.sample_count + new.sample_count
+    return [
+        ("open_price", case((new.first_timestamp < old.first_timestamp, new.open_price), else_=old.open_price)),
+        ("high_price", case((new.high_price > old.high_price, new.high_price), else_=old.high_price)),
+        ("low_price", case((new.low_price < old.low_price, new.low_price), else_=old.low_price)),
+        ("close_price", case((new.last_timestamp >= old.last_timestamp, new.close_price), else_=old.close_price)),
+        ("avg_volume_usd_24hr", case(
+            (old.avg_volume_usd_24hr.is_(None), new.avg_volume_usd_24hr),
+            (new.avg_volume_usd_24hr.is_(None), old.avg_volume_usd_24hr),
+            else_=(old.avg_volume_usd_24hr * old.sample_count
+                   + new.avg_volume_usd_24hr * new.sample_count) / total
+        )),
+        ("last_market_cap_usd", case(
+            (new.last_timestamp >= old.last_timestamp, new.last_market_cap_usd), else_=old.last_market_cap_usd
+        )),
+        ("first_timestamp", case((new.first_timestamp < old.first_timestamp, new.first_timestamp),
+                                 else_=old.first_timestamp)),
+        ("last_timestamp", case((new.last_timestamp > old.last_timestamp, new.last_timestamp),
+                                else_=old.last_timestamp)),
+        ("sample_count", total),
+    ]
+
+
+def update_rollups(conn, facts: Union[List[Dict], AssetBatch], chunk_size: int = ROLLUP_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Mescla `facts` em todas as granularidades usando a conexão (transação) informada.
+    Retorna a quantidade de baldes tocados por granularidade.
+    """
+    touched = {}
+    for granularity, (table_name, _) in GRANULARITIES.items():
+        rows = _aggregate_rows(facts, granularity)
+        if rows:
+            table = get_table(DW, table_name)
+            bulk_write(conn, table, ROLLUP_COLUMNS, rows, chunk_size,
+                       assignments=lambda new: _merge_assignments(table.c, new))
+        touched[granularity] = len(rows)
+    return touched
+
+
+def rebuild_rollups(since: datetime = None, chunk_size: int = ROLLUP_CHUNK_SIZE):
+    """
+    Recalcula as agregações a partir de `crypto_market_data` (opcionalmente a partir de
+    `since`). Os fatos são lidos em streaming, ordenados por (id, timestamp), e cada
+    fatia é mesclada com o mesmo UPSERT da carga incremental.
+    """
+    # Alinha ao início do dia (maior granularidade) para não mesclar sobre baldes parciais
+    since = since.replace(hour=0, minute=0, second=0, microsecond=0) if since is not None else None
+    logger.info(f"🔧 Reconstruindo agregações OHLCV (desde {since or 'o início'})...")
+    dw_engine = get_dw_engine()
+    market_table = get_table(DW, "crypto_market_data")
+
+    try:
+        # Leitura em streaming (cursor no servidor) e escrita precisam de conexões separadas
+        with dw_engine.connect() as read_conn, dw_engine.begin() as conn:
+            for table_name, _ in GRANULARITIES.values():
+                table = get_table(DW, table_name)
+                stmt = delete(table)
+                if since is not None:
+                    stmt = stmt.where(table.c.bucket_start >= since)
+                conn.execute(stmt)
+
+            query = select(
+                market_table.c.id, market_table.c.price_usd, market_table.c.volume_usd_24hr,
+                market_table.c.market_cap_usd, market_table.c.timestamp
+            ).order_by(market_table.c.id, market_table.c.timestamp)
+            if since is not None:
+                query = query.where(market_table.c.timestamp >= since)
+
+            total = 0
+            result = read_conn.execution_options(stream_results=True).execute(query)
+            for partition in result.mappings().partitions(chunk_size):
+                facts = [
+                    {
+                        "id": row["id"],
+                        "price_usd": float(row["price_usd"]) if row["price_usd"] is not None else None,
+                        "volume_usd_24hr": float(row["volume_usd_24hr"]) if row["volume_usd_24hr"] is not None else None,
+                        "market_cap_usd": float(row["market_cap_usd"]) if row["market_cap_usd"] is not None else None,
+                        "timestamp": row["timestamp"],
+                    }
+                    for row in partition
+                ]
+                update_rollups(conn, facts, chunk_size)
+                total += len(facts)
+
+        logger.info(f"✅ Agregações OHLCV reconstruídas a partir de {total} fatos")
+    except Exception as e:
+        logger.error(f"❌ Erro ao reconstruir agregações OHLCV: {str(e)}")
+        raise
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agregações OHLCV de crypto_market_data")
+    parser.add_argument("--rebuild", action="store_true", help="recalcula as agregações a partir do histórico")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="reconstrói apenas a partir desta data")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_rollups(args.since)
+    else:
+        parser.print_help()
@@ -6,18 +6,21 @@ de dados de criptomoedas da API CoinCap.
 
 Utilização:
 - Destinado a testes locais ou execuções pontuais da pipeline fora do Airflow.
-- Executa as três etapas principais da ETL em sequência:
-    1. Extração de dados da API.
-    2. Carga na área de staging (tabela `crypto_raw`).
-    3. Transformação e carga na área final (tabela `crypto_processed`).
+- Executa as etapas principais da ETL em sequência:
+    1. Extração de dados da API e carga na área de staging (tabela `crypto_raw`), em streaming.
+    2. Transformação e carga na área final (tabelas `cryptocurrencies` e `crypto_market_data`).
+    3. Atualização incremental dos indicadores por ativo (`crypto_analytics`), se `ANALYTICS_ENABLED`.
+  Com `DIRECT_LOAD_ENABLED`, a etapa 1 já carrega o DW (`direct_load.py`) e a 2 é ignorada.
 
 Execução: 
     - PYTHONPATH=. python include/etl/run_etl_manual.py
 """
 
-from extract import extract_data
-from load_staging import load_data_to_staging
-from transform_load_final import transform_and_load_data
+from include.config.config import ANALYTICS_ENABLED, DIRECT_LOAD_ENABLED
+from include.etl.analytics import update_analytics
+from include.etl.direct_load import extract_and_load_direct
+from include.etl.extract_load_stream import extract_and_load_staging
+from include.etl.transform_load_final import transform_and_load_data
 from include.config.logging_config import setup_logger
 import logging
 
@@ -29,14 +32,15 @@ def main():
     try:
         logger.info("Iniciando pipeline ETL manual")
 
-        # Extração
-        raw_data = extract_data()
-       
-        # Carga para staging
-        load_data_to_staging(raw_data)
+        # Extração e carga para staging (streaming, sem manter o payload completo em memória)
+        batch_ref = extract_and_load_direct() if DIRECT_LOAD_ENABLED else extract_and_load_staging()
         
-        # Transformação e carga final
-        transform_and_load_data()
+        # Transformação e carga final (ignorada se nenhum ativo mudou)
+        transform_and_load_data(batch_ref=batch_ref)
+
+        # Indicadores pré-calculados a partir dos fatos novos
+        if ANALYTICS_ENABLED:
+            update_analytics()
 
         logger.info("Pipeline ETL executada com sucesso \n")
 
@@ -0,0 +1,176 @@
+"""
+shards.py
+
+Este módulo implementa a DAG particionada (`ETL_SHARDS` > 1): o universo de ativos é
+dividido em faixas contíguas do ranking da API (offsets de página), e cada faixa é
+extraída, gravada na staging e carregada no DW por uma task mapeada própria
+(*dynamic task mapping* do Airflow). Uma task final (fan-in) publica o resumo do Power BI.
+
+Funcionamento:
+- `plan_shards` reparte o universo de ativos em N faixas do mesmo tamanho e fixa um
+  único timestamp para o snapshot: todas as faixas (e as suas novas tentativas) gravam
+  fatos com o mesmo timestamp. O universo é estimado pela quantidade de ativos na
+  staging (o snapshot anterior); sem histórico, vale uma página de `COINCAP_PAGE_LIMIT`.
+  O tamanho de página de cada faixa é reduzido para que todas tenham trabalho (com os
+  padrões, o universo inteiro cabe em uma página de 2000 ativos), e a última faixa
+  segue até uma página incompleta (até `COINCAP_PAGE_LIMIT` x `COINCAP_MAX_PAGES`
+  ativos), de modo que os ativos novos desde a estimativa não se perdem. O limite de
+  requisições da API é dividido entre as faixas.
+- Cada faixa segue o caminho direto (`direct_load.load_pages_direct`) com a sua própria
+  landing (`assets-...-shardN.arrow`) e o seu próprio cache de validadores HTTP. Fatos
+  já existentes são ignorados, de modo que uma faixa com falha pode ser repetida
+  sozinha sem duplicar fatos, e um ativo que mudou de página entre as requisições de
+  faixas vizinhas é carregado uma única vez.
+- As agregações OHLCV e a marca d'água são gravadas na transação dos fatos de cada
+  faixa: as faixas têm ativos distintos (baldes distintos), a nova tentativa de uma
+  faixa é atômica e a task final pode ser repetida sem contar amostras duas vezes.
+- `finalize_shards` lê do DW os fatos do snapshot (todas as faixas) e atualiza o resumo
+  do Power BI; no modo incremental, os ativos inalterados mantêm as linhas publicadas.
+
+Funções:
+- plan_shards: Define as faixas do ranking e o timestamp do snapshot.
+- extract_and_load_shard: Extrai e carrega uma faixa (uma task mapeada).
+- finalize_shards: Atualiza o resumo do Power BI a partir das faixas carregadas.
+"""
+
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from include.config.config import (
+    COINCAP_MAX_PAGES, COINCAP_PAGE_LIMIT, COINCAP_RATE_LIMIT, COINCAP_WORKERS, ETL_SHARDS, HTTP_CACHE_PATH,
+    HTTP_CONDITIONAL_REQUESTS, LANDING_ENABLED, STAGING_SKIP_UNCHANGED, TRANSFORM_INCREMENTAL
+)
+from include.database.db_connection import get_dw_engine, get_staging_area_engine, DW, STAGING
+from include.database.schema_cache import get_table
+from include.etl import metrics
+from include.etl.direct_load import load_pages_direct
+from include.etl.extract import ConditionalCache, iter_pages
+from include.etl.landing import land_pages
+from include.etl.transform_load_final import build_powerbi_summary, carried_summary, refresh_powerbi_summary
+from include.config.logging_config import setup_logger
+
+logger = setup_logger("shards", "logs/pipeline.log")
+
+
+def _estimate_universe(staging_engine) -> int:
+    raw_table = get_table(STAGING, "crypto_raw")
+    with staging_engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(raw_table)).scalar() or 0
+
+
+def plan_shards(shards: int = ETL_SHARDS, universe: Optional[int] = None, page_limit: int = COINCAP_PAGE_LIMIT,
+                max_pages: int = COINCAP_MAX_PAGES, timestamp: datetime = None, staging_engine=None) -> List[Dict]:
+    """
+    Uma entrada por faixa: índice, tamanho de página, primeira página, páginas previstas
+    (`pages`) e máximas (`max_pages`) e o `batch_id` (timestamp ISO) comum ao snapshot. `universe` é a quantidade
+    esperada de ativos (padrão: a da staging). As entradas trafegam via XCom.
+    """
+    if universe is None:
+        universe = _estimate_universe(staging_engine or get_staging_area_engine())
+    capacity = page_limit * max_pages
+    universe = min(universe or page_limit, capacity)
+
+    # Offsets da API são múltiplos do tamanho de página: faixa i começa em i * shard_limit
+    shard_limit = min(page_limit, math.ceil(universe / max(shards, 1)))
+    pages = math.ceil(universe / shard_limit)
+    shards = max(1, min(shards, pages))
+    batch_id = (timestamp or datetime.utcnow()).isoformat()
+    base, extra = divmod(pages, shards)
+    plan = []
+    first_page = 0
+    for index in range(shards):
+        shard_pages = base + (1 if index < extra else 0)
+        # A última faixa segue até uma página incompleta: cobre os ativos novos desde a estimativa
+        limit = math.ceil(capacity / shard_limit) - first_page if index == shards - 1 else shard_pages
+        plan.append({"shard": index, "shards": shards, "page_limit": shard_limit, "first_page": first_page,
+                     "pages": shard_pages, "max_pages": limit, "batch_id": batch_id})
+        first_page += shard_pages
+    logger.info(
+        f"🧩 Snapshot {batch_id} dividido em {shards} faixa(s) de ~{universe} ativos "
+        f"({shard_limit} por página)"
+    )
+    return plan
+
+
+@metrics.instrumented("extract_load_shard")
+def extract_and_load_shard(shard: Dict, url: str = None, staging_engine=None, dw_engine=None,
+                           skip_unchanged: bool = STAGING_SKIP_UNCHANGED, incremental: bool = TRANSFORM_INCREMENTAL,
+                           landing: bool = LANDING_ENABLED,
+                           cache_path: Optional[str] = HTTP_CACHE_PATH if HTTP_CONDITIONAL_REQUESTS else None) -> Dict:
+    """
+    Retorna a referência do lote da faixa (formato de `extract_and_load_direct`, com o
+    índice em `shard`).
+    """
+    index = shard["shard"]
+    logger.info(
+        f"🚀 Faixa {index + 1}/{shard['shards']}: ativos a partir da posição "
+        f"{shard['first_page'] * shard['page_limit']} do snapshot {shard['batch_id']}"
+    )
+    staging_engine = staging_engine or get_staging_area_engine()
+    dw_engine = dw_engine or get_dw_engine()
+    timestamp = datetime.fromisoformat(shard["batch_id"])
+
+    # Cache próprio por faixa: tasks paralelas não sobrescrevem os validadores umas das outras
+    conditional = ConditionalCache(f"{cache_path}.shard{index}") if cache_path else None
+    pages = iter_pages(url, page_limit=shard["page_limit"], workers=min(COINCAP_WORKERS, shard["pages"]),
+                       rate_limit=COINCAP_RATE_LIMIT / shard["shards"], conditional=conditional,
+                       first_page=shard["first_page"], max_pages=shard["max_pages"])
+    if landing:
+        pages = land_pages(pages, timestamp, part=f"shard{index}")
+    batch_ref = load_pages_direct(pages, timestamp, staging_engine, dw_engine, skip_unchanged, incremental,
+                                  publish=False)
+
+    if conditional is not None:
+        conditional.save()
+    logger.info(
+        f"✅ Faixa {index + 1}/{shard['shards']} carregada no DW "
+        f"({batch_ref['changed']} de {batch_ref['rows']} registros alterados)"
+    )
+    return dict(batch_ref, shard=index)
+
+
+def _snapshot_facts(dw_engine, timestamp: datetime):
+    market_table = get_table(DW, "crypto_market_data")
+    crypto_table = get_table(DW, "cryptocurrencies")
+    with dw_engine.connect() as conn:
+        rows = conn.execute(
+            select(market_table.c.id, market_table.c.price_usd, market_table.c.supply,
+                   market_table.c.timestamp, crypto_table.c.symbol)
+            .select_from(market_table.join(crypto_table, crypto_table.c.id == market_table.c.id))
+            .where(market_table.c.timestamp == timestamp)
+        ).mappings().all()
+    crypto_dim = [{"id": row["id"], "symbol": row["symbol"]} for row in rows]
+    facts = [{"id": row["id"], "price_usd": float(row["price_usd"]), "supply": row["supply"],
+              "timestamp": row["timestamp"]} for row in rows]
+    return crypto_dim, facts
+
+
+@metrics.instrumented("finalize_shards")
+def finalize_shards(shard_refs: List[Dict], dw_engine=None, incremental: bool = TRANSFORM_INCREMENTAL) -> int:
+    """
+    Atualiza o resumo do Power BI com os fatos do snapshot gravados pelas faixas.
+    Retorna a quantidade de linhas publicadas (0 se nenhuma faixa tinha alterações).
+    """
+    changed = sum(ref["changed"] for ref in shard_refs)
+    if not changed:
+        logger.info(f"⏭️ Nenhuma das {len(shard_refs)} faixa(s) tinha alterações: resumo mantido")
+        return 0
+    dw_engine = dw_engine or get_dw_engine()
+    timestamp = datetime.fromisoformat(shard_refs[0]["batch_id"])
+
+    try:
+        with metrics.phase("powerbi_refresh"):
+            crypto_dim, facts = _snapshot_facts(dw_engine, timestamp)
+            if incremental and STAGING_SKIP_UNCHANGED:
+                crypto_dim, facts = carried_summary(dw_engine, crypto_dim, facts)
+            summary_rows = build_powerbi_summary(crypto_dim, facts)
+            refresh_powerbi_summary(dw_engine, summary_rows)
+        logger.info(
+            f"✅ Tabela 'crypto_powerbi_summary' atualizada com {len(summary_rows)} ativos "
+            f"({changed} alterados em {len(shard_refs)} faixa(s))"
+        )
+    except Exception as e:
+        logger.error(f"❌ Erro ao atualizar a tabela 'crypto_powerbi_summary': {str(e)}")
+        raise
+    return len(summary_rows)
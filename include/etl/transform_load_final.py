@@ -10,107 +10,354 @@ Operações realizadas:
 2. Transformação para:
    - Tabela dimensão: `cryptocurrencies`
    - Tabela de fatos: `crypto_market_data`
-3. UPSERT na dimensão e INSERT nas tabelas de fatos
-4. Atualização da tabela `crypto_powerbi_summary` via SQL nativo (para uso em dashboards Power BI)
+3. UPSERT na dimensão e INSERT nas tabelas de fatos, mesclando o lote nas agregações
+   OHLCV por hora/dia (`rollups.py`) na mesma transação
+4. Atualização da tabela `crypto_powerbi_summary` (para uso em dashboards Power BI):
+   o ranking é calculado em memória sobre o lote recém-carregado, gravado na tabela
+   sombra `crypto_powerbi_summary_shadow` e trocado com a tabela publicada via
+   `RENAME TABLE` atômico, sem varrer o histórico de `crypto_market_data` e sem
+   expor uma tabela vazia aos dashboards.
+
+Modo incremental (`TRANSFORM_INCREMENTAL`):
+- Lê apenas as linhas de `crypto_raw` com `timestamp` maior que a marca d'água
+  (high-water mark) persistida na tabela `etl_watermark` do DW.
+- Compara um hash de conteúdo (symbol, name, max_supply, explorer) com a dimensão
+  atual e faz UPSERT apenas das moedas novas ou alteradas.
+- A marca d'água é gravada na mesma transação dos fatos: se a execução falhar, nada
+  é confirmado e a reexecução reprocessa as mesmas linhas sem duplicar fatos.
+- Com `STAGING_SKIP_UNCHANGED`, a staging só reescreve os ativos alterados: o lote traz
+  apenas esses ativos e o resumo do Power BI mantém as linhas publicadas dos demais.
+- Uma referência de lote sem alterações (`changed == 0`, vinda da extração via XCom)
+  ou já carregada no DW pelo caminho direto (`dw_loaded`, `direct_load.py`) encerra a
+  transformação sem ler a staging.
+
+Carga paralela (`dw_loader.py`): lotes com pelo menos `DW_LOAD_PARALLEL_MIN_ROWS` fatos
+(lotes grandes, replays e backfills) gravam a dimensão primeiro, os fatos em blocos
+paralelos com repetição idempotente e, por fim, agregações, marca d'água e checkpoint
+em uma transação curta, em vez de uma única transação longa.
+
+Funções principais:
+- transform_and_load_data: Lê a staging e carrega o lote no DW.
+- load_batch_to_dw: Carrega um `AssetBatch` já montado no DW (usado também pelo replay
+  da landing zone, em modo histórico).
 """
-import datetime
-from typing import List, Dict
-from sqlalchemy import MetaData, select, text
-from sqlalchemy.dialects.mysql import insert as mysql_insert
-from include.database.db_connection import get_staging_area_engine, get_dw_engine
+import hashlib
+from datetime import datetime
+from typing import Callable, List, Dict, Optional, Set, Tuple, Union
+import numpy as np
+from sqlalchemy import case, delete, select, text
+from include.database.db_connection import get_staging_area_engine, get_dw_engine, STAGING, DW
+from include.database.schema_cache import get_table
+from include.etl import metrics
+from include.etl.batch import AssetBatch, DIMENSION_COLUMNS, FACT_COLUMNS
+from include.etl.dw_loader import existing_keys, load_facts_parallel, parallel_enabled
+from include.etl.rollups import update_rollups
+from include.etl.bulk_load import bulk_write
+from include.etl.utils import upsert_statement
+from include.config.config import STAGING_CHUNK_SIZE, STAGING_SKIP_UNCHANGED, TRANSFORM_INCREMENTAL
 from include.config.logging_config import setup_logger
 
 logger = setup_logger("transform_load_final", "logs/pipeline.log")
 
-def transform_and_load_data():
+WATERMARK_NAME = "crypto_raw"
+DIMENSION_FIELDS = ("symbol", "name", "max_supply", "explorer")
+
+
+def _normalize(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    # DECIMAL(30, 10) no banco x float em memória: compara com a mesma precisão
+    return f"{float(value):.10f}"
+
+
+def dimension_hash(row: Dict) -> str:
+    payload = "\x1f".join(_normalize(row.get(field)) for field in DIMENSION_FIELDS)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def read_watermark(conn, name: str = WATERMARK_NAME) -> Optional[datetime]:
+    watermark_table = get_table(DW, "etl_watermark")
+    return conn.execute(
+        select(watermark_table.c.value).where(watermark_table.c.name == name)
+    ).scalar()
+
+
+def write_watermark(conn, value: datetime, name: str = WATERMARK_NAME):
+    """
+    Avança a marca d'água para `value`; nunca a move para trás (replays e backfills
+    de lotes antigos não fazem a carga incremental reprocessar linhas já carregadas).
+    """
+    watermark_table = get_table(DW, "etl_watermark")
+    stmt = upsert_statement(conn.dialect, watermark_table, lambda new: [
+        ("value", case((watermark_table.c.value > new.value, watermark_table.c.value), else_=new.value)),
+        ("updated_at", new.updated_at),
+    ])
+    conn.execute(stmt.values(name=name, value=value, updated_at=datetime.utcnow()))
+
+
+def changed_dimensions(conn, crypto_dim: List[Dict], only_missing: bool = False) -> List[Dict]:
+    """
+    Retorna apenas as linhas de `crypto_dim` cujo hash difere do registro atual
+    em `cryptocurrencies` (ou que ainda não existem). Com `only_missing`, apenas as
+    que ainda não existem.
+    """
+    if not crypto_dim:
+        return []
+    crypto_table = get_table(DW, "cryptocurrencies")
+    columns = [crypto_table.c.id] + [crypto_table.c[field] for field in DIMENSION_FIELDS]
+    current = {
+        row["id"]: dimension_hash(row)
+        for row in conn.execute(
+            select(*columns).where(crypto_table.c.id.in_([row["id"] for row in crypto_dim]))
+        ).mappings()
+    }
+    if only_missing:
+        return [row for row in crypto_dim if row["id"] not in current]
+    return [row for row in crypto_dim if current.get(row["id"]) != dimension_hash(row)]
+
+
+def build_powerbi_summary(crypto_dim: List[Dict], market_facts: Union[List[Dict], AssetBatch]) -> List[Dict]:
+    """
+    Monta as linhas do resumo do Power BI a partir do lote carregado.
+    O `rank` segue a semântica de `RANK() OVER (ORDER BY price_usd DESC)`:
+    preços iguais recebem o mesmo rank e o próximo rank pula as posições empatadas.
+    """
+    symbols = {row["id"]: row["symbol"] for row in crypto_dim}
+    if isinstance(market_facts, AssetBatch):
+        ids, prices = market_facts.id, market_facts.price_usd
+        supplies, timestamps = market_facts.column("supply"), market_facts.column("timestamp")
+    else:
+        ids = [fact["id"] for fact in market_facts]
+        prices = np.array([fact["price_usd"] for fact in market_facts], dtype=np.float64)
+        supplies = [fact["supply"] for fact in market_facts]
+        timestamps = [fact["timestamp"] for fact in market_facts]
+    if not len(ids):
+        return []
+
+    # Ordenação estável por preço decrescente; o rank é a posição do primeiro preço de cada empate
+    order = np.argsort(-prices, kind="stable")
+    ordered_prices = prices[order]
+    tie_starts = np.r_[True, ordered_prices[1:] != ordered_prices[:-1]]
+    ranks = np.maximum.accumulate(np.where(tie_starts, np.arange(1, len(order) + 1), 0))
+
+    return [
+        {
+            "id": ids[index],
+            "rank": rank,
+            "symbol": symbols.get(ids[index]),
+            "supply": supplies[index],
+            "price_usd": price,
+            "updated_at": timestamps[index]
+        }
+        for index, rank, price in zip(order.tolist(), ranks.tolist(), ordered_prices.tolist())
+    ]
+
+
+def refresh_powerbi_summary(dw_engine, summary_rows: List[Dict]):
+    """
+    Grava o resumo na tabela sombra e a troca com a tabela publicada em um único
+    `RENAME TABLE` (atômico no MySQL): leitores veem o resumo antigo ou o novo, nunca vazio.
+    Em outros dialetos a troca usa três `ALTER TABLE ... RENAME TO` na mesma transação.
+    """
+    if not summary_rows:
+        return
+    shadow_table = get_table(DW, "crypto_powerbi_summary_shadow")
+    mysql = dw_engine.dialect.name == "mysql"
+
+    with dw_engine.begin() as conn:
+        conn.execute(text("TRUNCATE TABLE crypto_powerbi_summary_shadow") if mysql else delete(shadow_table))
+        conn.execute(shadow_table.insert(), summary_rows)
+
+    with dw_engine.begin() as conn:
+        if mysql:
+            conn.execute(text(
+                "RENAME TABLE crypto_powerbi_summary TO crypto_powerbi_summary_old, "
+                "crypto_powerbi_summary_shadow TO crypto_powerbi_summary, "
+                "crypto_powerbi_summary_old TO crypto_powerbi_summary_shadow"
+            ))
+        else:
+            for old, new in (("crypto_powerbi_summary", "crypto_powerbi_summary_old"),
+                             ("crypto_powerbi_summary_shadow", "crypto_powerbi_summary"),
+                             ("crypto_powerbi_summary_old", "crypto_powerbi_summary_shadow")):
+                conn.execute(text(f"ALTER TABLE {old} RENAME TO {new}"))
+
+
+def carried_summary(dw_engine, crypto_dim: List[Dict],
+                    batch: Union[List[Dict], AssetBatch]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Entradas do resumo quando o lote traz só os ativos alterados: dimensão e fatos do lote
+    mais as linhas publicadas dos ativos ausentes dele (inalterados desde a última carga).
+    """
+    summary_table = get_table(DW, "crypto_powerbi_summary")
+    is_batch = isinstance(batch, AssetBatch)
+    in_batch = set(batch.id if is_batch else (fact["id"] for fact in batch))
+    with dw_engine.connect() as conn:
+        published = [row for row in conn.execute(select(summary_table)).mappings() if row["id"] not in in_batch]
+    if not published:
+        return crypto_dim, batch
+    facts = (batch.records(("id", "price_usd", "supply", "timestamp")) if is_batch else list(batch)) + [
+        {"id": row["id"], "price_usd": float(row["price_usd"]), "supply": row["supply"], "timestamp": row["updated_at"]}
+        for row in published
+    ]
+    return crypto_dim + [{"id": row["id"], "symbol": row["symbol"]} for row in published], facts
+
+
+def existing_facts(conn, batch: AssetBatch) -> Set[Tuple[str, datetime]]:
+    """
+    Pares (id, timestamp) do lote que já existem em `crypto_market_data`.
+    """
+    return existing_keys(conn, batch.id, batch.column("timestamp"))
+
+
+def _skip_existing(conn, batch: AssetBatch) -> AssetBatch:
+    if not len(batch):
+        return batch
+    existing = existing_facts(conn, batch)
+    if not existing:
+        return batch
+    keep = [key not in existing for key in zip(batch.id, batch.column("timestamp"))]
+    logger.info(f"🔁 {len(batch) - sum(keep)} fatos já existentes ignorados")
+    return batch.select(keep)
+
+
+def _load_dimension(conn, crypto_dim: List[Dict], incremental: bool, historical: bool):
+    # Para cryptocurrencies (UPSERT - substitui o on_conflict_do_update)
+    crypto_table = get_table(DW, "cryptocurrencies")
+    if historical:
+        dim_rows = changed_dimensions(conn, crypto_dim, only_missing=True)
+    else:
+        dim_rows = changed_dimensions(conn, crypto_dim) if incremental else crypto_dim
+    if dim_rows:
+        stmt = upsert_statement(conn.dialect, crypto_table, lambda new: [
+            (field, new[field]) for field in DIMENSION_FIELDS
+        ])
+        conn.execute(stmt, dim_rows)
+    logger.info(
+        f"✅ Dimensão 'cryptocurrencies' carregada/atualizada ({len(dim_rows)} de "
+        f"{len(crypto_dim)} registros alterados)"
+    )
+
+
+def _finish_load(conn, batch: AssetBatch, incremental: bool, checkpoint: Optional[Callable]):
+    # Agregações OHLCV: só os baldes tocados pelo lote, na mesma transação da marca d'água
+    touched = update_rollups(conn, batch)
+    logger.info(f"✅ Agregações OHLCV atualizadas ({touched} baldes)")
+
+    if incremental and len(batch):
+        new_watermark = max(batch.column("timestamp"))
+        write_watermark(conn, new_watermark)
+        logger.info(f"🔖 Marca d'água avançada para {new_watermark} (se maior que a atual)")
+
+    if checkpoint is not None:
+        checkpoint(conn)
+
+
+def load_batch_to_dw(batch: AssetBatch, incremental: bool = TRANSFORM_INCREMENTAL, historical: bool = False,
+                     dw_engine=None, checkpoint: Optional[Callable] = None, publish: bool = True) -> int:
+    """
+    Carrega um lote na dimensão, nos fatos e nas agregações OHLCV (uma única transação)
+    e, em seguida, atualiza o resumo do Power BI. Retorna a quantidade de fatos inseridos.
+
+    Com `historical` (replay da landing zone, backfill), o lote é tratado como passado:
+    fatos já existentes são ignorados, a dimensão só recebe moedas novas e o resumo
+    publicado não é substituído. `checkpoint(conn)`, se informado, roda na mesma
+    transação dos fatos (ex.: registrar o progresso do backfill).
+
+    Com `publish=False` (shards da DAG particionada), fatos já existentes também são
+    ignorados, para que uma nova tentativa não duplique fatos nem agregações, e o resumo
+    fica para a task final (`shards.finalize_shards`).
+    """
+    dw_engine = dw_engine or get_dw_engine()
+    crypto_dim = batch.records(DIMENSION_COLUMNS)
+    skip_existing = historical or not publish
+
+    # 3. Carregar no MySQL (UPSERT para dimensão, INSERT para fatos)
+    if parallel_enabled(dw_engine, len(batch)):
+        # Dimensão confirmada antes dos fatos; fatos em blocos paralelos; agregações,
+        # marca d'água e checkpoint em uma transação final (ver dw_loader.py)
+        with metrics.phase("dw_load"):
+            with dw_engine.begin() as mysql_conn:
+                if skip_existing:
+                    batch = _skip_existing(mysql_conn, batch)
+                _load_dimension(mysql_conn, crypto_dim, incremental, historical)
+            load_facts_parallel(dw_engine, batch)
+            with dw_engine.begin() as mysql_conn:
+                _finish_load(mysql_conn, batch, incremental, checkpoint)
+    else:
+        with metrics.phase("dw_load"), dw_engine.begin() as mysql_conn:
+            if skip_existing:
+                batch = _skip_existing(mysql_conn, batch)
+            _load_dimension(mysql_conn, crypto_dim, incremental, historical)
+
+            # Para crypto_market_data (INSERT - permanece igual)
+            market_table = get_table(DW, "crypto_market_data")
+            bulk_write(mysql_conn, market_table, FACT_COLUMNS, batch.rows(FACT_COLUMNS), STAGING_CHUNK_SIZE)
+            logger.info(f"✅ Tabela de fatos 'crypto_market_data' carregada ({len(batch)} registros)")
+
+            _finish_load(mysql_conn, batch, incremental, checkpoint)
+
+    if historical or not publish:
+        return len(batch)
+
+    # 4. Atualiza a tabela do Power BI a partir do lote em memória (troca atômica)
+    try:
+        with metrics.phase("powerbi_refresh"):
+            summary_dim, summary_facts = crypto_dim, batch
+            if incremental and STAGING_SKIP_UNCHANGED:
+                summary_dim, summary_facts = carried_summary(dw_engine, crypto_dim, batch)
+            refresh_powerbi_summary(dw_engine, build_powerbi_summary(summary_dim, summary_facts))
+        logger.info("✅ Tabela 'crypto_powerbi_summary' atualizada com sucesso")
+    except Exception as e:
+        logger.error(f"❌ Erro ao atualizar a tabela 'crypto_powerbi_summary': {str(e)}")
+        raise
+    return len(batch)
+
+
+@metrics.instrumented("transform")
+def transform_and_load_data(incremental: bool = TRANSFORM_INCREMENTAL, batch_ref: Optional[Dict] = None):
+    """
+    `batch_ref` é a referência retornada pela extração (XCom); um lote sem ativos
+    alterados ou já carregado no DW não é transformado.
+    """
+    if batch_ref is not None and batch_ref.get("changed") == 0:
+        logger.info(f"⏭️ Lote {batch_ref.get('batch_id')} sem alterações: transformação ignorada")
+        return
+    if batch_ref is not None and batch_ref.get("dw_loaded"):
+        logger.info(f"⏭️ Lote {batch_ref.get('batch_id')} já carregado no DW pelo caminho direto")
+        return
     logger.info("🔧 Transformando e carregando dados para a camada final...")
     staging_area_engine = get_staging_area_engine()
     dw_engine = get_dw_engine()
 
     try:
+        watermark = None
+        if incremental:
+            with dw_engine.connect() as dw_conn:
+                watermark = read_watermark(dw_conn)
+            logger.info(f"🔖 Modo incremental: marca d'água atual = {watermark}")
+
         # 1. Obter dados do MySQL (staging)
-        with staging_area_engine.connect() as mysql_conn:
-            metadata = MetaData()
-            metadata.reflect(bind=mysql_conn)
-            raw_table = metadata.tables["crypto_raw"]
-            result = mysql_conn.execute(select(raw_table)).mappings().all()
+        with metrics.phase("read_staging"), staging_area_engine.connect() as mysql_conn:
+            raw_table = get_table(STAGING, "crypto_raw")
+            query = select(raw_table)
+            if watermark is not None:
+                query = query.where(raw_table.c.timestamp > watermark)
+            result = mysql_conn.execute(query).mappings().all()
 
         if not result:
             logger.warning("⚠️ Nenhum dado encontrado no staging para transformar e carregar")
             return
 
-        # 2. Transformar dados
-        crypto_dim = []
-        market_facts = []
-
-        for row in result:
-            crypto_dim.append({
-                "id": row["id"],
-                "symbol": row["symbol"],
-                "name": row["name"],
-                "max_supply": float(row["max_supply"]) if row["max_supply"] else None,
-                "explorer": row["explorer"].split(",")[0] if row["explorer"] else None
-            })
-
-            market_facts.append({
-                "id": row["id"],
-                "price_usd": float(row["price_usd"]),
-                "market_cap_usd": float(row["market_cap_usd"]),
-                "volume_usd_24hr": float(row["volume_usd_24hr"]),
-                "change_percent_24hr": float(row["change_percent_24hr"]),
-                "vwap_24hr": float(row["vwap_24hr"]) if row["vwap_24hr"] else 0.0,
-                "supply": float(row["supply"]),
-                "timestamp": datetime.utcnow()
-            })
-
-        # 3. Carregar no MySQL (UPSERT para dimensão, INSERT para fatos)
-        with dw_engine.begin() as mysql_conn:
-            metadata = MetaData()
-            metadata.reflect(bind=mysql_conn)
-
-            # Para cryptocurrencies (UPSERT - substitui o on_conflict_do_update)
-            crypto_table = metadata.tables["cryptocurrencies"]
-            if crypto_dim:
-                # Versão MySQL do UPSERT
-                stmt = mysql_insert(crypto_table).values(crypto_dim)
-                stmt = stmt.on_duplicate_key_update(
-                    symbol=stmt.inserted.symbol,
-                    name=stmt.inserted.name,
-                    max_supply=stmt.inserted.max_supply,
-                    explorer=stmt.inserted.explorer
-                )
-                mysql_conn.execute(stmt)
-                logger.info(f"✅ Dimensão 'cryptocurrencies' carregada/atualizada ({len(crypto_dim)} registros)")
-
-            # Para crypto_market_data (INSERT - permanece igual)
-            market_table = metadata.tables["crypto_market_data"]
-            if market_facts:
-                mysql_conn.execute(market_table.insert(), market_facts)
-                logger.info(f"✅ Tabela de fatos 'crypto_market_data' carregada ({len(market_facts)} registros)")
-
-            # Atualiza a tabela do Power BI com SQL puro
-            try:
-                mysql_conn.execute(text("TRUNCATE TABLE crypto_powerbi_summary"))
-                mysql_conn.execute(text("""
-                    INSERT INTO crypto_powerbi_summary (id, `rank`, symbol, supply, price_usd, updated_at)
-                    SELECT
-                        cmd.id,
-                        RANK() OVER (ORDER BY cmd.price_usd DESC) AS `rank`,
-                        c.symbol,
-                        cmd.supply,
-                        cmd.price_usd,
-                        cmd.timestamp AS updated_at
-                    FROM crypto_market_data cmd
-                    JOIN cryptocurrencies c ON cmd.id = c.id
-                    WHERE cmd.timestamp = (
-                        SELECT MAX(timestamp) FROM crypto_market_data
-                    )
-                """))
-                logger.info("✅ Tabela 'crypto_powerbi_summary' atualizada com sucesso")
-            except Exception as e:
-                logger.error(f"❌ Erro ao atualizar a tabela 'crypto_powerbi_summary': {str(e)}")
-                raise
+        # 2. Transformar dados (lote colunar: conversão vetorizada, sem loop por linha)
+        # No modo incremental o fato herda o timestamp da staging (reprocessamento idempotente);
+        # no modo completo todo o lote recebe um único timestamp
+        batch = AssetBatch.from_staging_rows(result, row_timestamps=incremental)
 
+        # 3 e 4. Carregar no DW e atualizar o resumo do Power BI
+        load_batch_to_dw(batch, incremental=incremental, dw_engine=dw_engine)
+        metrics.add_rows(len(batch))
         logger.info("✅ Transformação e carga final concluídas com sucesso")
 
     except Exception as e:
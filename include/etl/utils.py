@@ -0,0 +1,106 @@
+"""
+utils.py
+
+Funções utilitárias compartilhadas pelas etapas da ETL.
+
+Funções:
+- chunked: Divide uma lista em fatias de tamanho fixo (para INSERTs multi-linha em lote).
+- positional_statement: Compila um comando do SQLAlchemy com parâmetros posicionais.
+- execute_rows: Executa um INSERT/UPSERT do SQLAlchemy com tuplas posicionais via
+  `executemany` do driver, sem montar um dicionário por linha.
+- upsert_statement: Monta o UPSERT (INSERT com atualização em conflito de chave) do dialeto.
+"""
+
+import re
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+from sqlalchemy import Table
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+T = TypeVar("T")
+
+_NAMED_PARAM = re.compile(r"%\((\w+)\)s")
+
+
+def chunked(rows: List[T], size: int) -> Iterator[List[T]]:
+    size = max(size, 1)
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def positional_statement(dialect, stmt, columns: Sequence[str]) -> Tuple[str, Optional[List[int]]]:
+    """
+    Compila `stmt` para `dialect` com parâmetros posicionais. Retorna o SQL e, quando a
+    ordem dos parâmetros difere de `columns`, os índices para reordenar cada tupla.
+    """
+    compiled = stmt.compile(dialect=dialect, column_keys=list(columns))
+    sql = compiled.string
+    if compiled.positional:
+        order = list(compiled.positiontup)
+    else:
+        # paramstyle pyformat (PyMySQL): %(nome)s -> %s, aceito pelo driver com tuplas
+        order = _NAMED_PARAM.findall(sql)
+        sql = _NAMED_PARAM.sub("%s", sql)
+    if order == list(columns):
+        return sql, None
+    return sql, [list(columns).index(name) for name in order]
+
+
+def _bind_processors(dialect, stmt, columns: Sequence[str]) -> Optional[List[Optional[Callable]]]:
+    """
+    Conversões de tipo que o dialeto aplicaria a cada coluna (o `exec_driver_sql` não as
+    aplica). No SQLite, DATETIME vira texto com microssegundos, o mesmo formato usado nas
+    comparações do SQLAlchemy; MySQL e PostgreSQL não têm conversões e retornam None.
+    """
+    table = getattr(stmt, "table", None)
+    if table is None:
+        return None
+    processors = [table.c[name].type.dialect_impl(dialect).bind_processor(dialect) for name in columns]
+    return processors if any(processors) else None
+
+
+def execute_rows(conn, stmt, columns: Sequence[str], rows: List[Tuple], chunk_size: int) -> int:
+    """
+    Compila `stmt` uma única vez para o dialeto da conexão e envia `rows` (tuplas na
+    ordem de `columns`) em fatias de `chunk_size` com `executemany`. Drivers MySQL
+    reescrevem o `executemany` de um INSERT em um único INSERT multi-linha por fatia.
+    Retorna a quantidade de comandos executados.
+    """
+    sql, positions = positional_statement(conn.dialect, stmt, columns)
+    processors = _bind_processors(conn.dialect, stmt, columns)
+    if positions is not None or processors is not None:
+        order = positions if positions is not None else range(len(columns))
+        process = processors or [None] * len(columns)
+        rows = [tuple(row[i] if process[i] is None else process[i](row[i]) for i in order) for row in rows]
+
+    statements = 0
+    for chunk in chunked(rows, chunk_size):
+        conn.exec_driver_sql(sql, chunk)
+        statements += 1
+    return statements
+
+
+def upsert_statement(dialect, table: Table, assignments: Callable[[Any], List[Tuple[str, Any]]],
+                     source: Optional[Tuple[Sequence[str], Any]] = None):
+    """
+    INSERT que atualiza a linha existente em caso de conflito na chave primária:
+    `ON DUPLICATE KEY UPDATE` no MySQL e `ON CONFLICT (...) DO UPDATE` no SQLite e no
+    PostgreSQL. `assignments(new)` recebe as colunas da linha proposta (`inserted` /
+    `excluded`) e devolve pares (coluna, expressão); colunas de `table` referem-se à
+    linha existente. A ordem dos pares é a ordem de avaliação do MySQL. Com
+    `source=(colunas, select)`, as linhas vêm de um `INSERT ... SELECT`.
+    """
+    if dialect.name == "mysql":
+        stmt = mysql_insert(table)
+        if source is not None:
+            stmt = stmt.from_select(*source)
+        return stmt.on_duplicate_key_update(assignments(stmt.inserted))
+    if dialect.name in ("sqlite", "postgresql"):
+        stmt = (sqlite_insert if dialect.name == "sqlite" else postgresql_insert)(table)
+        if source is not None:
+            stmt = stmt.from_select(*source)
+        return stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns), set_=dict(assignments(stmt.excluded))
+        )
+    raise NotImplementedError(f"UPSERT não suportado para o dialeto {dialect.name}")
@@ -0,0 +1,40 @@
+"""
+conftest.py
+
+Configuração comum dos testes: os logs do pipeline (`LOG_DIR`) e as métricas das
+execuções (`METRICS_DIR`) são gravados em diretórios temporários, não em `logs/` e
+`data/metrics/`. As fixtures `staging_engine` e `dw_engine` criam os bancos com o esquema
+completo em SQLite de arquivo (uma conexão por thread, como nos bancos reais).
+"""
+
+import os
+import tempfile
+
+# Antes de qualquer importação de `include.config` pelos módulos de teste
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="crypto-pipeline-logs-"))
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="crypto-pipeline-metrics-"))
+
+import pytest  # noqa: E402
+from sqlalchemy import MetaData, create_engine  # noqa: E402
+
+from include.database.create_tables import create_all, define_dw_tables, define_staging_tables  # noqa: E402
+
+
+def _sqlite_engine(path, define):
+    engine = create_engine(f"sqlite:///{path}")
+    create_all(define(MetaData()), engine)
+    return engine
+
+
+@pytest.fixture
+def staging_engine(tmp_path):
+    engine = _sqlite_engine(tmp_path / "staging.db", define_staging_tables)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def dw_engine(tmp_path):
+    engine = _sqlite_engine(tmp_path / "dw.db", define_dw_tables)
+    yield engine
+    engine.dispose()
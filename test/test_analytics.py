@@ -0,0 +1,102 @@
+"""
+test_analytics.py
+
+Testes dos indicadores incrementais (`analytics.py`): execuções sucessivas sobre fatos
+novos produzem os mesmos valores que o cálculo direto sobre a série completa, fatos já
+aplicados não alteram o estado e fatos confirmados depois de outros mais novos não se perdem. Usa SQLite em arquivo no lugar do DW.
+
+Execução:
+    PYTHONPATH=. pytest test/test_analytics.py
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from include.database.db_connection import DW
+from include.database.schema_cache import get_table
+from include.etl.analytics import update_analytics
+from include.etl.bulk_load import bulk_write
+
+WINDOWS = dict(ema_short=3, ema_long=6, sma_window=4, volatility_window=5)
+START = datetime(2025, 5, 1, 22)
+ASSETS = ("bitcoin", "ethereum", "solana")
+
+
+def _prices(samples: int) -> np.ndarray:
+    rng = np.random.default_rng(7)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size=(samples, len(ASSETS))), axis=0))
+
+
+def _insert_facts(engine, prices: np.ndarray, first: int, last: int):
+    rows = [(asset, float(prices[i, a]), START + timedelta(minutes=5 * i))
+            for i in range(first, last) for a, asset in enumerate(ASSETS)]
+    with engine.begin() as conn:
+        bulk_write(conn, get_table(DW, "crypto_market_data"), ("id", "price_usd", "timestamp"), rows, 1000)
+
+
+def _expected(series: np.ndarray, spans=(3, 6), sma=4, volatility=5):
+    emas = []
+    for span in spans:
+        alpha, value = 2 / (span + 1), series[0]
+        for price in series[1:]:
+            value += alpha * (price - value)
+        emas.append(value)
+    returns = np.diff(np.log(series))[-volatility:]
+    deviation = returns.std(ddof=1) if len(returns) >= 2 else None
+    return (*emas, series[-sma:].mean(), deviation, series.max(), series.min())
+
+
+def test_incremental_runs_match_full_recomputation(dw_engine):
+    prices = _prices(40)
+
+    # Dois passos na primeira execução, depois um por execução e, por fim, trinta de uma vez
+    assert update_analytics(dw_engine, **WINDOWS) == 0
+    _insert_facts(dw_engine, prices, 0, 2)
+    assert update_analytics(dw_engine, **WINDOWS) == 2 * len(ASSETS)
+    for sample in range(2, 10):
+        _insert_facts(dw_engine, prices, sample, sample + 1)
+        assert update_analytics(dw_engine, **WINDOWS) == len(ASSETS)
+    _insert_facts(dw_engine, prices, 10, 40)
+    assert update_analytics(dw_engine, **WINDOWS) == 30 * len(ASSETS)
+    assert update_analytics(dw_engine, **WINDOWS) == 0
+
+    analytics = get_table(DW, "crypto_analytics")
+    with dw_engine.connect() as conn:
+        rows = conn.execute(select(analytics).order_by(analytics.c.timestamp)).all()
+    assert len(rows) == 40 * len(ASSETS)
+
+    for sample in (0, 1, 9, 39):
+        for a, asset in enumerate(ASSETS):
+            row = next(r for r in rows if r.id == asset and r.timestamp == START + timedelta(minutes=5 * sample))
+            expected = _expected(prices[:sample + 1, a])
+            actual = (row.ema_short, row.ema_long, row.sma, row.volatility, row.high_24h, row.low_24h)
+            assert [None if value is None else pytest.approx(float(value), abs=1e-8) for value in actual] == \
+                [None if value is None else float(value) for value in expected]
+
+
+def test_late_committed_facts_are_applied(dw_engine):
+    prices = _prices(3)
+    _insert_facts(dw_engine, prices, 0, 1)
+    assert update_analytics(dw_engine, **WINDOWS) == len(ASSETS)
+
+    # O daemon confirma um preço mais novo do bitcoin antes do lote da DAG (amostra 1)
+    market = get_table(DW, "crypto_market_data")
+    daemon_time = START + timedelta(minutes=7)
+    with dw_engine.begin() as conn:
+        conn.execute(market.insert(), [{"id": "bitcoin", "price_usd": 101.0, "timestamp": daemon_time}])
+    assert update_analytics(dw_engine, **WINDOWS) == 1
+
+    # O lote da DAG, com timestamp anterior, é confirmado depois: o bitcoin já passou dessa amostra
+    _insert_facts(dw_engine, prices, 1, 2)
+    assert update_analytics(dw_engine, **WINDOWS) == len(ASSETS) - 1
+    assert update_analytics(dw_engine, **WINDOWS) == 0
+
+    analytics = get_table(DW, "crypto_analytics")
+    with dw_engine.connect() as conn:
+        applied = {(row.id, row.timestamp) for row in conn.execute(select(analytics.c.id, analytics.c.timestamp))}
+    late = START + timedelta(minutes=5)
+    assert {("ethereum", late), ("solana", late), ("bitcoin", daemon_time)} <= applied
+    assert ("bitcoin", late) not in applied
@@ -0,0 +1,152 @@
+"""
+test_backfill.py
+
+Testes do backfill histórico contra um servidor HTTP local que gera histórico sintético
+(`/v3/assets/{id}/history`) e metadados (`/v3/assets?ids=`), com o checkpoint gravado
+em um SQLite em memória.
+
+Execução:
+    PYTHONPATH=. pytest test/test_backfill.py
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from include.database.db_connection import DW
+from include.database.schema_cache import get_table
+from include.etl.backfill import EPOCH, completed_units, plan_units, run_backfill
+
+START = datetime(2025, 5, 1)
+END = datetime(2025, 5, 2)
+STEP = timedelta(minutes=30)
+
+
+class StubHistory:
+    def __init__(self, fail_asset=None):
+        self.fail_asset = fail_asset
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                parts = parsed.path.strip("/").split("/")
+                if parts[-1] != "history":
+                    ids = query["ids"][0].split(",")
+                    self._send(200, {"data": [{"id": i, "symbol": i[:3].upper(), "name": i.title()} for i in ids]})
+                    return
+
+                asset_id, start, end = parts[-2], int(query["start"][0]), int(query["end"][0])
+                with stub._lock:
+                    stub.requests.append((asset_id, EPOCH + timedelta(milliseconds=start)))
+                if asset_id == stub.fail_asset:
+                    self._send(404, {"error": "not found"})
+                    return
+                # Um ponto a cada 30 minutos, incluindo o limite `end` (descartado pelo backfill)
+                points = []
+                time = start
+                while time <= end:
+                    points.append({"priceUsd": "2.0", "circulatingSupply": "10", "time": time})
+                    time += int(STEP.total_seconds() * 1000)
+                self._send(200, {"data": points})
+
+        return Handler
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(stub):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/v3/assets"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    get_table(DW, "etl_backfill_progress").create(engine)
+    return engine
+
+
+class RecordingLoad:
+    def __init__(self, engine):
+        self.engine = engine
+        self.facts = []
+
+    def __call__(self, batch, checkpoint):
+        with self.engine.begin() as conn:
+            self.facts.extend(zip(batch.id, batch.column("timestamp"), batch.market_cap_usd.tolist()))
+            checkpoint(conn)
+
+
+def test_plan_units_split_the_range_per_asset():
+    units = plan_units(["btc", "eth"], START, START + timedelta(hours=10), timedelta(hours=4))
+
+    assert [(u.asset_id, u.start.hour, u.end.hour) for u in units] == [
+        ("btc", 0, 4), ("btc", 4, 8), ("btc", 8, 10), ("eth", 0, 4), ("eth", 4, 8), ("eth", 8, 10)
+    ]
+
+
+def test_interrupted_backfill_resumes_pending_units(stub_server, engine):
+    assets = ["bitcoin", "ethereum", "solana"]
+    window = timedelta(hours=6)
+    load = RecordingLoad(engine)
+
+    failing = StubHistory(fail_asset="solana")
+    with pytest.raises(Exception):
+        run_backfill(START, END, assets, job="test", window=window, workers=2, rate_limit=0,
+                     url=stub_server(failing), load_rows=12, engine=engine, load=load)
+
+    with engine.connect() as conn:
+        done = completed_units(conn, "test")
+    assert done and all(asset_id != "solana" for asset_id, _ in done)
+
+    healthy = StubHistory()
+    run_backfill(START, END, assets, job="test", window=window, workers=2, rate_limit=0,
+                 url=stub_server(healthy), load_rows=12, engine=engine, load=load)
+
+    all_units = {(u.asset_id, u.start) for u in plan_units(assets, START, END, window)}
+    assert set(healthy.requests) == all_units - done
+    assert len(healthy.requests) == len(all_units - done)
+
+    # Cada ativo tem exatamente um fato a cada 30 minutos, sem duplicatas entre as execuções
+    keys = [(asset_id, timestamp) for asset_id, timestamp, _ in load.facts]
+    assert len(keys) == len(set(keys)) == len(assets) * 48
+    assert all(market_cap == 20.0 for _, _, market_cap in load.facts)
+    with engine.connect() as conn:
+        assert completed_units(conn, "test") == all_units
+
+    # Uma nova execução do job não busca mais nada
+    again = StubHistory()
+    assert run_backfill(START, END, assets, job="test", window=window, workers=2, rate_limit=0,
+                        url=stub_server(again), engine=engine, load=load) == 0
+    assert again.requests == []
@@ -0,0 +1,91 @@
+"""
+test_batch.py
+
+Testes do lote colunar `AssetBatch` (nulos, link do explorer, timestamps por lote/linha)
+e do envio posicional com `execute_rows`.
+
+Execução:
+    PYTHONPATH=. pytest test/test_batch.py
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import Column, Float, MetaData, String, Table, create_engine, select
+
+from include.etl.batch import AssetBatch, BatchHasher, DIMENSION_COLUMNS, FACT_COLUMNS, STAGING_COLUMNS
+from include.etl.utils import execute_rows
+
+TIMESTAMP = datetime(2025, 5, 3, 16, 0)
+
+
+def make_asset(asset_id, max_supply="21000000.0000000000", vwap="100.5", explorer="https://a,https://b"):
+    return {
+        "id": asset_id, "symbol": asset_id.upper(), "name": asset_id.title(), "maxSupply": max_supply,
+        "explorer": explorer, "priceUsd": "101.25", "marketCapUsd": "1000.0", "volumeUsd24Hr": "50.0",
+        "changePercent24Hr": "-1.5", "vwap24Hr": vwap, "supply": "10.0",
+    }
+
+
+def test_from_records_converts_nulls_and_splits_explorer():
+    batch = AssetBatch.from_records(
+        [make_asset("btc"), make_asset("eth", max_supply=None, vwap=None, explorer=None), make_asset("sol", vwap="")],
+        TIMESTAMP,
+    )
+
+    staging = {row["id"]: row for row in batch.records(STAGING_COLUMNS)}
+    assert staging["btc"]["max_supply"] == 21000000.0
+    assert staging["btc"]["explorer"] == "https://a,https://b"
+    assert staging["eth"]["max_supply"] is None and staging["eth"]["vwap_24hr"] is None
+    assert staging["sol"]["vwap_24hr"] is None
+    assert {row["timestamp"] for row in staging.values()} == {TIMESTAMP}
+
+    dimension = {row["id"]: row for row in batch.records(DIMENSION_COLUMNS)}
+    assert dimension["btc"]["explorer"] == "https://a"
+    assert dimension["eth"]["explorer"] is None
+
+    facts = {row["id"]: row for row in batch.records(FACT_COLUMNS)}
+    assert facts["eth"]["vwap_24hr"] == 0.0
+    assert facts["btc"]["price_usd"] == 101.25
+
+
+def test_from_staging_rows_keeps_row_timestamps_only_when_asked():
+    rows = [
+        {**{column: None for column in STAGING_COLUMNS}, "id": "btc", "price_usd": Decimal("1.5"),
+         "market_cap_usd": Decimal("2"), "volume_usd_24hr": Decimal("3"), "change_percent_24hr": Decimal("0"),
+         "supply": Decimal("4"), "timestamp": datetime(2025, 5, 3, 15, 55)},
+    ]
+
+    assert AssetBatch.from_staging_rows(rows).rows(("id", "timestamp")) == [("btc", datetime(2025, 5, 3, 15, 55))]
+    single = AssetBatch.from_staging_rows(rows, TIMESTAMP, row_timestamps=False)
+    assert single.records(FACT_COLUMNS)[0]["timestamp"] == TIMESTAMP
+    assert single.records(FACT_COLUMNS)[0]["price_usd"] == 1.5
+
+
+def test_content_hash_ignores_timestamp_and_tracks_values():
+    first = AssetBatch.from_records([make_asset("btc"), make_asset("eth")], TIMESTAMP)
+    later = AssetBatch.from_records([make_asset("btc"), {**make_asset("eth"), "priceUsd": "102"}], datetime.utcnow())
+
+    first_hashes, later_hashes = first.column("content_hash"), later.column("content_hash")
+    assert first_hashes[0] == later_hashes[0] and first_hashes[1] != later_hashes[1]
+    assert first.records(STAGING_COLUMNS)[0]["content_hash"] == first_hashes[0]
+
+    hashes = []
+    for batch in (first, first, later):
+        hasher = BatchHasher()
+        hasher.update(zip(batch.id, batch.column("content_hash")))
+        hashes.append(hasher.hexdigest())
+    assert hashes[0] == hashes[1] != hashes[2]
+
+
+def test_execute_rows_sends_positional_tuples_in_chunks():
+    engine = create_engine("sqlite://")
+    table = Table("prices", MetaData(), Column("id", String, primary_key=True), Column("price", Float))
+    table.create(engine)
+
+    with engine.begin() as conn:
+        statements = execute_rows(conn, table.insert(), ("price", "id"), [(1.0, "a"), (2.0, "b"), (3.0, "c")], 2)
+
+    assert statements == 2
+    with engine.connect() as conn:
+        assert conn.execute(select(table).order_by(table.c.id)).all() == [("a", 1.0), ("b", 2.0), ("c", 3.0)]
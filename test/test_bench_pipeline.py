@@ -0,0 +1,36 @@
+"""
+test_bench_pipeline.py
+
+Testes do benchmark ponta a ponta: execução completa com 100 ativos (servidor HTTP
+local + SQLite no lugar do MySQL) e detecção de regressões contra uma referência.
+
+Execução:
+    PYTHONPATH=. pytest test/test_bench_pipeline.py
+"""
+
+from benchmarks.bench_pipeline import compare, run_benchmark
+
+
+def test_benchmark_runs_all_stages_against_local_stand_ins():
+    report = run_benchmark([100])
+
+    results = {result["stage"]: result for result in report["results"]}
+    assert list(results) == ["extract", "load_staging", "transform"]
+    assert all(result["rows"] == 100 and result["rows_per_s"] > 0 for result in results.values())
+    assert results["extract"]["http_requests"] >= 1
+    # Leitura dos hashes de conteúdo + um INSERT multi-linha
+    assert results["load_staging"]["db_round_trips"] == 2
+    assert results["transform"]["db_round_trips"] > 0
+    assert compare(report, report) == []
+
+
+def test_compare_flags_throughput_memory_and_round_trip_regressions():
+    base = {"assets": 100, "stage": "load_staging", "rows_per_s": 1000.0, "peak_rss_mib": 100.0,
+            "db_round_trips": 1, "http_requests": 0}
+    slower = dict(base, rows_per_s=700.0, peak_rss_mib=130.0, db_round_trips=2)
+    within = dict(base, rows_per_s=900.0, peak_rss_mib=110.0)
+
+    regressions = compare({"results": [slower]}, {"results": [base]}, tolerance=0.2)
+
+    assert len(regressions) == 3
+    assert compare({"results": [within]}, {"results": [base]}, tolerance=0.2) == []
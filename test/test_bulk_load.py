@@ -0,0 +1,64 @@
+"""
+test_bulk_load.py
+
+Testes da carga em massa por dialeto: escolha do método (`BULK_LOAD_METHOD`), formato
+texto do `COPY`, comando `INSERT ... SELECT ... ON CONFLICT` do PostgreSQL (apenas
+compilado) e o benchmark de vazão com SQLite.
+
+Execução:
+    PYTHONPATH=. pytest test/test_bulk_load.py
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import MetaData, column, select, table
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from benchmarks.bench_bulk_load import run_benchmark
+from include.database.create_tables import define_staging_tables
+from include.etl.bulk_load import copy_text, resolve_method
+from include.etl.utils import upsert_statement
+
+
+def test_method_is_chosen_per_dialect():
+    assert resolve_method(postgresql.dialect(), "auto") == "copy"
+    assert resolve_method(mysql.dialect(), "auto") == "executemany"
+    assert resolve_method(sqlite.dialect(), "auto") == "executemany"
+    assert resolve_method(postgresql.dialect(), "executemany") == "executemany"
+    with pytest.raises(NotImplementedError):
+        resolve_method(mysql.dialect(), "copy")
+    with pytest.raises(ValueError):
+        resolve_method(sqlite.dialect(), "bcp")
+
+
+def test_copy_text_escapes_separators_and_nulls():
+    rows = [("bitcoin", 1.5, None, datetime(2025, 1, 1, 12, 0, 0, 500)),
+            ("a\tb\\c\nd", float("nan"), "", b"\x01\xff")]
+
+    assert copy_text(rows).read() == (
+        "bitcoin\t1.5\t\\N\t2025-01-01 12:00:00.000500\n"
+        "a\\tb\\\\c\\nd\tNaN\t\t\\\\x01ff\n"
+    )
+
+
+def test_postgresql_upsert_reads_from_copied_temp_table():
+    raw_table = define_staging_tables(MetaData()).tables["crypto_raw"]
+    temp = table("_bulk_crypto_raw", column("id"), column("price_usd"))
+    stmt = upsert_statement(postgresql.dialect(), raw_table,
+                            lambda new: [("price_usd", new.price_usd)],
+                            source=(["id", "price_usd"], select(temp)))
+
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+
+    assert "INSERT INTO crypto_raw (id, price_usd) SELECT" in sql
+    assert "FROM _bulk_crypto_raw ON CONFLICT (id) DO UPDATE SET price_usd = excluded.price_usd" in sql
+
+
+def test_benchmark_compares_insert_and_upsert_throughput():
+    report = run_benchmark([300])
+
+    results = {result["operation"]: result for result in report["results"]}
+    assert set(results) == {"insert", "upsert"}
+    assert all(r["backend"] == "sqlite" and r["method"] == "executemany" for r in results.values())
+    assert all(r["rows"] == 300 and r["rows_per_s"] > 0 and r["db_round_trips"] == 1 for r in results.values())
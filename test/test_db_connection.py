@@ -0,0 +1,44 @@
+"""
+test_db_connection.py
+
+Testes do registro de engines (`db_connection.py`): uma engine por destino reutilizada
+entre chamadas, contadores de acertos/falhas e liberação do registro por
+`dispose_engines`. Usa `STAGING_DATABASE_URL=sqlite://` no lugar do MySQL.
+
+Execução:
+    PYTHONPATH=. pytest test/test_db_connection.py
+"""
+
+import pytest
+from sqlalchemy import text
+
+from include.database import db_connection
+
+
+@pytest.fixture
+def sqlite_staging(monkeypatch):
+    monkeypatch.setattr(db_connection, "STAGING_DATABASE_URL", "sqlite://")
+    db_connection.dispose_engines()
+    yield
+    db_connection.dispose_engines()
+
+
+def test_engine_is_reused_per_target_until_disposed(sqlite_staging):
+    before = db_connection.get_pool_stats()
+
+    engine = db_connection.get_staging_area_engine()
+    assert db_connection.get_staging_area_engine() is engine
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+
+    stats = db_connection.get_pool_stats()
+    assert stats["misses"] - before["misses"] == 1
+    assert stats["hits"] - before["hits"] == 1
+    assert set(stats["pools"]) == {db_connection.STAGING}
+
+    db_connection.dispose_engines()
+    assert db_connection.get_pool_stats()["pools"] == {}
+
+    # Depois da liberação, a próxima chamada cria uma engine nova
+    assert db_connection.get_staging_area_engine() is not engine
+    assert db_connection.get_pool_stats()["misses"] - before["misses"] == 2
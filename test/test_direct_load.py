@@ -0,0 +1,59 @@
+"""
+test_direct_load.py
+
+Testes do caminho direto API -> DW: carga do lote em memória, gravação de auditoria na
+staging confirmada só após o DW, verificação de consistência e lotes sem alterações.
+Usa o servidor local de `/v3/assets` do benchmark e SQLite no lugar dos bancos.
+
+Execução:
+    PYTHONPATH=. pytest test/test_direct_load.py
+"""
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.bench_asset_batch import synthetic_assets
+from benchmarks.bench_pipeline import StubCoinCap
+from include.database.db_connection import DW, STAGING
+from include.database.schema_cache import get_table
+from include.etl.direct_load import extract_and_load_direct
+from include.etl.transform_load_final import transform_and_load_data
+
+
+def _count(engine, target, table_name):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(get_table(target, table_name))).scalar()
+
+
+def test_direct_load_writes_dw_then_staging_and_skips_unchanged(staging_engine, dw_engine):
+    options = dict(staging_engine=staging_engine, dw_engine=dw_engine, skip_unchanged=True, incremental=True,
+                   landing=False, cache_path=None)
+
+    with StubCoinCap(synthetic_assets(30)) as stub:
+        first = extract_and_load_direct(stub.url, **options)
+
+        stub.assets[3] = {**stub.assets[3], "priceUsd": "1.5"}
+        stub._pages.clear()
+        second = extract_and_load_direct(stub.url, **options)
+        third = extract_and_load_direct(stub.url, **options)
+
+    assert (first["rows"], first["changed"], first["dw_loaded"]) == (30, 30, True)
+    assert second["changed"] == 1 and third["changed"] == 0
+    assert third["content_hash"] == second["content_hash"] != first["content_hash"]
+    assert _count(dw_engine, DW, "crypto_market_data") == 31
+    assert _count(dw_engine, DW, "crypto_powerbi_summary") == 30
+    assert _count(staging_engine, STAGING, "crypto_raw") == 30
+
+    # A transformação da DAG reconhece o lote já carregado
+    transform_and_load_data(incremental=True, batch_ref=second)
+    assert _count(dw_engine, DW, "crypto_market_data") == 31
+
+
+def test_staging_write_is_rolled_back_when_dw_load_fails(tmp_path, staging_engine):
+    broken_dw = create_engine(f"sqlite:///{tmp_path / 'broken.db'}")  # sem tabelas
+
+    with StubCoinCap(synthetic_assets(10)) as stub, pytest.raises(Exception):
+        extract_and_load_direct(stub.url, staging_engine=staging_engine, dw_engine=broken_dw, skip_unchanged=True,
+                                incremental=True, landing=False, cache_path=None)
+
+    assert _count(staging_engine, STAGING, "crypto_raw") == 0
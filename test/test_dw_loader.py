@@ -0,0 +1,120 @@
+"""
+test_dw_loader.py
+
+Testes da carga paralela de fatos no DW: blocos gravados em várias conexões, repetição
+idempotente de um bloco que falhou, o caminho completo de `load_batch_to_dw` para um
+lote grande (dimensão antes dos fatos, agregações e marca d'água no final) e a
+reexecução depois de uma falha na transação final. Usa SQLite
+em arquivo (uma conexão por thread).
+
+Execução:
+    PYTHONPATH=. pytest test/test_dw_loader.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from benchmarks.bench_asset_batch import synthetic_assets
+from include.config.config import DW_LOAD_PARALLEL_MIN_ROWS
+from include.database.db_connection import DW
+from include.database.schema_cache import get_table
+from include.etl.batch import AssetBatch, FACT_COLUMNS
+from include.etl import dw_loader, transform_load_final
+from include.etl.bulk_load import bulk_write
+from include.etl.dw_loader import load_facts_parallel, parallel_enabled
+from include.etl.transform_load_final import load_batch_to_dw, read_watermark
+from include.etl.utils import execute_rows
+
+START = datetime(2025, 5, 1)
+
+
+def _history(assets: int, points: int) -> AssetBatch:
+    records = synthetic_assets(assets) * points
+    timestamps = [START + timedelta(minutes=5 * (i // assets)) for i in range(len(records))]
+    return AssetBatch.from_records(records, timestamps=timestamps)
+
+
+def _count(engine, table_name):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(get_table(DW, table_name))).scalar()
+
+
+def test_already_written_facts_are_skipped_without_retry(dw_engine):
+    batch = _history(50, 4)
+    # Simula blocos já confirmados por uma execução anterior: cada tentativa ignora os pares existentes
+    with dw_engine.begin() as conn:
+        execute_rows(conn, get_table(DW, "crypto_market_data").insert(), FACT_COLUMNS, batch.rows(FACT_COLUMNS)[:30], 30)
+
+    result = load_facts_parallel(dw_engine, batch, chunk_rows=40, workers=3, retries=0)
+
+    assert (result.chunks, result.rows) == (5, 170)
+    assert result.retries == 0
+    assert _count(dw_engine, "crypto_market_data") == 200
+
+
+def test_failed_chunk_is_retried_without_duplicating_facts(dw_engine, monkeypatch):
+    batch = _history(50, 4)
+    failures = []
+
+    def flaky_bulk_write(conn, table, columns, rows, chunk_size):
+        # A primeira gravação confirma o bloco e "perde a conexão" (falha ambígua)
+        if not failures:
+            failures.append(len(rows))
+            with dw_engine.begin() as other:
+                bulk_write(other, table, columns, rows, chunk_size)
+            raise ConnectionError("conexão perdida")
+        return bulk_write(conn, table, columns, rows, chunk_size)
+
+    monkeypatch.setattr(dw_loader, "DW_LOAD_BACKOFF_BASE", 0.0)
+    monkeypatch.setattr(dw_loader, "bulk_write", flaky_bulk_write)
+    result = load_facts_parallel(dw_engine, batch, chunk_rows=40, workers=1, retries=2)
+
+    assert failures == [40]
+    assert (result.chunks, result.rows, result.retries) == (5, 160, 1)
+    assert _count(dw_engine, "crypto_market_data") == 200
+
+
+def test_rerun_after_failed_final_transaction_reuses_written_facts(dw_engine, monkeypatch):
+    batch = _history(1000, DW_LOAD_PARALLEL_MIN_ROWS // 1000 + 1)
+
+    def broken_finish(*args, **kwargs):
+        raise RuntimeError("falha na transação final")
+
+    monkeypatch.setattr(transform_load_final, "_finish_load", broken_finish)
+    with pytest.raises(RuntimeError):
+        load_batch_to_dw(batch, incremental=True, dw_engine=dw_engine)
+    assert _count(dw_engine, "crypto_market_data") == len(batch)
+    monkeypatch.undo()
+
+    loads = []
+
+    def recording_load(*args, **kwargs):
+        loads.append(load_facts_parallel(*args, **kwargs))
+        return loads[-1]
+
+    monkeypatch.setattr(transform_load_final, "load_facts_parallel", recording_load)
+    load_batch_to_dw(batch, incremental=True, dw_engine=dw_engine)
+
+    assert [(load.rows, load.retries) for load in loads] == [(0, 0)]
+    assert _count(dw_engine, "crypto_market_data") == len(batch)
+    with dw_engine.connect() as conn:
+        assert read_watermark(conn) == max(batch.column("timestamp"))
+        samples = conn.execute(select(func.sum(get_table(DW, "crypto_ohlcv_1d").c.sample_count))).scalar()
+    assert samples == len(batch)
+
+
+def test_large_batch_uses_parallel_path_end_to_end(dw_engine):
+    batch = _history(1000, DW_LOAD_PARALLEL_MIN_ROWS // 1000 + 1)
+    assert parallel_enabled(dw_engine, len(batch))
+
+    facts = load_batch_to_dw(batch, incremental=True, dw_engine=dw_engine)
+
+    assert facts == len(batch) == _count(dw_engine, "crypto_market_data")
+    assert _count(dw_engine, "cryptocurrencies") == 1000
+    with dw_engine.connect() as conn:
+        assert read_watermark(conn) == max(batch.column("timestamp"))
+        samples = conn.execute(select(func.sum(get_table(DW, "crypto_ohlcv_1d").c.sample_count))).scalar()
+    assert samples == len(batch)
+    assert not parallel_enabled(create_engine("sqlite://"), len(batch))
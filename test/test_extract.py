@@ -0,0 +1,153 @@
+"""
+test_extract.py
+
+Testes da extração paginada contra um servidor HTTP local que simula o
+endpoint `/v3/assets` da CoinCap (paginação por `limit`/`offset`, rate limit
+com `Retry-After`, páginas com ativos repetidos e respostas condicionais com ETag).
+
+Execução:
+    PYTHONPATH=. pytest test/test_extract.py
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from include.etl.extract import ConditionalCache, TokenBucket, extract_data, iter_pages
+
+
+def make_assets(count):
+    return [
+        {"id": f"asset-{i}", "symbol": f"A{i}", "name": f"Asset {i}", "priceUsd": str(1.0 + i)}
+        for i in range(count)
+    ]
+
+
+class StubCoinCap:
+    def __init__(self, assets, throttle_first=0, overlap=0):
+        self.assets = assets
+        self.throttle_first = throttle_first
+        self.overlap = overlap
+        self.requests = []
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                limit = int(query.get("limit", ["100"])[0])
+                offset = int(query.get("offset", ["0"])[0])
+                with stub._lock:
+                    stub.requests.append((offset, limit, self.headers.get("Authorization")))
+                    throttle = stub.throttle_first > 0
+                    if throttle:
+                        stub.throttle_first -= 1
+
+                if throttle:
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0")
+                    self.end_headers()
+                    return
+
+                start = max(offset - stub.overlap, 0)
+                body = json.dumps({"data": stub.assets[start:offset + limit]}).encode()
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    with stub._lock:
+                        stub.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def stub_server():
+    servers = []
+
+    def start(stub):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), stub.handler())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/v3/assets"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_extract_fetches_all_pages_concurrently(stub_server):
+    stub = StubCoinCap(make_assets(250))
+    url = stub_server(stub)
+
+    assets = extract_data(url=url, page_limit=50, max_pages=20, workers=4, rate_limit=0)
+
+    assert [a["id"] for a in assets] == [f"asset-{i}" for i in range(250)]
+    offsets = sorted(offset for offset, _, _ in stub.requests)
+    assert offsets[:6] == [0, 50, 100, 150, 200, 250]
+    assert all(auth and auth.startswith("Bearer ") for _, _, auth in stub.requests)
+
+
+def test_extract_deduplicates_overlapping_pages(stub_server):
+    stub = StubCoinCap(make_assets(120), overlap=5)
+    url = stub_server(stub)
+
+    assets = extract_data(url=url, page_limit=40, max_pages=10, workers=2, rate_limit=0)
+
+    ids = [a["id"] for a in assets]
+    assert len(ids) == len(set(ids)) == 120
+
+
+def test_extract_retries_after_rate_limit(stub_server):
+    stub = StubCoinCap(make_assets(30), throttle_first=2)
+    url = stub_server(stub)
+
+    assets = extract_data(url=url, page_limit=100, max_pages=1, workers=1, rate_limit=0)
+
+    assert len(assets) == 30
+    assert len(stub.requests) == 3
+
+
+def test_conditional_requests_skip_unchanged_pages(stub_server, tmp_path):
+    stub = StubCoinCap(make_assets(120))
+    url = stub_server(stub)
+    cache_path = str(tmp_path / "validators.json")
+
+    cache = ConditionalCache(cache_path)
+    first = [a["id"] for page in iter_pages(url, 50, 10, 2, 0, conditional=cache) for a in page]
+    cache.save()
+    assert len(first) == 120
+
+    # Nova execução (novo processo): só a página alterada é baixada e repassada
+    stub.assets[60] = {**stub.assets[60], "priceUsd": "999"}
+    pages = list(iter_pages(url, 50, 10, 2, 0, conditional=ConditionalCache(cache_path)))
+
+    assert [[a["id"] for a in page] for page in pages] == [[f"asset-{i}" for i in range(50, 100)]]
+    # Páginas 0, 2 e a página vazia buscada na mesma onda responderam 304
+    assert stub.not_modified == 3
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.08
@@ -0,0 +1,141 @@
+"""
+test_ingest_daemon.py
+
+Testes do daemon de ingestão contínua contra um websocket local (aiohttp) que imita o
+fluxo de preços da CoinCap, com staging e DW em arquivos SQLite: micro-lotes, hash de
+conteúdo recalculado na staging e staging desfeita quando o DW falha.
+
+Execução:
+    PYTHONPATH=. pytest test/test_ingest_daemon.py
+"""
+
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+from aiohttp import web
+from sqlalchemy import create_engine, func, select
+
+from include.database.db_connection import DW, STAGING
+from include.database.schema_cache import get_table
+from include.etl.batch import AssetBatch
+from include.etl.ingest_daemon import IngestDaemon, MicroBatchWriter, PriceBuffer, parse_prices, websocket_source
+
+MESSAGES = [
+    {"bitcoin": "100.0", "ethereum": "10.0"},
+    {"bitcoin": "101.0"},
+    {"bitcoin": "102.0", "ethereum": "11.0", "unknown-coin": "1.0"},
+    {"ethereum": "12.0"},
+]
+
+
+def test_buffer_keeps_only_latest_price_per_asset():
+    buffer = PriceBuffer()
+    for message in MESSAGES:
+        buffer.add(parse_prices(message))
+
+    prices, updates, oldest = buffer.drain()
+
+    assert updates == 7 and oldest is not None
+    assert {asset: price for asset, (price, _) in prices.items()} == \
+        {"bitcoin": 102.0, "ethereum": 12.0, "unknown-coin": 1.0}
+    assert buffer.drain()[0] == {}
+    assert parse_prices({"id": "bitcoin", "priceUsd": "5.5"}) == {"bitcoin": 5.5}
+
+
+@pytest.fixture
+def staging(staging_engine):
+    with staging_engine.begin() as conn:
+        conn.execute(get_table(STAGING, "crypto_raw").insert(), [
+            {"id": asset, "symbol": asset[:3].upper(), "name": asset.title(), "price_usd": 1, "market_cap_usd": 1,
+             "volume_usd_24hr": 5, "change_percent_24hr": 0.1, "vwap_24hr": 1, "supply": 2,
+             "timestamp": datetime(2025, 1, 1)}
+            for asset in ("bitcoin", "ethereum")
+        ])
+    return staging_engine
+
+
+async def _serve_and_ingest(daemon, batches):
+    async def prices(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        for message in batches.pop(0):
+            await ws.send_str(json.dumps(message))
+            await asyncio.sleep(0.01)
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/prices", prices)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    expected = sum(len(batch) for batch in batches)
+
+    async def limited():
+        # A segunda conexão só acontece porque o servidor fecha a primeira (reconexão)
+        received = 0
+        async for message in websocket_source(f"ws://127.0.0.1:{port}/prices", reconnect_max=0.05):
+            yield message
+            received += 1
+            if received == expected:
+                return
+
+    try:
+        await daemon.run(limited())
+    finally:
+        await runner.cleanup()
+
+
+def test_daemon_flushes_micro_batches_from_websocket(tmp_path, staging, dw_engine):
+    daemon = IngestDaemon(MicroBatchWriter(staging, dw_engine), flush_seconds=60, flush_updates=3,
+                          metrics_sink="json", metrics_dir=str(tmp_path))
+
+    asyncio.run(_serve_and_ingest(daemon, [MESSAGES[:2], MESSAGES[2:]]))
+
+    stats = daemon.stats
+    assert (stats.messages, stats.updates, stats.flush_errors) == (4, 7, 0)
+    assert stats.flushes >= 2 and stats.unknown_assets == 1
+    assert stats.facts_written + stats.coalesced + stats.unknown_assets == 7
+    assert stats.max_lag_seconds > 0
+
+    with staging.connect() as conn:
+        raw = {row.id: row for row in conn.execute(select(get_table(STAGING, "crypto_raw")))}
+    assert (float(raw["bitcoin"].price_usd), float(raw["ethereum"].price_usd)) == (102.0, 12.0)
+    assert float(raw["ethereum"].market_cap_usd) == 24.0
+    # O timestamp da staging continua sendo o do último snapshot completo
+    assert raw["bitcoin"].timestamp == datetime(2025, 1, 1)
+    # ... e o hash de conteúdo descreve a linha gravada, não o snapshot anterior
+    rows = [row._mapping for row in raw.values()]
+    assert [row["content_hash"] for row in rows] == AssetBatch.from_staging_rows(rows).column("content_hash")
+
+    market = get_table(DW, "crypto_market_data")
+    with dw_engine.connect() as conn:
+        facts = conn.execute(select(market.c.id, market.c.price_usd, market.c.volume_usd_24hr)
+                             .order_by(market.c.timestamp)).all()
+        hourly = conn.execute(select(func.count()).select_from(get_table(DW, "crypto_ohlcv_1h"))).scalar()
+    assert len(facts) == stats.facts_written
+    assert {row.id for row in facts} == {"bitcoin", "ethereum"}
+    assert [float(row.price_usd) for row in facts if row.id == "bitcoin"][-1] == 102.0
+    assert all(float(row.volume_usd_24hr) == 5 for row in facts)
+    assert hourly >= 1
+
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+    assert json.loads(lines[-1])["component"] == "ingest"
+
+
+def test_staging_is_rolled_back_when_dw_write_fails(tmp_path, staging):
+    broken_dw = create_engine(f"sqlite:///{tmp_path / 'broken.db'}")  # sem tabelas
+    writer = MicroBatchWriter(staging, broken_dw)
+
+    with pytest.raises(Exception):
+        writer.write({"bitcoin": (200.0, datetime(2025, 1, 2))})
+
+    with staging.connect() as conn:
+        raw_table = get_table(STAGING, "crypto_raw")
+        row = conn.execute(select(raw_table).where(raw_table.c.id == "bitcoin")).mappings().one()
+    assert float(row["price_usd"]) == 1 and row["content_hash"] is None
@@ -0,0 +1,68 @@
+"""
+test_landing.py
+
+Testes da landing zone (Arrow IPC): gravação particionada por data, leitura como
+`AssetBatch` (inteira ou página a página) e remoção do arquivo parcial quando a
+extração falha.
+
+Execução:
+    PYTHONPATH=. pytest test/test_landing.py
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from include.etl.batch import DIMENSION_COLUMNS, STAGING_COLUMNS
+from include.etl.landing import iter_landed, land_pages, list_landed, read_landed, write_landing
+
+TIMESTAMP = datetime(2025, 5, 3, 16, 0, 0, 123456)
+
+
+def make_asset(asset_id, max_supply="21000000.0000000000", vwap="100.5"):
+    return {
+        "id": asset_id, "rank": "1", "symbol": asset_id.upper(), "name": asset_id.title(), "supply": "10.0",
+        "maxSupply": max_supply, "marketCapUsd": "1000.0", "volumeUsd24Hr": "50.0", "priceUsd": "101.25",
+        "changePercent24Hr": "-1.5", "vwap24Hr": vwap, "explorer": "https://a,https://b",
+    }
+
+
+def test_landed_file_round_trips_as_asset_batch(tmp_path):
+    pages = [[make_asset("btc"), make_asset("eth", max_supply=None, vwap=None)], [make_asset("sol")]]
+
+    assert list(land_pages(pages, TIMESTAMP, root=str(tmp_path))) == pages
+
+    files = list_landed(root=str(tmp_path))
+    assert [path.parent.name for path in files] == ["date=2025-05-03"]
+    batch = read_landed(files[0])
+    assert batch.timestamp == TIMESTAMP
+    staging = {row["id"]: row for row in batch.records(STAGING_COLUMNS)}
+    assert list(staging) == ["btc", "eth", "sol"]
+    assert staging["btc"]["price_usd"] == 101.25 and staging["btc"]["max_supply"] == 21000000.0
+    assert staging["eth"]["max_supply"] is None and staging["eth"]["vwap_24hr"] is None
+    assert batch.records(DIMENSION_COLUMNS)[0]["explorer"] == "https://a"
+
+    # Página a página: um lote por record batch, com o timestamp do snapshot
+    pages_read = list(iter_landed(files[0]))
+    assert [list(page.id) for page in pages_read] == [["btc", "eth"], ["sol"]]
+    assert {page.timestamp for page in pages_read} == {TIMESTAMP}
+
+
+def test_list_landed_filters_by_partition_date(tmp_path):
+    for day in (1, 2, 3):
+        write_landing([make_asset("btc")], datetime(2025, 5, day, 12), root=str(tmp_path))
+
+    files = list_landed(since=date(2025, 5, 2), until=date(2025, 5, 2), root=str(tmp_path))
+
+    assert [read_landed(path).timestamp for path in files] == [datetime(2025, 5, 2, 12)]
+
+
+def test_failed_extraction_leaves_no_file(tmp_path):
+    def pages():
+        yield [make_asset("btc")]
+        raise RuntimeError("API fora do ar")
+
+    with pytest.raises(RuntimeError):
+        list(land_pages(pages(), TIMESTAMP, root=str(tmp_path)))
+
+    assert list(tmp_path.rglob("*.arrow*")) == []
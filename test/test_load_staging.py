@@ -0,0 +1,111 @@
+"""
+test_load_staging.py
+
+Testes da carga na staging (`load_staging.py`): UPSERT multi-linha em fatias de
+`STAGING_CHUNK_SIZE` registros, que sobrescreve as linhas existentes, e carga em
+streaming (fila limitada, desfazimento quando a extração falha e backpressure). Usa
+SQLite em arquivo no lugar do MySQL.
+
+Execução:
+    PYTHONPATH=. pytest test/test_load_staging.py
+"""
+
+import threading
+import time
+
+import pytest
+from sqlalchemy import func, select
+
+from benchmarks.bench_asset_batch import synthetic_assets
+from include.database.db_connection import STAGING
+from include.database.schema_cache import get_table
+from include.etl import load_staging
+from include.etl.batch import AssetBatch, STAGING_COLUMNS
+from include.etl.load_staging import _staging_assignments, load_data_to_staging, load_stream_to_staging
+from include.etl.utils import execute_rows, upsert_statement
+
+
+@pytest.fixture
+def staging(staging_engine, monkeypatch):
+    monkeypatch.setattr(load_staging, "get_staging_area_engine", lambda: staging_engine)
+    return staging_engine
+
+
+def _prices(engine):
+    raw_table = get_table(STAGING, "crypto_raw")
+    with engine.connect() as conn:
+        return dict(conn.execute(select(raw_table.c.id, raw_table.c.price_usd)).all())
+
+
+def test_execute_rows_upserts_in_chunks(staging):
+    raw_table = get_table(STAGING, "crypto_raw")
+    rows = AssetBatch.from_records(synthetic_assets(25)).rows(STAGING_COLUMNS)
+
+    with staging.begin() as conn:
+        stmt = upsert_statement(conn.dialect, raw_table, _staging_assignments)
+        assert execute_rows(conn, stmt, STAGING_COLUMNS, rows, 10) == 3  # 10 + 10 + 5
+        # Mesma chave de novo: a linha existente é sobrescrita, não duplicada
+        assert execute_rows(conn, stmt, STAGING_COLUMNS, rows[:1], 10) == 1
+
+    with staging.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(raw_table)).scalar() == 25
+
+
+def test_load_overwrites_existing_rows(staging):
+    assets = synthetic_assets(25)
+    first = load_data_to_staging(assets, chunk_size=10, skip_unchanged=False)
+
+    assets[0] = {**assets[0], "priceUsd": "12345.5"}
+    second = load_data_to_staging(assets, chunk_size=10, skip_unchanged=False)
+
+    prices = _prices(staging)
+    assert (first.rows, first.written) == (second.rows, second.written) == (25, 25)
+    assert first.content_hash != second.content_hash
+    assert len(prices) == 25
+    assert float(prices[assets[0]["id"]]) == pytest.approx(12345.5)
+
+
+def _writer_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "staging-writer"]
+
+
+def test_stream_is_rolled_back_when_extraction_fails(staging):
+    assets = synthetic_assets(30)
+
+    def pages():
+        yield assets[:10]
+        yield assets[10:20]
+        raise RuntimeError("falha na API")
+
+    with pytest.raises(RuntimeError, match="falha na API"):
+        load_stream_to_staging(pages(), chunk_size=5, skip_unchanged=False)
+
+    # As fatias já gravadas foram desfeitas e a thread de escrita terminou
+    assert _prices(staging) == {}
+    assert _writer_threads() == []
+
+
+def test_stream_blocks_extraction_when_queue_is_full(staging, monkeypatch):
+    assets = synthetic_assets(50)
+    written = [0]
+    lags = []
+    real_bulk_write = load_staging.bulk_write
+
+    def slow_bulk_write(conn, *args, **kwargs):
+        time.sleep(0.02)  # banco mais lento que a extração
+        statements = real_bulk_write(conn, *args, **kwargs)
+        written[0] += 1
+        return statements
+
+    def pages():
+        for index in range(10):
+            lags.append(index - written[0])
+            yield assets[index * 5:(index + 1) * 5]
+
+    monkeypatch.setattr(load_staging, "bulk_write", slow_bulk_write)
+    result = load_stream_to_staging(pages(), chunk_size=5, queue_depth=1, skip_unchanged=False)
+
+    # Uma fatia na fila, uma sendo gravada e uma aguardando no put: a extração não se adianta mais
+    assert max(lags) <= 2
+    assert (result.rows, result.written) == (50, 50)
+    assert len(_prices(staging)) == 50
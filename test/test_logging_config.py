@@ -0,0 +1,42 @@
+"""
+test_logging_config.py
+
+Testes do backend de logs: configuração idempotente dos handlers, escrita em thread
+dedicada e limitação de mensagens por ponto de log.
+
+Execução:
+    PYTHONPATH=. pytest test/test_logging_config.py
+"""
+
+import logging
+
+from include.config.logging_config import flush_logs, setup_logger
+
+
+def test_setup_logger_is_idempotent(tmp_path):
+    log_file = tmp_path / "logs" / "pipeline.log"
+
+    for _ in range(3):
+        logger = setup_logger("test_idempotent", str(log_file))
+    other = setup_logger("test_idempotent_other", str(log_file))
+    logger.info("mensagem única")
+    other.info("outro módulo")
+    flush_logs()
+
+    assert len(logger.handlers) == 1
+    lines = log_file.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 2
+    assert "test_idempotent - INFO - mensagem única" in lines[0]
+
+
+def test_rate_limit_suppresses_hot_loop_messages(tmp_path):
+    log_file = tmp_path / "pipeline.log"
+    logger = setup_logger("test_rate_limited", str(log_file), level=logging.DEBUG, rate_limit=2)
+
+    for i in range(100):
+        logger.debug("ativo %s processado", i)
+    flush_logs()
+
+    lines = log_file.read_text(encoding="utf-8").splitlines()
+    assert 1 <= len(lines) <= 5
+    assert lines[0].endswith("ativo 0 processado")
@@ -0,0 +1,50 @@
+"""
+test_metrics.py
+
+Testes das métricas por etapa: contadores de registros, HTTP e SQL (eventos de uma
+engine SQLite), fases internas e os destinos JSON e Prometheus.
+
+Execução:
+    PYTHONPATH=. pytest test/test_metrics.py
+"""
+
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from include.etl import metrics
+
+
+def test_stage_collects_rows_http_sql_and_phases(tmp_path):
+    engine = metrics.instrument_engine(create_engine("sqlite://"))
+
+    with metrics.stage("load_staging", sink="json", directory=str(tmp_path), profile="none") as stage:
+        metrics.add_rows(10)
+        metrics.record_http(0.25, 2048)
+        with metrics.phase("write"), engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+
+    assert (stage.status, stage.rows, stage.payload_bytes, stage.http_requests) == ("ok", 10, 2048, 1)
+    assert stage.sql_statements == 2 and stage.sql_seconds > 0
+    assert "write" in stage.phases
+
+    # Fora de uma etapa os contadores são ignorados
+    metrics.add_rows(5)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 3"))
+
+    lines = (tmp_path / "metrics.jsonl").read_text().splitlines()
+    assert [json.loads(line)["rows"] for line in lines] == [10]
+
+
+def test_failed_stage_is_exported_to_prometheus_textfile(tmp_path):
+    with pytest.raises(RuntimeError):
+        with metrics.stage("transform", sink="prometheus", directory=str(tmp_path), profile="none"):
+            metrics.add_rows(3)
+            raise RuntimeError("falha")
+
+    content = (tmp_path / "crypto_pipeline_transform.prom").read_text()
+    assert 'crypto_pipeline_stage_success{stage="transform"} 0' in content
+    assert 'crypto_pipeline_stage_rows{stage="transform"} 3' in content
@@ -0,0 +1,40 @@
+"""
+test_partitioning.py
+
+Testes do cálculo de partições mensais e da janela de retenção de `crypto_market_data`.
+
+Execução:
+    PYTHONPATH=. pytest test/test_partitioning.py
+"""
+
+from datetime import date
+
+from include.database.partitioning import (
+    add_months, expired_partitions, planned_partitions, _partition_clause
+)
+
+
+def test_add_months_crosses_year_boundaries():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+
+
+def test_planned_partitions_use_exclusive_upper_bounds():
+    partitions = planned_partitions(date(2025, 11, 17), date(2026, 1, 1))
+
+    assert partitions == [
+        ("p202511", date(2025, 12, 1)),
+        ("p202512", date(2026, 1, 1)),
+        ("p202601", date(2026, 2, 1)),
+    ]
+    assert _partition_clause(partitions[:1]) == (
+        "PARTITION p202511 VALUES LESS THAN ('2025-12-01'), "
+        "PARTITION pmax VALUES LESS THAN (MAXVALUE)"
+    )
+
+
+def test_expired_partitions_respect_retention_window():
+    existing = ["p202408", "p202409", "p202410", "p202509", "pmax"]
+
+    assert expired_partitions(existing, date(2025, 10, 18), 12) == ["p202408", "p202409"]
+    assert expired_partitions(existing, date(2025, 10, 18), 0) == []
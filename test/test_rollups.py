@@ -0,0 +1,50 @@
+"""
+test_rollups.py
+
+Testes da agregação OHLCV em memória usada para manter `crypto_ohlcv_1h`/`crypto_ohlcv_1d`.
+
+Execução:
+    PYTHONPATH=. pytest test/test_rollups.py
+"""
+
+from datetime import datetime
+
+from include.etl.rollups import aggregate_ohlcv
+
+
+def make_fact(asset_id, hour, minute, price, volume=10.0):
+    return {
+        "id": asset_id,
+        "price_usd": price,
+        "volume_usd_24hr": volume,
+        "market_cap_usd": price * 100,
+        "timestamp": datetime(2025, 5, 3, hour, minute),
+    }
+
+
+def test_hourly_buckets_use_timestamp_order_for_open_and_close():
+    facts = [
+        make_fact("btc", 1, 30, 3.0),
+        make_fact("btc", 1, 0, 2.0, volume=20.0),
+        make_fact("btc", 1, 55, 1.0, volume=None),
+        make_fact("btc", 2, 0, 9.0),
+    ]
+
+    buckets = {row["bucket_start"].hour: row for row in aggregate_ohlcv(facts, "1h")}
+
+    first = buckets[1]
+    assert (first["open_price"], first["high_price"], first["low_price"], first["close_price"]) == (2.0, 3.0, 1.0, 1.0)
+    assert first["sample_count"] == 3
+    assert first["avg_volume_usd_24hr"] == 15.0
+    assert first["last_market_cap_usd"] == 100.0
+    assert buckets[2]["sample_count"] == 1
+
+
+def test_daily_buckets_are_per_asset():
+    facts = [make_fact("btc", 1, 0, 2.0), make_fact("eth", 3, 0, 5.0), make_fact("btc", 23, 55, 4.0)]
+
+    rows = {row["id"]: row for row in aggregate_ohlcv(facts, "1d")}
+
+    assert rows["btc"]["bucket_start"] == datetime(2025, 5, 3)
+    assert (rows["btc"]["open_price"], rows["btc"]["close_price"], rows["btc"]["sample_count"]) == (2.0, 4.0, 2)
+    assert rows["eth"]["sample_count"] == 1
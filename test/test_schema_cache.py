@@ -0,0 +1,83 @@
+"""
+test_schema_cache.py
+
+Testes do cache de esquema (`schema_cache.py`): definições declaradas e tabelas
+refletidas servidas do cache, conferência do hash gravado por `create_tables.py` e
+descarte do cache quando o esquema do banco diverge do declarado e mudanças de tipo por
+dialeto e de unicidade de índice refletidas no hash. Usa SQLite em arquivo.
+
+Execução:
+    PYTHONPATH=. pytest test/test_schema_cache.py
+"""
+
+import pytest
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, create_engine, text, update
+from sqlalchemy.dialects.mysql import DATETIME as MYSQL_DATETIME
+
+from include.database import schema_cache
+from include.database.create_tables import SCHEMA_VERSION_TABLE, create_all, define_dw_tables, schema_hash
+from include.database.db_connection import DW, STAGING
+from include.database.schema_cache import get_schema_hash, get_table, invalidate, verify_schema
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    invalidate()
+    yield
+    invalidate()
+
+
+def test_declared_and_reflected_tables_are_cached(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'staging.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE extra_source (id INTEGER PRIMARY KEY)"))
+
+    # Declaradas: sem consulta ao banco, sempre o mesmo objeto
+    assert get_table(DW, "crypto_market_data") is get_table(DW, "crypto_market_data")
+
+    # Não declarada: refletida uma vez e servida do cache nas chamadas seguintes, sem conexão
+    reflected = get_table(STAGING, "extra_source", bind=engine)
+    assert get_table(STAGING, "extra_source") is reflected
+
+    invalidate(STAGING)
+    with pytest.raises(KeyError):
+        get_table(STAGING, "extra_source")
+
+
+def test_schema_mismatch_invalidates_the_cache(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dw.db'}")
+    assert verify_schema(DW, engine) is False  # banco sem registro de versão
+    invalidate(DW)
+
+    create_all(define_dw_tables(MetaData()), engine)
+    assert verify_schema(DW, engine) is True
+
+    # Banco migrado por outra versão do código: o cache do destino é descartado
+    version_table = get_table(DW, SCHEMA_VERSION_TABLE)
+    with engine.begin() as conn:
+        conn.execute(update(version_table).values(schema_hash="outro", schema_version=1))
+    invalidate(DW)
+    cached = get_table(DW, "crypto_market_data")
+    with pytest.raises(RuntimeError, match="versão 1"):
+        verify_schema(DW, engine)
+    assert DW not in schema_cache._declared
+    assert get_table(DW, "crypto_market_data") is not cached
+
+    # Depois da migração (create_tables), o hash volta a conferir
+    create_all(define_dw_tables(MetaData()), engine)
+    assert verify_schema(DW, engine) is True
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT schema_hash FROM {SCHEMA_VERSION_TABLE}")).scalar() == get_schema_hash(DW)
+
+
+def test_hash_tracks_dialect_variants_and_index_uniqueness():
+    def hashed(fsp, unique):
+        metadata = MetaData()
+        Table("facts", metadata, Column("id", String(100)),
+              Column("timestamp", DateTime().with_variant(MYSQL_DATETIME(fsp=fsp), "mysql")),
+              Index("ix_facts_id", "id", unique=unique))
+        return schema_hash(metadata)
+
+    assert hashed(6, True) == hashed(6, True)
+    assert hashed(6, True) != hashed(3, True)
+    assert hashed(6, True) != hashed(6, False)
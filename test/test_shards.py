@@ -0,0 +1,95 @@
+"""
+test_shards.py
+
+Testes da DAG particionada (`shards.py`): faixas do ranking sem sobreposição planejadas a
+partir do universo de ativos (inclusive com o tamanho de página padrão), ativos novos
+desde a estimativa cobertos pela última faixa, carga de cada faixa no DW e na staging,
+resumo do Power BI publicado pela task final e nova tentativa de uma faixa sem duplicar
+fatos nem agregações. Usa o servidor local de `/v3/assets` do benchmark e SQLite no lugar
+dos bancos.
+
+Execução:
+    PYTHONPATH=. pytest test/test_shards.py
+"""
+
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+
+from benchmarks.bench_asset_batch import synthetic_assets
+from benchmarks.bench_pipeline import StubCoinCap
+from include.config.config import COINCAP_MAX_PAGES, COINCAP_PAGE_LIMIT
+from include.database.db_connection import DW, STAGING
+from include.database.schema_cache import get_table
+from include.etl.shards import extract_and_load_shard, finalize_shards, plan_shards
+
+SNAPSHOT = datetime(2025, 5, 3, 12, 0, 0, 250)
+
+
+def _scalar(engine, query):
+    with engine.connect() as conn:
+        return conn.execute(query).scalar()
+
+
+def test_plan_splits_universe_into_contiguous_ranges():
+    plan = plan_shards(3, universe=30, page_limit=5, max_pages=8, timestamp=SNAPSHOT)
+
+    assert [(s["first_page"], s["pages"], s["max_pages"]) for s in plan] == [(0, 2, 2), (2, 2, 2), (4, 2, 4)]
+    assert {s["page_limit"] for s in plan} == {5}
+    assert {s["batch_id"] for s in plan} == {SNAPSHOT.isoformat()}
+    assert len(plan_shards(5, universe=2, page_limit=5, max_pages=8)) == 2
+
+
+def test_plan_with_default_page_limit_gives_every_shard_work():
+    # Com os padrões, o universo inteiro cabe em uma página: as faixas usam páginas menores
+    plan = plan_shards(4, universe=2000, timestamp=SNAPSHOT)
+
+    assert [s["first_page"] * s["page_limit"] for s in plan] == [0, 500, 1000, 1500]
+    assert [s["pages"] for s in plan] == [1, 1, 1, 1]
+    last = plan[-1]
+    assert (last["first_page"] + last["max_pages"]) * last["page_limit"] >= COINCAP_PAGE_LIMIT * COINCAP_MAX_PAGES
+
+
+def test_shards_load_in_parallel_and_retry_idempotently(staging_engine, dw_engine):
+    options = dict(staging_engine=staging_engine, dw_engine=dw_engine, skip_unchanged=True, incremental=True,
+                   landing=False, cache_path=None)
+    market = get_table(DW, "crypto_market_data")
+    rollups = get_table(DW, "crypto_ohlcv_1h")
+    raw = get_table(STAGING, "crypto_raw")
+
+    with StubCoinCap(synthetic_assets(30)) as stub:
+        plan = plan_shards(3, universe=30, timestamp=SNAPSHOT)
+        refs = [extract_and_load_shard(shard, stub.url, **options) for shard in plan]
+
+        assert [ref["rows"] for ref in refs] == [10, 10, 10]
+        assert finalize_shards(refs, dw_engine=dw_engine, incremental=True) == 30
+
+        # Nova tentativa da faixa 1 depois que a staging dela se perdeu: o DW não muda
+        with staging_engine.begin() as conn:
+            conn.execute(delete(raw).where(raw.c.id.in_(stub.assets[i]["id"] for i in range(10, 20))))
+        retry = extract_and_load_shard(plan[1], stub.url, **options)
+
+    assert retry["changed"] == 10
+    assert _scalar(dw_engine, select(func.count()).select_from(market)) == 30
+    assert _scalar(dw_engine, select(func.sum(rollups.c.sample_count))) == 30
+    assert _scalar(dw_engine, select(func.count()).select_from(get_table(DW, "crypto_powerbi_summary"))) == 30
+    assert _scalar(staging_engine, select(func.count()).select_from(raw)) == 30
+
+    # Sem alterações em nenhuma faixa, o resumo publicado é mantido
+    assert finalize_shards([dict(ref, changed=0) for ref in refs], dw_engine=dw_engine) == 0
+
+
+def test_universe_is_estimated_from_staging_and_last_shard_takes_new_assets(staging_engine, dw_engine):
+    raw = get_table(STAGING, "crypto_raw")
+    with staging_engine.begin() as conn:
+        conn.execute(raw.insert(), [{"id": f"old-{i}"} for i in range(24)])
+
+    plan = plan_shards(3, timestamp=SNAPSHOT, staging_engine=staging_engine)
+    assert [s["first_page"] * s["page_limit"] for s in plan] == [0, 8, 16]
+
+    # Seis ativos a mais que no snapshot anterior: a última faixa segue até o fim do ranking
+    with StubCoinCap(synthetic_assets(30)) as stub:
+        refs = [extract_and_load_shard(shard, stub.url, staging_engine=staging_engine, dw_engine=dw_engine,
+                                       landing=False, cache_path=None) for shard in plan]
+    assert [ref["rows"] for ref in refs] == [8, 8, 14]
+    assert _scalar(dw_engine, select(func.count()).select_from(get_table(DW, "crypto_market_data"))) == 30
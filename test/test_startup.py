@@ -0,0 +1,108 @@
+"""
+test_startup.py
+
+Orçamento de inicialização: o parse das DAGs (repetido pelo scheduler a cada poucos
+segundos) não deve importar o pipeline, e importar os módulos do pipeline não deve
+carregar o Cloud SQL Connector nem abrir arquivos de log. Cada medição roda em um
+processo novo, sem módulos em cache. Sem o Airflow instalado, as DAGs são importadas com
+módulos `airflow` substitutos para conferir apenas as importações do próprio arquivo.
+
+Execução:
+    PYTHONPATH=. pytest test/test_startup.py
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# Orçamento do parse de cada arquivo de DAG, depois que o próprio Airflow já foi importado
+DAG_PARSE_BUDGET_SECONDS = 0.5
+DAG_MAX_NEW_MODULES = 30
+HEAVY_MODULES = ("include", "requests", "sqlalchemy", "google.cloud.sql.connector", "dotenv", "numpy", "pyarrow")
+
+
+def run_python(code: str) -> dict:
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                               env={"PYTHONPATH": str(ROOT), "PATH": ""})
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("dag_file", ["dags/dag_etl.py", "dags/dag_maintenance.py"])
+def test_dag_parse_stays_within_budget(dag_file):
+    pytest.importorskip("airflow")
+    result = run_python(f"""
+import importlib.util, json, sys, time
+import airflow
+from airflow.operators.python import PythonOperator
+before = set(sys.modules)
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("dag_under_test", {dag_file!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps({{"seconds": time.perf_counter() - started, "modules": sorted(set(sys.modules) - before)}}))
+""")
+
+    assert result["seconds"] < DAG_PARSE_BUDGET_SECONDS
+    assert len(result["modules"]) <= DAG_MAX_NEW_MODULES
+    heavy = [name for name in result["modules"] if name.startswith(HEAVY_MODULES)]
+    assert heavy == []
+
+
+# Substitutos mínimos de `airflow` e `airflow.operators.python` (DAG, operadores, `>>`)
+AIRFLOW_STUB = """
+import sys, types
+class _Stub:
+    output = None
+    def __init__(self, *args, **kwargs): pass
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def __rshift__(self, other): return other
+    def expand(self, **kwargs): return self
+    @classmethod
+    def partial(cls, **kwargs): return cls()
+airflow = types.ModuleType("airflow")
+operators = types.ModuleType("airflow.operators")
+python = types.ModuleType("airflow.operators.python")
+airflow.DAG = _Stub
+python.PythonOperator = python.BranchPythonOperator = type("Operator", (_Stub,), {})
+sys.modules.update({"airflow": airflow, "airflow.operators": operators, "airflow.operators.python": python})
+"""
+
+
+@pytest.mark.parametrize("dag_file", ["dags/dag_etl.py", "dags/dag_maintenance.py"])
+def test_dag_file_imports_no_pipeline_modules(dag_file):
+    result = run_python(AIRFLOW_STUB + f"""
+import importlib.util, json
+before = set(sys.modules)
+spec = importlib.util.spec_from_file_location("dag_under_test", {dag_file!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(json.dumps({{"modules": sorted(set(sys.modules) - before)}}))
+""")
+
+    heavy = [name for name in result["modules"] if name.startswith(HEAVY_MODULES)]
+    assert heavy == []
+
+
+def test_pipeline_import_is_lazy():
+    result = run_python("""
+import json, os, sys
+import include.etl.extract_load_stream, include.etl.transform_load_final
+from include.config import logging_config
+files = []
+for fd in os.listdir("/proc/self/fd") if os.path.isdir("/proc/self/fd") else []:
+    try:
+        files.append(os.readlink(f"/proc/self/fd/{fd}"))
+    except OSError:
+        pass
+print(json.dumps({
+    "connector": "google.cloud.sql.connector" in sys.modules,
+    "listeners": len(logging_config._listeners),
+    "log_files": [path for path in files if path.endswith(".log")],
+}))
+""")
+
+    assert result == {"connector": False, "listeners": 0, "log_files": []}
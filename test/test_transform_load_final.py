@@ -0,0 +1,78 @@
+"""
+test_transform_load_final.py
+
+Testes da transformação final: ranking do resumo do Power BI calculado em memória,
+hash de conteúdo usado na detecção de mudanças da dimensão, marca d'água da carga
+incremental (nunca recua) e UPSERT apenas das dimensões alteradas (SQLite no lugar do DW).
+
+Execução:
+    PYTHONPATH=. pytest test/test_transform_load_final.py
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from include.database.db_connection import DW
+from include.database.schema_cache import get_table
+from include.etl.transform_load_final import (
+    build_powerbi_summary, changed_dimensions, dimension_hash, read_watermark, write_watermark
+)
+
+TIMESTAMP = datetime(2025, 5, 3, 16, 0)
+
+
+def make_fact(asset_id, price):
+    return {"id": asset_id, "price_usd": price, "supply": 10.0, "timestamp": TIMESTAMP}
+
+
+def test_summary_rank_matches_sql_rank_semantics():
+    dim = [{"id": i, "symbol": i.upper()} for i in ("a", "b", "c", "d")]
+    facts = [make_fact("a", 5.0), make_fact("b", 9.0), make_fact("c", 5.0), make_fact("d", 1.0)]
+
+    summary = build_powerbi_summary(dim, facts)
+
+    ranks = {row["id"]: row["rank"] for row in summary}
+    assert ranks == {"b": 1, "a": 2, "c": 2, "d": 4}
+    assert {row["symbol"] for row in summary} == {"A", "B", "C", "D"}
+    assert all(row["updated_at"] == TIMESTAMP for row in summary)
+
+
+def test_dimension_hash_ignores_decimal_representation():
+    in_memory = {"symbol": "BTC", "name": "Bitcoin", "max_supply": 21000000.0, "explorer": "https://x"}
+    from_db = {"symbol": "BTC", "name": "Bitcoin", "max_supply": Decimal("21000000.0000000000"),
+               "explorer": "https://x"}
+
+    assert dimension_hash(in_memory) == dimension_hash(from_db)
+    assert dimension_hash(in_memory) != dimension_hash({**in_memory, "name": "Bitcoin Cash"})
+    assert dimension_hash({**in_memory, "max_supply": None}) != dimension_hash(in_memory)
+
+
+def test_watermark_never_moves_backwards(dw_engine):
+    earlier = TIMESTAMP - timedelta(hours=1)
+
+    with dw_engine.begin() as conn:
+        assert read_watermark(conn) is None
+        write_watermark(conn, TIMESTAMP)
+        write_watermark(conn, earlier)  # replay de um lote antigo
+        assert read_watermark(conn) == TIMESTAMP
+        write_watermark(conn, earlier, name="outra")
+        assert read_watermark(conn, "outra") == earlier
+
+        later = TIMESTAMP + timedelta(minutes=5)
+        write_watermark(conn, later)
+        assert read_watermark(conn) == later
+
+
+def test_only_new_or_changed_dimensions_are_upserted(dw_engine):
+    stored = {"id": "bitcoin", "symbol": "BTC", "name": "Bitcoin", "max_supply": 21000000.0, "explorer": "https://x"}
+    with dw_engine.begin() as conn:
+        conn.execute(get_table(DW, "cryptocurrencies").insert(), [stored])
+
+    unchanged = dict(stored)
+    new_asset = dict(stored, id="ethereum", symbol="ETH", name="Ethereum", max_supply=None)
+    with dw_engine.connect() as conn:
+        assert changed_dimensions(conn, []) == []
+        assert changed_dimensions(conn, [unchanged]) == []
+        assert changed_dimensions(conn, [unchanged, new_asset]) == [new_asset]
+        assert changed_dimensions(conn, [dict(stored, name="Bitcoin Core")]) == [dict(stored, name="Bitcoin Core")]
+        assert changed_dimensions(conn, [dict(stored, name="Bitcoin Core"), new_asset], only_missing=True) == [new_asset]